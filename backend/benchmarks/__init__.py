@@ -0,0 +1 @@
+# Benchmark suite for the PDF and OCR services (run with: python -m benchmarks.run)
@@ -0,0 +1,108 @@
+"""Adaptive-DPI OCR against fixed-DPI OCR: time saved and accuracy lost.
+
+Recognizes every page of the corpus at ``--dpi``, then again with
+``AdaptiveDPI`` (render at ``--low-dpi`` first, re-render below the
+confidence or text height thresholds) and reports the OCR seconds of both,
+how many pages escalated and how many of the fixed-DPI words the adaptive
+run still produced. The corpus is the synthetic scanned and text documents
+plus any PDFs passed with ``--files``. Example (from the ``backend``
+directory)::
+
+    python -m benchmarks.bench_adaptive_dpi --pages 10 --files 'uploads/*.pdf'
+"""
+from collections import Counter
+from typing import Any, Dict, List
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_ocr_backends import word_agreement
+from benchmarks.harness import environment_info
+from benchmarks.synthetic import cached_pdf
+from services.adaptive_dpi import AdaptiveDPI
+from services.ocr_backends import get_ocr_backend
+from services.rasterizers import get_rasterizer
+
+SYNTHETIC_KINDS = ("scanned", "text")
+
+
+def ocr_document(adaptive: AdaptiveDPI, backend, rasterizer, path: str, language: str, dpi: int) -> Dict[str, Any]:
+    texts: List[str] = []
+    page_dpis: List[int] = []
+    start = time.perf_counter()
+    for page_number, image in enumerate(rasterizer.render(path, adaptive.first_dpi(dpi), grayscale=True), 1):
+        result, page_dpi = adaptive.recognize(backend, rasterizer, path, page_number, image, language, dpi)
+        texts.append(result.text)
+        page_dpis.append(page_dpi)
+    return {"seconds": time.perf_counter() - start, "texts": texts, "page_dpis": page_dpis}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5, help="Pages per synthetic document")
+    parser.add_argument("--files", help="Glob of extra PDFs to include, e.g. 'uploads/*.pdf'")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--low-dpi", type=int, default=200)
+    parser.add_argument("--min-confidence", type=float, default=80.0)
+    parser.add_argument("--min-text-px", type=int, default=20)
+    parser.add_argument("--language", default="eng")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "pdfgenie-bench"))
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        backend = get_ocr_backend()
+        backend.version()
+    except Exception as e:
+        print(f"No OCR backend available (install tesseract and/or tesserocr): {e}", file=sys.stderr)
+        return 1
+    rasterizer = get_rasterizer()
+
+    corpus = {kind: cached_pdf(args.cache_dir, kind, args.pages) for kind in SYNTHETIC_KINDS}
+    for path in sorted(glob.glob(args.files)) if args.files else ():
+        corpus.setdefault(os.path.basename(path), path)
+
+    fixed = AdaptiveDPI(enabled=False)
+    adaptive = AdaptiveDPI(enabled=True, low_dpi=args.low_dpi, min_confidence=args.min_confidence,
+                           min_text_px=args.min_text_px)
+    report = {"environment": environment_info(), "backend": backend.name, "rasterizer": rasterizer.name,
+              "settings": adaptive.settings(args.dpi), "documents": {}}
+    totals = Counter()
+
+    for name, path in corpus.items():
+        reference = ocr_document(fixed, backend, rasterizer, path, args.language, args.dpi)
+        result = ocr_document(adaptive, backend, rasterizer, path, args.language, args.dpi)
+        escalated = sum(page_dpi == args.dpi for page_dpi in result["page_dpis"])
+        document = {
+            "pages": len(result["page_dpis"]),
+            "fixed_seconds": round(reference["seconds"], 3),
+            "adaptive_seconds": round(result["seconds"], 3),
+            "time_saved": round(1 - result["seconds"] / reference["seconds"], 4) if reference["seconds"] else 0.0,
+            "escalated_pages": escalated,
+            "pages_by_dpi": {str(dpi): count for dpi, count in sorted(Counter(result["page_dpis"]).items())},
+            "word_agreement": word_agreement(result["texts"], reference["texts"]),
+        }
+        report["documents"][name] = document
+        totals.update(pages=document["pages"], escalated=escalated,
+                      fixed=reference["seconds"], adaptive=result["seconds"])
+        print(f"{name[:32]:<32} {document['pages']:>4} pages  fixed {document['fixed_seconds']:7.2f}s  "
+              f"adaptive {document['adaptive_seconds']:7.2f}s  saved {document['time_saved']:6.1%}  "
+              f"escalated {escalated:>3}  word agreement {document['word_agreement']:.2%}")
+
+    if totals["fixed"]:
+        report["time_saved"] = round(1 - totals["adaptive"] / totals["fixed"], 4)
+        print(f"{'total':<32} {totals['pages']:>4} pages  saved {report['time_saved']:6.1%}  "
+              f"escalated {totals['escalated']} of {totals['pages']} pages")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Throughput of the ``processing_jobs`` queue with several concurrent workers.
+
+Enqueues ``--jobs`` no-op jobs and drains them with N worker processes
+claiming through ``JobQueue.claim`` (``FOR UPDATE SKIP LOCKED``), then checks
+that every job ran exactly once. Needs PostgreSQL; on SQLite workers
+serialize on the database lock. Example (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_job_queue --database-url postgresql://localhost/pdfgenie_bench --workers 1,2,4,8
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from benchmarks.harness import environment_info
+
+BENCH_JOB_TYPE = "bench"
+
+
+def _setup(database_url: str, jobs: int, seed: int):
+    os.environ["DATABASE_URL"] = database_url
+    from database import SessionLocal, init_db
+    from models import ProcessingJob, User
+    from services.job_queue import JobQueue
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.query(ProcessingJob).filter(ProcessingJob.job_type == BENCH_JOB_TYPE).delete()
+        user = db.query(User).filter(User.username == "queue-bench").first()
+        if not user:
+            user = User(id=str(uuid.uuid4()), username="queue-bench", email="queue-bench@example.com", password_hash="-")
+            db.add(user)
+        db.commit()
+
+        rng = random.Random(seed)
+        db.bulk_save_objects([
+            ProcessingJob(
+                id=str(uuid.uuid4()), user_id=user.id, job_type=BENCH_JOB_TYPE, status="pending",
+                priority=rng.choice((0, 0, 0, 1, 5)), input_files="[]", parameters="{}", attempts=0
+            )
+            for _ in range(jobs)
+        ])
+        db.commit()
+        return JobQueue().depth(db)
+    finally:
+        db.close()
+
+
+def _drain(database_url: str, worker_id: str, work_ms: float, start, results):
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import update
+    from database import SessionLocal
+    from models import ProcessingJob
+    from services.job_queue import JobQueue
+
+    queue = JobQueue()
+    db = SessionLocal()
+    claimed: List[str] = []
+    claim_seconds: List[float] = []
+    start.wait()
+    try:
+        while True:
+            started = time.perf_counter()
+            job = queue.claim(db, worker_id, [BENCH_JOB_TYPE])
+            claim_seconds.append(time.perf_counter() - started)
+            if job is None:
+                break
+            claimed.append(job.id)
+            time.sleep(work_ms / 1000)
+            db.execute(
+                update(ProcessingJob).where(ProcessingJob.id == job.id)
+                .values(status="completed", lease_expires_at=None)
+            )
+            db.commit()
+    finally:
+        db.close()
+    results.put({"worker": worker_id, "claimed": claimed, "claim_seconds": claim_seconds})
+
+
+def _verify(database_url: str) -> Dict[str, int]:
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import func
+    from database import SessionLocal
+    from models import ProcessingJob
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ProcessingJob.status, func.count(), func.max(ProcessingJob.attempts)).filter(
+            ProcessingJob.job_type == BENCH_JOB_TYPE
+        ).group_by(ProcessingJob.status).all()
+        return {status: {"jobs": count, "max_attempts": attempts} for status, count, attempts in rows}
+    finally:
+        db.close()
+
+
+def run_case(database_url: str, jobs: int, workers: int, work_ms: float, seed: int) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    setup = context.Pool(1)
+    try:
+        queued = setup.apply(_setup, (database_url, jobs, seed))
+    finally:
+        setup.close()
+
+    start, results = context.Event(), context.Queue()
+    processes = [
+        context.Process(target=_drain, args=(database_url, f"bench-{i}", work_ms, start, results))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(1.0)  # let the interpreters import before the clock starts
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    claimed = [job_id for outcome in outcomes for job_id in outcome["claimed"]]
+    claim_ms = sorted(s * 1000 for outcome in outcomes for s in outcome["claim_seconds"])
+    return {
+        "workers": workers,
+        "jobs": queued,
+        "seconds": round(elapsed, 3),
+        "jobs_per_second": round(len(claimed) / elapsed, 1),
+        "claim_ms_p50": round(statistics.median(claim_ms), 2),
+        "claim_ms_p95": round(claim_ms[int(len(claim_ms) * 0.95) - 1], 2),
+        "claimed": len(claimed),
+        "duplicates": len(claimed) - len(set(claimed)),
+        "per_worker": [len(outcome["claimed"]) for outcome in outcomes],
+        "final_states": _verify(database_url),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="Database to run against (the bench jobs are deleted and recreated)")
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--work-ms", type=float, default=5.0, help="Simulated time per job")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        print("Pass --database-url or set DATABASE_URL", file=sys.stderr)
+        return 1
+    if not args.database_url.startswith("postgresql"):
+        print("Warning: SKIP LOCKED needs PostgreSQL; workers will serialize on this database", file=sys.stderr)
+
+    report = {"environment": environment_info(), "jobs": args.jobs, "work_ms": args.work_ms, "results": []}
+    failed = False
+    for workers in (int(n) for n in args.workers.split(",")):
+        result = run_case(args.database_url, args.jobs, workers, args.work_ms, args.seed)
+        report["results"].append(result)
+        # Every job exactly once: nothing claimed twice, nothing left behind
+        ok = result["duplicates"] == 0 and result["claimed"] == result["jobs"]
+        failed |= not ok
+        print(f"{workers:>3} workers  {result['jobs_per_second']:8.1f} jobs/s  "
+              f"claim p50 {result['claim_ms_p50']:6.2f} ms  p95 {result['claim_ms_p95']:6.2f} ms  "
+              f"{'ok' if ok else 'DUPLICATES OR MISSED JOBS'}  {result['per_worker']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
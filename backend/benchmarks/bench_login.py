@@ -0,0 +1,147 @@
+"""Login throughput and event-loop stalls under a burst of logins.
+
+Registers ``--users`` accounts, then sends ``--logins`` logins with
+``--concurrency`` in flight through the ASGI app, while a probe task
+measures how late the event loop wakes it up. Each case runs in a fresh
+process so ``PASSWORD_HASH_WORKERS`` (0 hashes on the event loop),
+``BCRYPT_ROUNDS`` and ``PASSWORD_SCHEMES`` take effect. Example (from the
+``backend`` directory)::
+
+    python -m benchmarks.bench_login --hash-workers 0,4 --rounds 10,12
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks.harness import environment_info, run_isolated
+
+PROBE_INTERVAL = 0.005
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def _burst(app, users: List[Dict[str, str]], logins: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(index: int):
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/auth/login", json=users[index % len(users)])
+                latencies.append(time.perf_counter() - started)
+                failures += response.status_code != 200
+
+        probe_task = asyncio.create_task(probe())
+        began = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - began
+        done.set()
+        await probe_task
+
+    return {
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "login_ms_p50": round(statistics.median(latencies) * 1000, 1),
+        "login_ms_p95": round(_percentile(latencies, 0.95) * 1000, 1),
+        "loop_lag_ms_p99": round(_percentile(lags, 0.99) * 1000, 1),
+        "loop_lag_ms_max": round(max(lags) * 1000, 1),
+        "failures": failures,
+    }
+
+
+def login_case(database_url: str, hash_workers: int, rounds: int, schemes: str,
+               users: int, logins: int, concurrency: int) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="pdfgenie-login-bench-")
+    os.environ.update(
+        DATABASE_URL=database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        PASSWORD_HASH_WORKERS=str(hash_workers),
+        BCRYPT_ROUNDS=str(rounds),
+        PASSWORD_SCHEMES=schemes,
+    )
+    os.chdir(workdir)  # startup creates uploads/ and processed/ here
+    import main
+
+    prefix = uuid.uuid4().hex[:8]
+    accounts = [
+        {"username": f"bench-{prefix}-{i}", "password": f"password-{i}"} for i in range(users)
+    ]
+
+    async def run():
+        import httpx
+
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for account in accounts:
+                    response = await client.post(
+                        "/auth/register", json={**account, "email": f"{account['username']}@example.com"}
+                    )
+                    response.raise_for_status()
+            return await _burst(main.app, accounts, logins, concurrency)
+
+    return asyncio.run(run())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None,
+                        help="Database to register the bench users in (default: a temporary SQLite file)")
+    parser.add_argument("--hash-workers", default="0,4", help="Comma-separated PASSWORD_HASH_WORKERS values")
+    parser.add_argument("--rounds", default="12", help="Comma-separated BCRYPT_ROUNDS values")
+    parser.add_argument("--schemes", default="bcrypt", help="PASSWORD_SCHEMES, e.g. argon2,bcrypt")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment_info(), "schemes": args.schemes, "logins": args.logins,
+              "concurrency": args.concurrency, "cases": {}}
+    for rounds in (int(r) for r in args.rounds.split(",")):
+        for workers in (int(w) for w in args.hash_workers.split(",")):
+            case_id = f"{args.schemes}:rounds={rounds}:workers={workers}"
+            result = run_isolated(
+                login_case, args.database_url, workers, rounds, args.schemes,
+                args.users, args.logins, args.concurrency, timeout=args.timeout
+            )
+            report["cases"][case_id] = result
+            if "error" in result:
+                print(f"{case_id:<32} {result['error']}")
+                continue
+            print(f"{case_id:<32} {result['logins_per_second']:7.1f} logins/s  "
+                  f"p50 {result['login_ms_p50']:7.1f} ms  p95 {result['login_ms_p95']:7.1f} ms  "
+                  f"loop lag p99 {result['loop_lag_ms_p99']:6.1f} ms  max {result['loop_lag_ms_max']:6.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
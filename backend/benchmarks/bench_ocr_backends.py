@@ -0,0 +1,102 @@
+"""Compare OCR backends in pages per second.
+
+Runs every available backend over the same synthetic scanned pages, first
+cold (including engine start-up) and then warm, and reports throughput plus
+how closely each backend's text matches the subprocess backend. Example
+(from the ``backend`` directory)::
+
+    python -m benchmarks.bench_ocr_backends --pages 20 --dpi 300 --threads 1,4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.harness import environment_info
+from benchmarks.synthetic import scanned_images
+from services.ocr_backends import OCRBackend, SubprocessBackend, TesserocrBackend
+
+
+def available_backends() -> Dict[str, OCRBackend]:
+    backends = {}
+    for backend_class in (SubprocessBackend, TesserocrBackend):
+        try:
+            backend = backend_class()
+            backend.version()
+        except Exception as e:
+            print(f"skipping {backend_class.name}: {e}", file=sys.stderr)
+            continue
+        backends[backend.name] = backend
+    return backends
+
+
+def run_backend(backend: OCRBackend, images: List, language: str, threads: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda image: backend.recognize(image, language), images))
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(images) / elapsed, 2),
+        "confidence": round(sum(r.confidence for r in results) / len(results), 2),
+        "texts": [r.text for r in results],
+    }
+
+
+def word_agreement(texts: List[str], reference: List[str]) -> float:
+    """Fraction of reference words also produced by the other backend"""
+    matched = total = 0
+    for text, expected in zip(texts, reference):
+        words = text.split()
+        for word in expected.split():
+            total += 1
+            if word in words:
+                matched += 1
+    return round(matched / total, 4) if total else 1.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--language", default="eng")
+    parser.add_argument("--threads", default="1", help="Comma separated worker thread counts")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    backends = available_backends()
+    if not backends:
+        print("No OCR backend available (install tesseract and/or tesserocr)", file=sys.stderr)
+        return 1
+
+    images = list(scanned_images(args.pages, dpi=args.dpi))
+    report = {"environment": environment_info(), "pages": args.pages, "dpi": args.dpi, "results": []}
+    reference = None
+
+    for threads in (int(t) for t in args.threads.split(",")):
+        for name, backend in backends.items():
+            # Cold run includes loading the language model; warm run reuses it
+            for phase in ("cold", "warm"):
+                if phase == "cold" and name == "tesserocr":
+                    backend = TesserocrBackend()
+                result = run_backend(backend, images, args.language, threads)
+                texts = result.pop("texts")
+                if name == "subprocess" and reference is None:
+                    reference = texts
+                result.update({"backend": name, "threads": threads, "phase": phase})
+                if reference is not None:
+                    result["word_agreement"] = word_agreement(texts, reference)
+                report["results"].append(result)
+                print(f"{name:<11} threads={threads:<2} {phase:<4} {result['pages_per_second']:>7.2f} pages/s "
+                      f"({result['seconds']:.2f}s, confidence {result['confidence']:.1f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
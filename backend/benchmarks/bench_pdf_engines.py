@@ -0,0 +1,119 @@
+"""Parse and write throughput of the PDF engines on real documents.
+
+By default every distinct PDF in ``uploads/`` is used (duplicates by content
+are skipped). Each engine runs in a fresh process. Example (from the
+``backend`` directory)::
+
+    python -m benchmarks.bench_pdf_engines --repeat 3
+    python -m benchmarks.bench_pdf_engines --files "manuals/*.pdf"
+"""
+from typing import Any, Dict, List
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.harness import environment_info, measure, run_isolated
+
+ENGINES = ("pypdf2", "pikepdf")
+
+
+def distinct_files(pattern: str) -> List[str]:
+    seen, files = set(), []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            files.append(os.path.abspath(path))
+    return files
+
+
+def engine_case(engine_name: str, files: List[str], repeat: int) -> Dict[str, Any]:
+    from services.pdf_engines import get_pdf_engine
+
+    try:
+        engine = get_pdf_engine(engine_name)
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    total_bytes = sum(os.path.getsize(path) for path in files)
+    pages = 0
+
+    def parse():
+        nonlocal pages
+        pages = 0
+        for path in files:
+            with engine.opened(path) as document:
+                pages += engine.page_count(document)
+                # Touch every page so lazy parsers do the same work as eager ones
+                with engine.created() as output:
+                    engine.append_pages(output, document)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        def write():
+            engine.merge(files, os.path.join(workdir, "merged.pdf"))
+
+        def compress():
+            for index, path in enumerate(files):
+                with engine.opened(path) as document, engine.created() as output:
+                    engine.append_pages(output, document)
+                    engine.write(output, os.path.join(workdir, f"compressed_{index}.pdf"), compression_level=6)
+
+        result = {"engine": engine.name, "files": len(files), "pages": None, "bytes": total_bytes}
+        for name, fn in (("parse", parse), ("merge", write), ("compress", compress)):
+            metrics, _ = measure(fn, repeat)
+            seconds = metrics["wall_time"]
+            result[name] = {
+                "seconds": round(seconds, 4),
+                "mb_per_second": round(total_bytes / 1048576 / seconds, 2) if seconds else None,
+                "pages_per_second": round(pages / seconds, 1) if seconds else None,
+                "peak_rss_delta": metrics["peak_rss_delta"],
+            }
+        result["pages"] = pages
+        merged = os.path.join(workdir, "merged.pdf")
+        result["merge_output_bytes"] = os.path.getsize(merged)
+        result["compress_output_bytes"] = sum(
+            os.path.getsize(os.path.join(workdir, f)) for f in os.listdir(workdir) if f.startswith("compressed_")
+        )
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", default=os.path.join("uploads", "*.pdf"), help="Glob of input PDFs")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    files = distinct_files(args.files)
+    if not files:
+        print(f"No PDFs match {args.files}", file=sys.stderr)
+        return 1
+    print(f"{len(files)} distinct documents, {sum(os.path.getsize(f) for f in files) / 1048576:.1f} MB")
+
+    report = {"environment": environment_info(), "files": files, "results": {}}
+    for engine in args.engines.split(","):
+        result = run_isolated(engine_case, engine, files, args.repeat, timeout=args.timeout)
+        report["results"][engine] = result
+        if "skipped" in result or "error" in result:
+            print(f"{engine:<8} {result.get('skipped') or result.get('error')}")
+            continue
+        for stage in ("parse", "merge", "compress"):
+            stats = result[stage]
+            print(f"{engine:<8} {stage:<8} {stats['seconds']:8.3f}s  {stats['mb_per_second']:8.2f} MB/s  "
+                  f"{stats['pages_per_second']:9.1f} pages/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Side-by-side rasterizer benchmark: latency and memory per page.
+
+Each backend renders the same synthetic documents in a fresh process so
+peak RSS is comparable. Example (from the ``backend`` directory)::
+
+    python -m benchmarks.bench_rasterizers --pages 20 --dpi 300 --grayscale
+"""
+from typing import Any, Dict
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import environment_info, measure, run_isolated
+from benchmarks.synthetic import KINDS, cached_pdf
+
+BACKENDS = ("poppler", "pdfium")
+
+
+def render_case(backend: str, path: str, dpi: int, grayscale: bool) -> Dict[str, Any]:
+    from services.rasterizers import get_rasterizer
+
+    rasterizer = get_rasterizer(backend)
+    if not rasterizer.available():
+        return {"skipped": f"{backend} is not available"}
+
+    page_times = []
+
+    def render():
+        pages = rasterizer.render(path, dpi, grayscale=grayscale)
+        start = time.perf_counter()
+        for image in pages:
+            image.getpixel((0, 0))
+            page_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+        return len(page_times)
+
+    metrics, pages = measure(render)
+    metrics.update({
+        "pages": pages,
+        "page_latency_median": statistics.median(page_times),
+        "page_latency_max": max(page_times),
+        "first_page_latency": page_times[0],
+        "peak_rss_delta_per_page": (metrics["peak_rss_delta"] or 0) / max(pages, 1),
+    })
+    return metrics
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--grayscale", action="store_true", help="Render in grayscale, as OCR does")
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "pdfgenie-bench"))
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment_info(), "dpi": args.dpi, "grayscale": args.grayscale, "cases": {}}
+    for kind in args.kinds.split(","):
+        path = os.path.abspath(cached_pdf(args.cache_dir, kind, args.pages))
+        for backend in args.backends.split(","):
+            case_id = f"{backend}:{kind}:{args.pages}p"
+            result = run_isolated(render_case, backend, path, args.dpi, args.grayscale, timeout=args.timeout)
+            report["cases"][case_id] = result
+            if "skipped" in result or "error" in result:
+                print(f"{case_id:<24} {result.get('skipped') or result.get('error')}")
+                continue
+            print(f"{case_id:<24} {result['page_latency_median'] * 1000:8.1f} ms/page  "
+                  f"first {result['first_page_latency'] * 1000:8.1f} ms  "
+                  f"peak +{result['peak_rss_delta'] / 1048576:7.1f} MB  "
+                  f"child cpu {result['child_cpu_time']:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
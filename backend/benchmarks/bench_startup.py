@@ -0,0 +1,111 @@
+"""Cold-start time of the API: import, lifespan startup, readiness and first request.
+
+Each repetition runs in a fresh interpreter. ``import`` must stay free of
+database and subprocess work; migrations happen in ``startup`` and engine
+loading plus tool probing in the background until ``ready``. Exits with
+status 1 when the median import or ready time misses its target. Example
+(from the ``backend`` directory)::
+
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --database-url postgresql://localhost/pdfgenie_bench
+"""
+from typing import Any, Dict
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import environment_info, run_isolated
+
+# Medians on a single shared CPU; FastAPI and pydantic alone import in about 0.5 s there
+IMPORT_TARGET_SECONDS = 1.0
+READY_TARGET_SECONDS = 2.5
+
+
+def startup_case(database_url: str, migrate: bool) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="pdfgenie-startup-bench-")
+    os.environ.update(
+        DATABASE_URL=database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        MIGRATE_ON_STARTUP=str(migrate).lower(),
+        SWEEP_INTERVAL_SECONDS="0",
+    )
+    os.chdir(workdir)
+    files_before = set(os.listdir(workdir))
+
+    began = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    side_effects = sorted(set(os.listdir(workdir)) - files_before)
+
+    async def run():
+        import httpx
+
+        async with main.lifespan(main.app):
+            started = time.perf_counter()
+            while not main.app.state.ready:
+                if time.perf_counter() - started > 60:
+                    raise TimeoutError("not ready after 60 seconds")
+                await asyncio.sleep(0.005)
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                status = (await client.get("/ready")).status_code
+            first_response = time.perf_counter()
+        return started, ready, first_response, status
+
+    started, ready, first_response, status = asyncio.run(run())
+    return {
+        "import_seconds": imported - began,
+        "startup_seconds": started - imported,
+        "ready_seconds": ready - began,
+        "first_request_seconds": first_response - ready,
+        "ready_status": status,
+        "import_side_effects": side_effects,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Database to start against (default: a temporary SQLite file)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-migrate", action="store_true", help="Start with MIGRATE_ON_STARTUP=false")
+    parser.add_argument("--import-target", type=float, default=IMPORT_TARGET_SECONDS)
+    parser.add_argument("--ready-target", type=float, default=READY_TARGET_SECONDS)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for _ in range(args.repeat):
+        result = run_isolated(startup_case, args.database_url, not args.no_migrate, timeout=args.timeout)
+        if "error" in result:
+            print(result["error"], file=sys.stderr)
+            return 1
+        runs.append(result)
+
+    summary = {
+        key: round(statistics.median(run[key] for run in runs), 3)
+        for key in ("import_seconds", "startup_seconds", "ready_seconds", "first_request_seconds")
+    }
+    side_effects = sorted({path for run in runs for path in run["import_side_effects"]})
+    ok = (summary["import_seconds"] <= args.import_target and summary["ready_seconds"] <= args.ready_target
+          and not side_effects and all(run["ready_status"] == 200 for run in runs))
+    print(f"import {summary['import_seconds']:.3f}s (target {args.import_target}s)  "
+          f"startup {summary['startup_seconds']:.3f}s  ready {summary['ready_seconds']:.3f}s "
+          f"(target {args.ready_target}s)  first request {summary['first_request_seconds'] * 1000:.1f} ms  "
+          f"{'ok' if ok else 'MISSED TARGET'}")
+    if side_effects:
+        print(f"importing main created: {', '.join(side_effects)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment_info(), "summary": summary, "runs": runs}, f, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Measurement, isolation and baseline comparison helpers for the benchmark suite"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Minimum absolute change before a relative slowdown counts as a regression,
+# so that sub-millisecond noise on tiny cases is not flagged
+REGRESSION_FLOORS = {
+    "wall_time": 0.05,
+    "cpu_time": 0.05,
+    "child_cpu_time": 0.05,
+    "peak_rss_delta": 8 * 1024 * 1024,
+    "output_size": 1024,
+}
+
+
+def _maxrss_bytes(who) -> Optional[int]:
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _child_cpu_seconds() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(fn: Callable[[], Any], repeat: int = 1) -> Tuple[Dict[str, Any], Any]:
+    """Run ``fn`` ``repeat`` times and return ``(metrics, last_result)``.
+
+    CPU time is split into this process and its subprocesses (pdftoppm,
+    tesseract). Peak RSS is the process high-water mark, so callers should
+    run each case in a fresh process via :func:`run_isolated`.
+    """
+    rss_before = _maxrss_bytes(resource.RUSAGE_SELF) if resource else None
+    walls, cpus, child_cpus = [], [], []
+    result = None
+
+    for _ in range(repeat):
+        gc.collect()
+        wall_start, cpu_start, child_start = time.perf_counter(), time.process_time(), _child_cpu_seconds()
+        result = fn()
+        walls.append(time.perf_counter() - wall_start)
+        cpus.append(time.process_time() - cpu_start)
+        child_cpus.append(_child_cpu_seconds() - child_start)
+
+    peak_rss = _maxrss_bytes(resource.RUSAGE_SELF) if resource else None
+    metrics = {
+        "repeat": repeat,
+        "wall_time": statistics.median(walls),
+        "wall_time_min": min(walls),
+        "cpu_time": statistics.median(cpus),
+        "child_cpu_time": statistics.median(child_cpus),
+        "peak_rss": peak_rss,
+        "peak_rss_delta": peak_rss - rss_before if peak_rss is not None else None,
+        "child_peak_rss": _maxrss_bytes(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+    return metrics, result
+
+
+def _isolated_entry(queue, target, args):
+    try:
+        queue.put({"ok": True, "value": target(*args)})
+    except BaseException as e:
+        queue.put({"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+
+
+def run_isolated(target: Callable, *args, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Run ``target(*args)`` in a fresh spawned interpreter and return its result.
+
+    Returns ``{"error": ...}`` instead of raising when the case fails, so that
+    one broken case does not abort the whole suite.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_isolated_entry, args=(queue, target, args))
+    process.start()
+    try:
+        outcome = queue.get(timeout=timeout)
+    except Exception:
+        process.terminate()
+        return {"error": f"timed out after {timeout} seconds"}
+    finally:
+        process.join()
+    if outcome["ok"]:
+        return outcome["value"]
+    return {"error": outcome["error"], "traceback": outcome["traceback"]}
+
+
+def environment_info() -> Dict[str, Any]:
+    commit = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        pass
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def save_results(path: str, results: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.15) -> List[Dict[str, Any]]:
+    """Return metrics that got worse than ``baseline`` by more than ``threshold`` (relative)"""
+    regressions = []
+    for case_id, current in results.get("cases", {}).items():
+        previous = baseline.get("cases", {}).get(case_id)
+        if not previous or "error" in current or "skipped" in current or "error" in previous or "skipped" in previous:
+            continue
+        for metric, floor in REGRESSION_FLOORS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + threshold) and after - before > floor:
+                regressions.append({
+                    "case": case_id,
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change": (after - before) / before if before else None,
+                })
+    return regressions
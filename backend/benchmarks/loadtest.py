@@ -0,0 +1,401 @@
+"""Load test: simulated users driving the API over HTTP at a target concurrency.
+
+Starts the app with uvicorn (``--workers`` processes) in a scratch directory
+against a temporary SQLite file or ``--database-url``, registers and logs in
+``--users`` users, uploads ``--files-per-user`` synthetic PDFs for each, then
+runs ``--concurrency`` virtual users for ``--duration`` seconds. Each virtual
+user sends operations drawn from ``--mix`` back to back. A comma-separated
+``--concurrency`` runs one stage per level, which shows where throughput stops
+growing and latency starts to.
+
+Reported per stage: latency percentiles, error rate and throughput per
+operation, and the server's event loop lag (``/metrics``) and RSS sampled
+every ``--sample-interval`` seconds. ``--url`` targets a running deployment
+instead (RSS then comes from ``/metrics``, single-worker only). Rate limits
+and the result cache are off in the started server unless ``--rate-limit`` or
+``--result-cache`` is given, so every request does the work. Example (from
+the ``backend`` directory)::
+
+    python -m benchmarks.loadtest --users 20 --concurrency 4,16,64 --duration 60 --mix merge=3,split=3,compress=2,convert=1
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks.harness import environment_info
+from benchmarks.synthetic import KINDS, cached_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPERATIONS = ("merge", "split", "compress", "convert", "ocr")
+DEFAULT_MIX = "merge=3,split=3,compress=2,convert=1,ocr=1"
+DISTINCT_DOCUMENTS = 8  # synthetic documents per kind; users upload copies of these
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}'. Expected one of: {', '.join(OPERATIONS)}")
+        mix[operation] = float(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _process_tree_rss(root: int) -> Optional[int]:
+    """Resident bytes of ``root`` and all its descendants, from /proc (Linux only)"""
+    if not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{entry}/statm") as f:
+                rss[int(entry)] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+    total, pending = 0, [root]
+    while pending:
+        pid = pending.pop()
+        total += rss.get(pid, 0)
+        pending.extend(children.get(pid, ()))
+    return total
+
+
+class Server:
+    """The API started with uvicorn in a scratch directory"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="pdfgenie-loadtest-")
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    def environment(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update(
+            DATABASE_URL=self.args.database_url or f"sqlite:///{os.path.join(self.workdir, 'loadtest.db')}",
+            # The schema is created once up front so workers do not race to create it
+            MIGRATE_ON_STARTUP="false",
+            RATE_LIMIT_ENABLED=str(self.args.rate_limit).lower(),
+            RESULT_CACHE_ENABLED=str(self.args.result_cache).lower(),
+            LOG_LEVEL=env.get("LOG_LEVEL", "WARNING"),  # keep the report readable
+            PYTHONPATH=os.pathsep.join(filter(None, (BACKEND_DIR, env.get("PYTHONPATH")))),
+        )
+        if self.args.workers > 1:
+            multiproc_dir = os.path.join(self.workdir, "prometheus")
+            os.makedirs(multiproc_dir, exist_ok=True)
+            env["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+        return env
+
+    def start(self):
+        env = self.environment()
+        subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "migrate.py")], cwd=self.workdir, env=env, check=True)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.args.workers), "--log-level", "warning"],
+            cwd=self.workdir, env=env
+        )
+
+    def rss(self) -> Optional[int]:
+        return _process_tree_rss(self.process.pid) if self.process else None
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _metric_samples(text: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    from prometheus_client.parser import text_string_to_metric_families
+
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            samples.setdefault(sample.name, []).append((sample.labels, sample.value))
+    return samples
+
+
+def _lag_buckets(samples) -> Dict[float, float]:
+    buckets: Counter = Counter()
+    for labels, value in samples.get("pdfgenie_event_loop_lag_seconds_bucket", ()):
+        buckets[float(labels["le"])] += value
+    return dict(buckets)
+
+
+def _bucket_quantile(before: Dict[float, float], after: Dict[float, float], fraction: float) -> Optional[float]:
+    """Upper bound of the bucket holding the ``fraction`` quantile of the observations between two scrapes"""
+    counts = sorted((le, after[le] - before.get(le, 0)) for le in after)
+    if not counts or counts[-1][1] <= 0:
+        return None
+    for le, count in counts:
+        if count >= counts[-1][1] * fraction:
+            return le
+    return None
+
+
+class LoadTest:
+    def __init__(self, args, base_url: str, rss: Callable[[], Optional[int]]):
+        self.args = args
+        self.base_url = base_url
+        self.rss = rss
+        self.mix = parse_mix(args.mix)
+        self.users: List[Dict[str, Any]] = []
+
+    async def _wait_ready(self, client, timeout: float):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return
+            except Exception:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{self.base_url} was not ready after {timeout:.0f}s")
+            await asyncio.sleep(0.25)
+
+    async def _setup_user(self, client, index: int, prefix: str, documents: List[str]):
+        credentials = {"username": f"load-{prefix}-{index}", "password": f"password-{index}"}
+        response = await client.post("/auth/register", json={**credentials, "email": f"load-{prefix}-{index}@example.com"})
+        response.raise_for_status()
+        response = await client.post("/auth/login", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        file_ids = []
+        for number in range(self.args.files_per_user):
+            path = documents[(index + number) % len(documents)]
+            with open(path, "rb") as f:
+                response = await client.post(
+                    "/pdf/upload", files={"file": (os.path.basename(path), f.read(), "application/pdf")}, headers=headers
+                )
+            response.raise_for_status()
+            file_ids.append(response.json()["id"])
+        self.users.append({"headers": headers, "file_ids": file_ids})
+
+    def _request(self, operation: str, user: Dict[str, Any], rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+        file_id = rng.choice(user["file_ids"])
+        if operation == "merge":
+            return "/pdf/merge", {"file_ids": rng.sample(user["file_ids"], min(2, len(user["file_ids"])))}
+        if operation == "split":
+            pages = sorted(rng.sample(range(1, self.args.pages + 1), max(1, self.args.pages // 2)))
+            return "/pdf/split", {"file_id": file_id, "pages": pages}
+        if operation == "compress":
+            return "/pdf/compress", {"file_id": file_id, "quality": rng.choice((40, 60, 80))}
+        if operation == "convert":
+            return "/pdf/convert", {"file_id": file_id, "format": "png", "dpi": self.args.dpi}
+        return "/ocr/extract-text", {"file_id": file_id, "language": "eng", "dpi": self.args.dpi}
+
+    async def _scrape(self, client):
+        try:
+            response = await client.get("/metrics")
+            return _metric_samples(response.text) if response.status_code == 200 else {}
+        except Exception:
+            return {}
+
+    async def _stage(self, client, concurrency: int) -> Dict[str, Any]:
+        latencies: Dict[str, List[float]] = {operation: [] for operation in self.mix}
+        statuses: Dict[str, Counter] = {operation: Counter() for operation in self.mix}
+        timeline: List[Dict[str, Any]] = []
+        in_flight = 0
+        operations, weights = list(self.mix), list(self.mix.values())
+        began = time.perf_counter()
+        deadline = began + self.args.duration
+
+        async def virtual_user(number: int):
+            nonlocal in_flight
+            rng = random.Random(f"{self.args.seed}:{concurrency}:{number}")
+            user = self.users[number % len(self.users)]
+            while time.perf_counter() < deadline:
+                operation = rng.choices(operations, weights)[0]
+                url, payload = self._request(operation, user, rng)
+                in_flight += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload, headers=user["headers"])
+                    status = str(response.status_code)
+                except Exception as e:
+                    status = type(e).__name__
+                finally:
+                    in_flight -= 1
+                latencies[operation].append(time.perf_counter() - started)
+                statuses[operation][status] += 1
+
+        async def sampler():
+            while True:
+                samples = await self._scrape(client)
+                rss = self.rss()
+                if rss is None:
+                    rss = sum(value for _, value in samples.get("process_resident_memory_bytes", ())) or None
+                lag = samples.get("pdfgenie_event_loop_lag_max_seconds")
+                timeline.append({
+                    "t": round(time.perf_counter() - began, 1),
+                    "rss_mb": round(rss / 1048576, 1) if rss else None,
+                    "loop_lag_ms": round(max(value for _, value in lag) * 1000, 1) if lag else None,
+                    "in_flight": in_flight,
+                    "completed": sum(len(values) for values in latencies.values()),
+                })
+                await asyncio.sleep(self.args.sample_interval)
+
+        lag_before = _lag_buckets(await self._scrape(client))
+        sampling = asyncio.create_task(sampler())
+        await asyncio.gather(*(virtual_user(number) for number in range(concurrency)))
+        elapsed = time.perf_counter() - began
+        sampling.cancel()
+        await asyncio.gather(sampling, return_exceptions=True)
+        lag_after = _lag_buckets(await self._scrape(client))
+
+        def summary(values: List[float], counts: Counter) -> Dict[str, Any]:
+            errors = sum(count for status, count in counts.items() if not status.startswith("2"))
+            return {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4) if values else 0.0,
+                "statuses": dict(counts),
+                "requests_per_second": round(len(values) / elapsed, 2),
+                **{
+                    f"{name}_ms": round(value * 1000, 1) if value is not None else None
+                    for name, value in (("p50", percentile(values, 0.5)), ("p90", percentile(values, 0.9)),
+                                        ("p99", percentile(values, 0.99)), ("max", max(values, default=None)))
+                },
+            }
+
+        lag_p99 = _bucket_quantile(lag_before, lag_after, 0.99)
+        rss_samples = [point["rss_mb"] for point in timeline if point["rss_mb"] is not None]
+        lag_samples = [point["loop_lag_ms"] for point in timeline if point["loop_lag_ms"] is not None]
+        return {
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 2),
+            "total": summary(
+                [value for values in latencies.values() for value in values],
+                sum(statuses.values(), Counter())
+            ),
+            "operations": {operation: summary(latencies[operation], statuses[operation]) for operation in self.mix},
+            "server": {
+                "loop_lag_p99_ms": round(lag_p99 * 1000, 1) if lag_p99 is not None else None,
+                "loop_lag_max_ms": max(lag_samples, default=None),
+                "rss_peak_mb": max(rss_samples, default=None),
+            },
+            "timeline": timeline,
+        }
+
+    async def run(self, levels: List[int]) -> List[Dict[str, Any]]:
+        import httpx
+
+        documents = [
+            cached_pdf(self.args.cache_dir, kind, self.args.pages, seed)
+            for kind in self.args.kinds.split(",") for seed in range(DISTINCT_DOCUMENTS)
+        ]
+        limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.args.request_timeout, limits=limits) as client:
+            await self._wait_ready(client, self.args.startup_timeout)
+            prefix = uuid.uuid4().hex[:8]
+            semaphore = asyncio.Semaphore(8)
+
+            async def setup(index: int):
+                async with semaphore:
+                    await self._setup_user(client, index, prefix, documents)
+
+            await asyncio.gather(*(setup(index) for index in range(self.args.users)))
+            return [await self._stage(client, concurrency) for concurrency in levels]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load an already running API instead of starting one")
+    parser.add_argument("--database-url", default=None,
+                        help="Database for the started server (default: a temporary SQLite file)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the started server")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--files-per-user", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=5, help="Pages per synthetic document")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="Synthetic document kinds to upload")
+    parser.add_argument("--concurrency", default="8", help="Comma-separated virtual user counts, one stage each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per stage")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. merge=3,split=3,compress=2")
+    parser.add_argument("--dpi", type=int, default=150, help="DPI of convert and OCR requests")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--rate-limit", action="store_true", help="Keep per-user rate limits on in the started server")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the result cache on in the started server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "pdfgenie-bench-inputs"))
+    parser.add_argument("--output", help="Write JSON results (including the timelines) to this file")
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    parse_mix(args.mix)
+    if args.files_per_user < 1:
+        parser.error("--files-per-user must be at least 1")
+
+    server = None if args.url else Server(args)
+    try:
+        if server:
+            server.start()
+        load_test = LoadTest(args, args.url or server.url, server.rss if server else lambda: None)
+        stages = asyncio.run(load_test.run(levels))
+    finally:
+        if server:
+            server.stop()
+
+    report = {
+        "environment": environment_info(),
+        "target": args.url or f"uvicorn --workers {args.workers}",
+        "database": "external" if args.url else (args.database_url.split("://")[0] if args.database_url else "sqlite"),
+        "mix": load_test.mix,
+        "users": args.users,
+        "pages": args.pages,
+        "stages": stages,
+    }
+    for stage in stages:
+        total, server_stats = stage["total"], stage["server"]
+        print(f"concurrency {stage['concurrency']:<4} {total['requests_per_second']:7.2f} req/s  "
+              f"p50 {total['p50_ms']} ms  p99 {total['p99_ms']} ms  errors {total['error_rate']:.1%}  "
+              f"loop lag p99 {server_stats['loop_lag_p99_ms']} ms  max {server_stats['loop_lag_max_ms']} ms  "
+              f"RSS peak {server_stats['rss_peak_mb']} MB")
+        for operation, result in stage["operations"].items():
+            print(f"    {operation:<9} {result['requests']:>6} requests  p50 {result['p50_ms']} ms  "
+                  f"p90 {result['p90_ms']} ms  p99 {result['p99_ms']} ms  errors {result['error_rate']:.1%} "
+                  f"{result['statuses']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
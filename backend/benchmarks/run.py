@@ -0,0 +1,135 @@
+"""Run the PDF/OCR service benchmark suite.
+
+Examples (from the ``backend`` directory)::
+
+    # Record a baseline
+    python -m benchmarks.run --suite quick --output baseline.json
+
+    # After a change: compare against it, exit code 1 on regressions
+    python -m benchmarks.run --suite quick --output current.json --baseline baseline.json
+"""
+from typing import Any, Dict, List
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.harness import compare, environment_info, load_results, run_isolated, save_results
+from benchmarks.runners import OPERATIONS, RUNNERS
+from benchmarks.synthetic import KINDS, cached_pdf
+from services.rasterizers import get_rasterizer
+
+SUITES = {
+    "quick": [1, 10],
+    "full": [1, 10, 100, 1000],
+}
+
+# Operations that rasterize every page and the external tools they need
+# besides the rasterizer itself
+RASTER_OPERATIONS = {"convert": [], "ocr": ["tesseract"]}
+
+
+def build_cases(modes: List[str], operations: List[str], kinds: List[str], page_counts: List[int]) -> List[Dict[str, Any]]:
+    cases = []
+    for mode, operation, kind, pages in itertools.product(modes, operations, kinds, page_counts):
+        cases.append({
+            "id": f"{mode}:{operation}:{kind}:{pages}p",
+            "mode": mode,
+            "operation": operation,
+            "kind": kind,
+            "pages": pages,
+        })
+    return cases
+
+
+def skip_reason(case: Dict[str, Any], max_raster_pages: int):
+    tools = RASTER_OPERATIONS.get(case["operation"])
+    if tools is None:
+        return None
+    missing = [tool for tool in tools if not shutil.which(tool)]
+    rasterizer = get_rasterizer()
+    if not rasterizer.available():
+        missing.append(rasterizer.name)
+    if missing:
+        return f"missing tools: {', '.join(missing)}"
+    if case["pages"] > max_raster_pages:
+        return f"more than --max-raster-pages ({max_raster_pages}) pages"
+    return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--pages", help="Comma separated page counts, overrides --suite")
+    parser.add_argument("--mode", choices=["direct", "api", "both"], default="direct")
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-raster-pages", type=int, default=100,
+                        help="Skip convert/OCR cases above this page count (1000-page OCR takes hours)")
+    parser.add_argument("--timeout", type=float, default=3600, help="Per-case timeout in seconds")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "pdfgenie-bench-inputs"))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    modes = ["direct", "api"] if args.mode == "both" else [args.mode]
+    page_counts = [int(p) for p in args.pages.split(",")] if args.pages else SUITES[args.suite]
+    cases = build_cases(modes, args.operations.split(","), args.kinds.split(","), page_counts)
+
+    results = {"meta": {**environment_info(), "suite": args.suite, "repeat": args.repeat}, "cases": {}}
+    # Run from the backend directory regardless of where we were invoked
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+
+    for case in cases:
+        reason = skip_reason(case, args.max_raster_pages)
+        if reason:
+            results["cases"][case["id"]] = {"skipped": reason}
+            print(f"{case['id']:<40} skipped ({reason})")
+            continue
+
+        pdf_path = cached_pdf(args.cache_dir, case["kind"], case["pages"])
+        workdir = tempfile.mkdtemp(prefix="pdfgenie-bench-")
+        try:
+            outcome = run_isolated(RUNNERS[case["mode"]], case, pdf_path, workdir, args.repeat, timeout=args.timeout)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        results["cases"][case["id"]] = outcome
+        if "error" in outcome:
+            print(f"{case['id']:<40} error: {outcome['error']}")
+        else:
+            rss = outcome["peak_rss_delta"]
+            print(
+                f"{case['id']:<40} wall {outcome['wall_time']:8.3f}s  cpu {outcome['cpu_time']:8.3f}s"
+                f"  child cpu {outcome['child_cpu_time']:8.3f}s"
+                f"  rss +{(rss or 0) / 1048576:7.1f}MB  out {outcome['output_size']:>10}B"
+            )
+
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['case']} {regression['metric']}: "
+                f"{regression['baseline']:.4g} -> {regression['current']:.4g}"
+                + (f" (+{regression['change'] * 100:.1f}%)" if regression["change"] is not None else "")
+            )
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
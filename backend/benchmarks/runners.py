@@ -0,0 +1,140 @@
+"""Benchmark case runners.
+
+Each runner executes inside a fresh process (see ``harness.run_isolated``)
+with its own working directory and SQLite database, because the services use
+relative ``uploads/`` and ``processed/`` paths and read ``DATABASE_URL`` at
+import time.
+"""
+from typing import Any, Dict, List
+import os
+import shutil
+import uuid
+
+from benchmarks.harness import measure
+
+OPERATIONS = ("merge", "split", "compress", "convert", "ocr")
+
+
+def _prepare_workdir(workdir: str):
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Repeated runs must measure the operation, not the result cache
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+    from logging_config import configure_logging
+    configure_logging()
+
+
+def _split_pages(page_count: int) -> List[int]:
+    """Up to ten evenly spaced pages, always including the first and last"""
+    if page_count <= 10:
+        return list(range(1, page_count + 1))
+    step = (page_count - 1) / 9
+    return sorted({round(1 + i * step) for i in range(10)})
+
+
+def run_direct_case(case: Dict[str, Any], pdf_path: str, workdir: str, repeat: int) -> Dict[str, Any]:
+    """Call the service method directly, outside of FastAPI"""
+    _prepare_workdir(workdir)
+
+    from database import SessionLocal, engine
+    from models import Base, User, PDFDocument
+    from services.pdf_service import PDFService
+    from services.ocr_service import OCRService
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(id=str(uuid.uuid4()), username="bench", email="bench@example.com", password_hash="-")
+    db.add(user)
+
+    file_ids = []
+    for copy in range(2 if case["operation"] == "merge" else 1):
+        file_id = str(uuid.uuid4())
+        os.makedirs("uploads", exist_ok=True)
+        stored_path = os.path.join("uploads", f"{file_id}_{os.path.basename(pdf_path)}")
+        shutil.copyfile(pdf_path, stored_path)
+        db.add(PDFDocument(
+            id=file_id, filename=os.path.basename(pdf_path), original_filename=os.path.basename(pdf_path),
+            file_path=stored_path, file_size=os.path.getsize(stored_path), user_id=user.id
+        ))
+        file_ids.append(file_id)
+    db.commit()
+
+    pdf_service, ocr_service = PDFService(), OCRService()
+    operation = case["operation"]
+    calls = {
+        "merge": lambda: pdf_service.merge_pdfs(file_ids, user.id, db),
+        "split": lambda: pdf_service.split_pdf(file_ids[0], _split_pages(case["pages"]), user.id, db),
+        "compress": lambda: pdf_service.compress_pdf(file_ids[0], 60, user.id, db),
+        "convert": lambda: pdf_service.convert_to_images(file_ids[0], "png", user.id, db),
+        "ocr": lambda: ocr_service.extract_text_from_pdf(file_ids[0], "eng", user.id, db),
+    }
+
+    metrics, result = measure(calls[operation], repeat)
+
+    if operation == "merge":
+        output_size = result["file_size"]
+    elif operation == "split":
+        output_size = sum(os.path.getsize(path) for path in result["output_paths"])
+    elif operation == "compress":
+        output_size = result["compressed_size"]
+    elif operation == "convert":
+        output_size = result["total_size"]
+    else:
+        output_size = os.path.getsize(result["output_path"])
+
+    db.close()
+    metrics["output_size"] = output_size
+    metrics["input_size"] = os.path.getsize(pdf_path)
+    return metrics
+
+
+def run_api_case(case: Dict[str, Any], pdf_path: str, workdir: str, repeat: int) -> Dict[str, Any]:
+    """Drive the operation through the FastAPI app with an in-process client"""
+    _prepare_workdir(workdir)
+
+    from fastapi.testclient import TestClient
+    import main
+
+    # Entering the client runs the app lifespan, which creates the schema
+    with TestClient(main.app) as client:
+        credentials = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+        client.post("/auth/register", json=credentials).raise_for_status()
+        token = client.post("/auth/login", json=credentials).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        file_ids = []
+        for copy in range(2 if case["operation"] == "merge" else 1):
+            with open(pdf_path, "rb") as f:
+                response = client.post(
+                    "/pdf/upload", files={"file": (os.path.basename(pdf_path), f, "application/pdf")}, headers=headers
+                )
+            response.raise_for_status()
+            file_ids.append(response.json()["id"])
+
+        operation = case["operation"]
+        requests = {
+            "merge": ("/pdf/merge", {"file_ids": file_ids}),
+            "split": ("/pdf/split", {"file_id": file_ids[0], "pages": _split_pages(case["pages"])}),
+            "compress": ("/pdf/compress", {"file_id": file_ids[0], "quality": 60}),
+            "convert": ("/pdf/convert", {"file_id": file_ids[0], "format": "png"}),
+            "ocr": ("/ocr/extract-text", {"file_id": file_ids[0], "language": "eng"}),
+        }
+        url, payload = requests[operation]
+
+        def call():
+            response = client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response
+
+        metrics, response = measure(call, repeat)
+        metrics["output_size"] = len(response.content)
+        metrics["input_size"] = os.path.getsize(pdf_path)
+        return metrics
+
+
+RUNNERS = {
+    "direct": run_direct_case,
+    "api": run_api_case,
+}
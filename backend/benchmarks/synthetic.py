@@ -0,0 +1,91 @@
+"""Deterministic synthetic PDFs for benchmarks.
+
+Three document kinds are supported:
+
+* ``text``    - vector text only, like a born-digital manual
+* ``scanned`` - one grayscale raster per page, like a scanner output
+* ``mixed``   - alternating text and scanned pages
+"""
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from PIL import Image, ImageDraw
+import io
+import os
+import random
+
+KINDS = ("text", "scanned", "mixed")
+
+_WORDS = (
+    "contract maintenance clause payment schedule installation client vendor "
+    "warranty liability delivery inspection invoice tender specification "
+    "agreement schedule material labour approval completion period notice"
+).split()
+
+
+def _paragraphs(rng: random.Random, lines: int):
+    for _ in range(lines):
+        yield " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 12)))
+
+
+def _scanned_image(rng: random.Random, page_num: int, dpi: int = 150) -> Image.Image:
+    width, height = int(letter[0] / 72 * dpi), int(letter[1] / 72 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((dpi // 2, dpi // 2), f"Scanned page {page_num}", fill=0)
+    y = dpi
+    for line in _paragraphs(rng, 40):
+        draw.text((dpi // 2, y), line, fill=rng.randint(0, 60))
+        y += int(dpi * 0.22)
+    # Light speckle noise so pages do not compress to nothing
+    for _ in range(width * height // 400):
+        image.putpixel((rng.randrange(width), rng.randrange(height)), rng.randint(120, 220))
+    return image
+
+
+def generate_pdf(path: str, kind: str = "text", pages: int = 1, seed: int = 0) -> str:
+    """Write a synthetic PDF of ``kind`` with ``pages`` pages to ``path``"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown document kind '{kind}'. Expected one of: {', '.join(KINDS)}")
+
+    rng = random.Random(f"{kind}:{pages}:{seed}")
+    pdf = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+
+    for page_num in range(1, pages + 1):
+        scanned = kind == "scanned" or (kind == "mixed" and page_num % 2 == 0)
+        if scanned:
+            buffer = io.BytesIO()
+            _scanned_image(rng, page_num).save(buffer, "JPEG", quality=75)
+            buffer.seek(0)
+            pdf.drawImage(ImageReader(buffer), 0, 0, width=width, height=height)
+        else:
+            pdf.setFont("Helvetica-Bold", 16)
+            pdf.drawString(72, height - 72, f"Section {page_num}")
+            pdf.setFont("Helvetica", 10)
+            y = height - 100
+            for line in _paragraphs(rng, 45):
+                pdf.drawString(72, y, line)
+                y -= 14
+        pdf.showPage()
+
+    pdf.save()
+    return path
+
+
+def cached_pdf(cache_dir: str, kind: str, pages: int, seed: int = 0) -> str:
+    """Return a generated PDF from ``cache_dir``, creating it on first use"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{kind}_{pages}p_s{seed}.pdf")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        generate_pdf(tmp_path, kind, pages, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def scanned_images(pages: int, seed: int = 0, dpi: int = 300):
+    """Yield ``pages`` scanned-style page images at ``dpi`` without going through a PDF"""
+    rng = random.Random(f"images:{pages}:{seed}")
+    for page_num in range(1, pages + 1):
+        yield _scanned_image(rng, page_num, dpi)
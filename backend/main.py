@@ -1,127 +1,341 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import uvicorn
+from contextlib import asynccontextmanager
+from decouple import config
 import os
 import time
-from typing import List, Optional
-import aiofiles
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import threading
 import uuid
+import json
+import zipfile
+import mimetypes
 from datetime import datetime, timedelta
-import jwt
-from passlib.context import CryptContext
 
-from database import get_db, engine
-from models import Base, User, PDFDocument, OCRResult
+from logging_config import configure_logging
+configure_logging()
+
+from database import get_async_db, AsyncSessionLocal, SessionLocal, async_engine, init_db
+from models import User, PDFDocument, OCRResult, ProcessingJob
 from schemas import (
     UserCreate, UserLogin, UserResponse, Token,
     PDFUploadResponse, PDFMergeRequest, PDFSplitRequest,
-    PDFCompressRequest, PDFConvertRequest, OCRRequest
+    PDFCompressRequest, PDFConvertRequest, OCRRequest,
+    JobCreateRequest, ProcessingJobResponse
 )
 from services.pdf_service import PDFService
-from services.ocr_service import OCRService
+from services.ocr_service import OCRService, OCR_PAGE_BATCH, format_page, ocr_pages_query
 from services.auth_service import AuthService
+from services.progress_service import JobCancelled, progress_service
+from services.rate_limit_service import RateLimitService
+from services.scheduler_service import FairShareScheduler
+from services.cost_service import CostService
+from services.result_cache_service import ResultCacheService
+from services.artifact_service import ArtifactSweeper, PROCESSED_DIR, job_output_key
+from services.download_service import DownloadService
+from services.storage_service import storage
+from services.recovery_service import JobRecovery
+from services.job_queue import JobQueue, QUEUED_OPERATIONS
+from services.tool_detection import detect_tools
+from services.validation_service import ValidationService
+from services.profiling_service import PROFILE_FORMATS, ProfilingMiddleware, ProfilingService
+from services.word_boxes import WordBoxes, find_hits
+from metrics import HTTP_REQUEST_SECONDS, LoopLagMonitor, render_metrics
+from responses import CompressionMiddleware, DefaultJSONResponse, json_line
 
-# Create necessary directories
-os.makedirs("processed", exist_ok=True)
-os.makedirs("uploads", exist_ok=True)
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="PDFGenie API",
-    description="A comprehensive PDF processing API with OCR capabilities for PDFGenie application",
-    version="1.0.0"
-)
-
-# Mount static files
-app.mount("/processed", StaticFiles(directory="processed"), name="processed")
+logger = logging.getLogger("main")
 
 # Get allowed origins from environment variable
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '').split(',')
 # Filter out any empty strings that might result from trailing commas
 ALLOWED_ORIGINS = [origin for origin in CORS_ORIGINS if origin]
 
-# CORS middleware configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS,
-    allow_origin_regex=r'https?://(?:.*\.)?(pdfgenie\.netlify\.app|mindapt\.in)$',
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-    max_age=600,  # Cache preflight requests for 10 minutes
-)
-
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Extraction results of documents up to this many pages also carry the text inline (0 = never)
+OCR_INLINE_TEXT_PAGES = config("OCR_INLINE_TEXT_PAGES", default=50, cast=int)
+OCR_PAGES_MAX_LIMIT = 500
+OCR_SEARCH_MAX_HITS = 500
 
 # Services
-pdf_service = PDFService()
-ocr_service = OCRService()
-auth_service = AuthService()
+class ServiceRegistry:
+    """The application's services, each built on first use.
+
+    Construction loads the PDF and OCR engines, so it happens during startup
+    warm-up (or on the first request that needs a service) rather than when
+    ``main`` is imported.
+    """
+
+    def __init__(self):
+        self._services: Dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._services[name] = factory()
+        return service
+
+    @property
+    def pdf_service(self) -> PDFService:
+        return self._get("pdf_service", PDFService)
+
+    @property
+    def ocr_service(self) -> OCRService:
+        return self._get("ocr_service", OCRService)
+
+    @property
+    def auth_service(self) -> AuthService:
+        return self._get("auth_service", AuthService)
+
+    @property
+    def rate_limit_service(self) -> RateLimitService:
+        return self._get("rate_limit_service", RateLimitService)
+
+    @property
+    def heavy_job_scheduler(self) -> FairShareScheduler:
+        return self._get("heavy_job_scheduler", FairShareScheduler)
+
+    @property
+    def cost_service(self) -> CostService:
+        return self._get("cost_service", lambda: CostService(self.pdf_service.documents))
+
+    @property
+    def result_cache(self) -> ResultCacheService:
+        return self._get("result_cache", ResultCacheService)
+
+    @property
+    def artifact_sweeper(self) -> ArtifactSweeper:
+        return self._get("artifact_sweeper", ArtifactSweeper)
+
+    @property
+    def download_service(self) -> DownloadService:
+        return self._get("download_service", DownloadService)
+
+    @property
+    def job_recovery(self) -> JobRecovery:
+        return self._get("job_recovery", lambda: JobRecovery(self.ocr_service, self.heavy_job_scheduler))
+
+    @property
+    def job_queue(self) -> JobQueue:
+        return self._get("job_queue", JobQueue)
+
+    @property
+    def loop_lag_monitor(self) -> LoopLagMonitor:
+        return self._get("loop_lag_monitor", lambda: LoopLagMonitor(
+            config("LOOP_LAG_INTERVAL_SECONDS", default=0.5, cast=float),
+            config("LOOP_LAG_WINDOW_SECONDS", default=10, cast=float)
+        ))
+
+    @property
+    def profiling_service(self) -> ProfilingService:
+        return self._get("profiling_service", ProfilingService)
+
+    @property
+    def validation_service(self) -> ValidationService:
+        return self._get("validation_service", lambda: ValidationService(self.pdf_service.documents))
+
+registry = ServiceRegistry()
+
+# Startup and shutdown
+async def _warm_up(app: FastAPI):
+    """Build the engines and probe external tools off the event loop, then report ready"""
+    try:
+        await asyncio.to_thread(lambda: (registry.pdf_service, registry.ocr_service))
+        registry.job_recovery.start()
+        app.state.tools = await asyncio.to_thread(
+            detect_tools, registry.ocr_service.backend, registry.pdf_service.rasterizer
+        )
+        app.state.ready = True
+        logger.info(f"Ready {time.perf_counter() - app.state.started_at:.2f}s after startup began")
+    except Exception:
+        logger.exception("Startup warm-up failed; /ready will report unavailable")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.started_at = time.perf_counter()
+    # With several workers, set MIGRATE_ON_STARTUP=false and run migrate.py once per deploy instead
+    if config("MIGRATE_ON_STARTUP", default=True, cast=bool):
+        await asyncio.to_thread(init_db)
+    for directory in ("uploads", PROCESSED_DIR):
+        os.makedirs(directory, exist_ok=True)
+    registry.artifact_sweeper.start()
+    registry.loop_lag_monitor.start()
+    warm_up = asyncio.create_task(_warm_up(app))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        warm_up.cancel()
+        await asyncio.gather(warm_up, return_exceptions=True)
+        await registry.artifact_sweeper.stop()
+        await registry.loop_lag_monitor.stop()
+        await registry.job_recovery.stop()
+        # Jobs still running in the heavy-job threads are stopped and resumed or failed
+        await registry.job_recovery.hand_back()
+        registry.heavy_job_scheduler.shutdown()
+        await async_engine.dispose()
+
+async def record_request_metrics(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep cardinality bounded
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        request.method, getattr(route, "path", "unmatched"), str(response.status_code)
+    ).observe(time.perf_counter() - start)
+    return response
 
-# Create upload directory
-os.makedirs("uploads", exist_ok=True)
-os.makedirs("processed", exist_ok=True)
+router = APIRouter()
 
-# Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/processed", StaticFiles(directory="processed"), name="processed")
+@router.get("/metrics")
+async def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
 
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "PDF Master API is running"}
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
-# Initialize services
-auth_service = AuthService()
-security = HTTPBearer()
+@router.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness: startup warm-up has finished and the database answers"""
+    state = request.app.state
+    database = True
+    try:
+        async with async_engine.connect() as connection:
+            await asyncio.wait_for(connection.execute(text("SELECT 1")), timeout=2.0)
+    except Exception as e:
+        logger.warning(f"Readiness check could not reach the database: {e}")
+        database = False
+    ready = state.ready and database
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "unavailable",
+            "checks": {"startup": state.ready, "database": database},
+            "tools": state.tools,
+        }
+    )
 
 # Authentication endpoints
-@app.post("/auth/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    return await auth_service.register_user(user, db)
-
-@app.post("/auth/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    return await auth_service.authenticate_user(user, db)
-
-@app.get("/auth/me", response_model=UserResponse)
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    return await auth_service.get_current_user(credentials.credentials, db)
+@router.post("/auth/register", response_model=UserResponse)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await registry.auth_service.register_user(user, db)
+
+@router.post("/auth/login", response_model=Token)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    return await registry.auth_service.authenticate_user(user, db)
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """Authenticate the bearer token.
+
+    Uses its own short async session, so endpoints that go on to run a job do
+    not hold a connection for the whole request.
+    """
+    async with AsyncSessionLocal() as db:
+        return await registry.auth_service.get_current_user(credentials.credentials, db)
+
+async def admin_user(user: User = Depends(current_user)) -> User:
+    if not registry.profiling_service.is_admin(user.username):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+@router.get("/auth/me", response_model=UserResponse)
+async def get_current_user(user: User = Depends(current_user)):
+    return user
 
 # PDF Processing endpoints
-@app.post("/pdf/upload", response_model=PDFUploadResponse)
+def _with_session(fn: Callable, *args, **kwargs):
+    """Call ``fn(db, *args, **kwargs)`` with a session opened and closed in the calling thread"""
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+def _plan_job(db: Session, user_id: str, operation: str, file_ids: List[str],
+              dpi: Optional[int] = None, pages: Optional[int] = None):
+    """Estimate a job and apply the worker memory budget.
+
+    Returns ``(cost, dpi)``: the scheduling cost and the DPI to run at, which
+    may be lower than requested when the job would not fit in memory.
+    """
+    documents = db.query(PDFDocument).filter(
+        PDFDocument.id.in_(file_ids),
+        PDFDocument.user_id == user_id
+    ).all()
+    registry.cost_service.calibrate(db)
+    estimate = registry.cost_service.estimate(operation, documents, dpi=dpi, pages=pages)
+    dpi = registry.cost_service.admit(estimate)
+    return RateLimitService.estimate_cost(estimate.pages, dpi), dpi
+
+async def _run_job(user_id: str, operation: str, cost: float, run: Callable):
+    """Apply rate limits, then call ``run(db)`` in a heavy-job slot.
+
+    The job runs in a thread of the scheduler's pool with a session of its own;
+    every status write and checkpoint of the job goes through that session.
+    """
+    await registry.rate_limit_service.check(user_id, operation, cost)
+    try:
+        return await registry.heavy_job_scheduler.run(user_id, cost, _with_session, run)
+    except JobCancelled as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def _zip_outputs(file_paths: List[str], job_id: str, zip_filename: str, compression: int = 0) -> str:
+    """Bundle a job's outputs into a zip stored with them"""
+    zip_path = job_output_key(job_id, zip_filename)
+    with storage.output_path(zip_path) as local_zip, zipfile.ZipFile(local_zip, 'w', compression) as zipf:
+        for file_path in file_paths:
+            if storage.exists(file_path):
+                with storage.local_path(file_path) as local_path:
+                    zipf.write(local_path, os.path.basename(file_path))
+    return zip_path
+
+def _cache_header(cached: bool) -> dict:
+    return {"X-Result-Cache": "HIT" if cached else "MISS"}
+
+@router.post("/pdf/upload", response_model=PDFUploadResponse)
 async def upload_pdf(
     file: UploadFile = File(...),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
+    await registry.rate_limit_service.check(user.id, "upload")
     
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
+    # Reject empty, oversized, truncated and non-PDF files from their first and last kilobyte
+    needs_repair = await asyncio.to_thread(registry.validation_service.check_stream, file.file)
+    
     # Save uploaded file
     file_id = str(uuid.uuid4())
     file_path = f"uploads/{file_id}_{file.filename}"
     
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Stream the spooled upload into storage instead of reading it into memory
+    await file.seek(0)
+    file_size = await asyncio.to_thread(storage.put, file_path, file.file)
+    
+    # Parse once (warming the document cache) to check encryption and the page, size and image limits
+    report = await asyncio.to_thread(registry.validation_service.inspect, file_path, needs_repair)
+    file_size = report.get("file_size", file_size)
     
     # Save to database
     pdf_doc = PDFDocument(
@@ -129,159 +343,601 @@ async def upload_pdf(
         filename=file.filename,
         original_filename=file.filename,
         file_path=file_path,
-        file_size=len(content),
+        file_size=file_size,
+        pages_count=report["pages"],
         user_id=user.id
     )
     db.add(pdf_doc)
-    db.commit()
+    await db.commit()
     
     return PDFUploadResponse(
         id=file_id,
         filename=file.filename,
-        file_size=len(content),
+        file_size=file_size,
+        pages_count=report["pages"],
+        repaired=report.get("repaired", False),
         upload_time=pdf_doc.created_at
     )
 
-@app.post("/pdf/merge")
+@router.post("/pdf/merge")
 async def merge_pdfs(
     request: PDFMergeRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    result = await pdf_service.merge_pdfs(request.file_ids, user.id, db)
-    
-    # Get the file path from the result
-    file_path = os.path.join("processed", result["output_file"])
+    cost, _ = await asyncio.to_thread(_with_session, _plan_job, user.id, "merge", request.file_ids)
+    result, cached = await registry.result_cache.run(
+        user.id, "merge", request.file_ids, {"engine": registry.pdf_service.engine.name},
+        compute=lambda: _run_job(user.id, "merge", cost, lambda db: registry.pdf_service.merge_pdfs(
+            request.file_ids, user.id, db, job_id=request.job_id
+        )),
+        outputs=lambda r: [r["output_path"]],
+        job_id=request.job_id
+    )
     
     # Return the file with content-disposition header to force download
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=file_path,
-        filename=result["output_file"],
-        media_type='application/octet-stream',
-        headers={
-            'Content-Disposition': f'attachment; filename="{result["output_file"]}"'
-        }
+    return registry.download_service.response(
+        http_request, result["output_path"], result["output_file"],
+        media_type='application/pdf', headers=_cache_header(cached)
     )
 
-@app.post("/pdf/split")
+@router.post("/pdf/split")
 async def split_pdf(
     request: PDFSplitRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    result = await pdf_service.split_pdf(request.file_id, request.pages, user.id, db)
-    
-    # Create a zip file containing all split PDFs
-    import zipfile
-    import os
-    from fastapi.responses import FileResponse
+    cost, _ = await asyncio.to_thread(_with_session, _plan_job, user.id, "split", [request.file_id], pages=len(request.pages))
     
-    # Create a zip file
-    zip_filename = f"split_pages_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
-    zip_path = os.path.join("processed", zip_filename)
+    def split_and_zip(db):
+        result = registry.pdf_service.split_pdf(request.file_id, request.pages, user.id, db, job_id=request.job_id)
+        # Create a zip file containing all split PDFs
+        zip_filename = f"split_pages_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+        result["archive"] = _zip_outputs(result["output_paths"], result["job_id"], zip_filename)
+        return result
     
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for file_path in result["output_paths"]:
-            if os.path.exists(file_path):
-                zipf.write(file_path, os.path.basename(file_path))
+    result, cached = await registry.result_cache.run(
+        user.id, "split", [request.file_id], {"pages": request.pages, "engine": registry.pdf_service.engine.name},
+        compute=lambda: _run_job(user.id, "split", cost, split_and_zip),
+        outputs=lambda r: [r["archive"]] + r["output_paths"],
+        job_id=request.job_id
+    )
     
     # Return the zip file for download
-    return FileResponse(
-        path=zip_path,
-        filename=zip_filename,
-        media_type='application/zip',
-        headers={
-            'Content-Disposition': f'attachment; filename="{zip_filename}"'
-        }
+    return registry.download_service.response(
+        http_request, result["archive"], media_type='application/zip', headers=_cache_header(cached)
     )
 
-@app.post("/pdf/compress")
+@router.post("/pdf/compress")
 async def compress_pdf(
     request: PDFCompressRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    result = await pdf_service.compress_pdf(request.file_id, request.quality, user.id, db)
+    cost, _ = await asyncio.to_thread(_with_session, _plan_job, user.id, "compress", [request.file_id])
+    # Qualities that map to the same compression level produce the same file
+    parameters = {
+        "compression_level": registry.pdf_service.compression_level(request.quality),
+        "engine": registry.pdf_service.engine.name
+    }
+    result, cached = await registry.result_cache.run(
+        user.id, "compress", [request.file_id], parameters,
+        compute=lambda: _run_job(user.id, "compress", cost, lambda db: registry.pdf_service.compress_pdf(
+            request.file_id, request.quality, user.id, db, job_id=request.job_id
+        )),
+        outputs=lambda r: [r["output_path"]],
+        job_id=request.job_id
+    )
     
     # Return the compressed file for download
-    file_path = os.path.join("processed", result["output_file"])
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Compressed file not found")
-    
-    return FileResponse(
-        path=file_path,
-        filename=result["output_file"],
-        media_type='application/pdf',
-        headers={
-            'Content-Disposition': f'attachment; filename="{result["output_file"]}"'
-        }
+    return registry.download_service.response(
+        http_request, result["output_path"], result["output_file"],
+        media_type='application/pdf', headers=_cache_header(cached)
     )
 
-@app.post("/pdf/convert")
+@router.post("/pdf/convert")
 async def convert_pdf(
     request: PDFConvertRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    result = await pdf_service.convert_to_images(request.file_id, request.format, user.id, db)
-    
-    # Create a zip file with all the images
-    import zipfile
-    from fastapi.responses import FileResponse
+    cost, dpi = await asyncio.to_thread(_with_session, _plan_job, user.id, "convert", [request.file_id], dpi=request.dpi)
     
-    zip_filename = f"converted_images_{int(time.time())}.zip"
-    zip_path = os.path.join("processed", zip_filename)
+    def convert_and_zip(db):
+        result = registry.pdf_service.convert_to_images(
+            request.file_id, request.format, user.id, db, job_id=request.job_id, dpi=dpi
+        )
+        # Create a zip file with all the images
+        zip_filename = f"converted_images_{int(time.time())}.zip"
+        result["archive"] = _zip_outputs(result["output_paths"], result["job_id"], zip_filename, zipfile.ZIP_DEFLATED)
+        return result
     
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for img_path in result["output_files"]:
-            full_path = os.path.join("processed", img_path)
-            if os.path.exists(full_path):
-                zipf.write(full_path, os.path.basename(img_path))
+    image_format = request.format.lower().replace("jpeg", "jpg")
+    result, cached = await registry.result_cache.run(
+        user.id, "convert", [request.file_id],
+        {"format": image_format, "dpi": dpi, "rasterizer": registry.pdf_service.rasterizer.name},
+        compute=lambda: _run_job(user.id, "convert", cost, convert_and_zip),
+        outputs=lambda r: [r["archive"]] + r["output_paths"],
+        job_id=request.job_id
+    )
     
     # Return the zip file for download
-    return FileResponse(
-        path=zip_path,
-        filename=zip_filename,
-        media_type='application/zip',
-        headers={
-            'Content-Disposition': f'attachment; filename="{zip_filename}"'
-        }
+    return registry.download_service.response(
+        http_request, result["archive"], media_type='application/zip', headers=_cache_header(cached)
     )
 
 # OCR endpoints
-@app.post("/ocr/extract-text")
+def _ocr_parameters(request: OCRRequest, dpi: int) -> dict:
+    return {
+        "language": request.language,
+        **registry.ocr_service.adaptive.settings(dpi),
+        "backend": registry.ocr_service.backend.name,
+        "rasterizer": registry.ocr_service.rasterizer.name
+    }
+
+@router.post("/ocr/extract-text")
 async def extract_text_ocr(
     request: OCRRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    response: Response,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    return await ocr_service.extract_text_from_pdf(request.file_id, request.language, user.id, db)
+    cost, dpi = await asyncio.to_thread(_with_session, _plan_job, user.id, "ocr", [request.file_id], dpi=request.dpi)
+    result, cached = await registry.result_cache.run(
+        user.id, "ocr", [request.file_id], _ocr_parameters(request, dpi),
+        compute=lambda: _run_job(user.id, "ocr", cost, lambda db: registry.ocr_service.extract_text_from_pdf(
+            request.file_id, request.language, user.id, db, job_id=request.job_id, dpi=dpi
+        )),
+        outputs=lambda r: [r["output_path"]],
+        job_id=request.job_id
+    )
+    response.headers.update(_cache_header(cached))
+    if "extracted_text" not in result and 0 < result.get("page_count", 0) <= OCR_INLINE_TEXT_PAGES:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(ocr_pages_query(result["job_id"]))).all()
+        result["extracted_text"] = "\n".join(format_page(row.page_number, row.extracted_text) for row in rows)
+    return result
 
-@app.post("/ocr/searchable-pdf")
+@router.post("/ocr/searchable-pdf")
 async def create_searchable_pdf(
     request: OCRRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    response: Response,
+    user: User = Depends(current_user)
+):
+    cost, dpi = await asyncio.to_thread(_with_session, _plan_job, user.id, "searchable_pdf", [request.file_id], dpi=request.dpi)
+    result, cached = await registry.result_cache.run(
+        user.id, "searchable_pdf", [request.file_id], _ocr_parameters(request, dpi),
+        compute=lambda: _run_job(user.id, "searchable_pdf", cost, lambda db: registry.ocr_service.create_searchable_pdf(
+            request.file_id, request.language, user.id, db, job_id=request.job_id, dpi=dpi
+        )),
+        outputs=lambda r: [r["output_path"]],
+        job_id=request.job_id
+    )
+    response.headers.update(_cache_header(cached))
+    return result
+
+def _ocr_page(row) -> dict:
+    return {
+        "page_number": row.page_number,
+        "text": row.extracted_text or "",
+        "confidence": row.confidence_score,
+        "processing_time": row.processing_time,
+        "dpi": row.dpi
+    }
+
+async def _get_ocr_job(db: AsyncSession, job_id: str, user_id: str) -> ProcessingJob:
+    job = await _get_job(db, job_id, user_id)
+    if not job or job.job_type != "ocr":
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+@router.get("/ocr/{job_id}/pages")
+async def get_ocr_pages(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=OCR_PAGES_MAX_LIMIT),
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Recognized pages of an extraction job, ``limit`` at a time; pages show up as they are checkpointed"""
+    job = await _get_ocr_job(db, job_id, user.id)
+    total = await db.scalar(select(func.count(OCRResult.id)).where(OCRResult.job_id == job_id))
+    rows = (await db.execute(ocr_pages_query(job_id).offset(offset).limit(limit))).all()
+    return {
+        "job_id": job_id,
+        "status": job.status,
+        "total_pages": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + len(rows) if offset + len(rows) < total else None,
+        "pages": [_ocr_page(row) for row in rows]
+    }
+
+@router.get("/ocr/{job_id}/text")
+async def stream_ocr_text(
+    job_id: str,
+    format: str = "text",
+    user: User = Depends(current_user)
+):
+    """Stream all recognized pages of a job as plain text (the ``.txt`` layout) or NDJSON, one page per line"""
+    if format not in ("text", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'text' or 'ndjson'")
+    async with AsyncSessionLocal() as db:
+        await _get_ocr_job(db, job_id, user.id)
+    
+    async def stream():
+        after_page = 0
+        while True:
+            # A short session per batch, so slow clients do not hold a pooled connection
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(ocr_pages_query(job_id, after_page).limit(OCR_PAGE_BATCH))).all()
+            for row in rows:
+                if format == "ndjson":
+                    yield json_line(_ocr_page(row))
+                else:
+                    yield (("\n" if after_page else "") + format_page(row.page_number, row.extracted_text)).encode("utf-8")
+                after_page = row.page_number
+            if len(rows) < OCR_PAGE_BATCH:
+                return
+    
+    if format == "ndjson":
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    return StreamingResponse(
+        stream(), media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'inline; filename="ocr_text_{job_id}.txt"'}
+    )
+
+@router.get("/ocr/{job_id}/search")
+async def search_ocr_text(
+    job_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=OCR_SEARCH_MAX_HITS),
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Find ``q`` in a job's recognized text, with the word boxes to highlight for each hit.
+
+    The database narrows the pages down to those containing the query; only
+    their word boxes are decoded.
+    """
+    await _get_ocr_job(db, job_id, user.id)
+    hits = []
+    after_page = 0
+    while len(hits) <= limit:
+        rows = (await db.execute(
+            select(OCRResult.page_number, OCRResult.extracted_text, OCRResult.word_boxes).where(
+                OCRResult.job_id == job_id,
+                OCRResult.page_number > after_page,
+                func.lower(OCRResult.extracted_text).contains(q.lower(), autoescape=True)
+            ).order_by(OCRResult.page_number).limit(OCR_PAGE_BATCH)
+        )).all()
+        for row in rows:
+            hits.extend({"page_number": row.page_number, **hit} for hit in find_hits(row.extracted_text, row.word_boxes, q))
+        if len(rows) < OCR_PAGE_BATCH:
+            break
+        after_page = rows[-1].page_number
+    return {"job_id": job_id, "query": q, "hits": hits[:limit], "truncated": len(hits) > limit}
+
+@router.get("/ocr/{job_id}/pages/{page_number}/boxes")
+async def get_ocr_word_boxes(
+    job_id: str,
+    page_number: int,
+    start: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Word boxes of one page in pixels at ``dpi``; with ``end``, only the words overlapping the text span ``[start, end)``"""
+    await _get_ocr_job(db, job_id, user.id)
+    blob = await db.scalar(select(OCRResult.word_boxes).where(
+        OCRResult.job_id == job_id,
+        OCRResult.page_number == page_number
+    ))
+    if blob is None:
+        raise HTTPException(status_code=404, detail="No word boxes for this page")
+    words = WordBoxes(blob)
+    return {"job_id": job_id, "page_number": page_number, "dpi": words.dpi, "boxes": words.boxes(start, end)}
+
+@router.get("/pdf/{file_id}/estimate")
+async def estimate_job(
+    file_id: str,
+    operation: str,
+    dpi: Optional[int] = None,
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Estimated CPU time and peak memory of running ``operation`` on a document"""
+    document = (await db.execute(select(PDFDocument).where(
+        PDFDocument.id == file_id,
+        PDFDocument.user_id == user.id
+    ))).scalar_one_or_none()
+    if not document:
+        raise HTTPException(status_code=404, detail="File not found")
+    if operation not in registry.cost_service.coefficients:
+        raise HTTPException(status_code=400, detail=f"Unknown operation '{operation}'")
+    
+    await db.run_sync(registry.cost_service.calibrate)
+    estimate = await asyncio.to_thread(
+        registry.cost_service.estimate, operation, [document], dpi=dpi or {"convert": 200}.get(operation, 300)
+    )
+    try:
+        admitted_dpi, decision = registry.cost_service.admit(estimate), "accept"
+        if admitted_dpi != estimate.dpi:
+            decision = "downgrade"
+    except HTTPException:
+        admitted_dpi, decision = None, "reject"
+    return {**estimate.to_dict(), "decision": decision, "admitted_dpi": admitted_dpi}
+
+# Downloads
+async def _get_job(db: AsyncSession, job_id: str, user_id: str) -> Optional[ProcessingJob]:
+    return (await db.execute(select(ProcessingJob).where(
+        ProcessingJob.id == job_id,
+        ProcessingJob.user_id == user_id
+    ))).scalar_one_or_none()
+
+def _media_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+@router.api_route("/pdf/{file_id}/download", methods=["GET", "HEAD"])
+async def download_upload(
+    file_id: str,
+    request: Request,
+    user: User = Depends(current_user)
+):
+    """Download an uploaded document (owner only)"""
+    # Closed before the body streams, so slow clients do not hold a pooled connection
+    async with AsyncSessionLocal() as db:
+        document = (await db.execute(select(PDFDocument).where(
+            PDFDocument.id == file_id,
+            PDFDocument.user_id == user.id,
+            PDFDocument.processing_status != "expired"
+        ))).scalar_one_or_none()
+    if not document:
+        raise HTTPException(status_code=404, detail="File not found")
+    return registry.download_service.response(request, document.file_path, document.original_filename, media_type="application/pdf")
+
+@router.api_route("/jobs/{job_id}/files/{filename}", methods=["GET", "HEAD"])
+async def download_job_file(
+    job_id: str,
+    filename: str,
+    request: Request,
+    user: User = Depends(current_user)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    return await ocr_service.create_searchable_pdf(request.file_id, request.language, user.id, db)
+    """Download one output of a job (owner only); supports ETag/304 and Range"""
+    async with AsyncSessionLocal() as db:
+        job = await _get_job(db, job_id, user.id)
+    # Dot names (the job's .profile directory) are not outputs
+    if not job or job.status != "completed" or filename != os.path.basename(filename) or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    file_path = job_output_key(job_id, filename)
+    return registry.download_service.response(request, file_path, filename, media_type=_media_type(filename))
+
+# Background jobs (run by worker.py)
+def _queued_parameters(operation: str, parameters: dict, dpi: Optional[int]) -> dict:
+    """Validate and normalize the options of a queued job like the synchronous endpoints do"""
+    if operation == "split":
+        pages = parameters.get("pages")
+        if not pages or not all(isinstance(p, int) for p in pages):
+            raise HTTPException(status_code=400, detail="split needs 'pages', a list of page numbers")
+        return {"pages": pages}
+    if operation == "compress":
+        return {"quality": int(parameters.get("quality", 80))}
+    if operation == "convert":
+        return {"format": parameters.get("format", "png"), "dpi": dpi}
+    if operation in ("ocr", "searchable_pdf"):
+        mode = "extract_text" if operation == "ocr" else "searchable_pdf"
+        return {"language": parameters.get("language", "eng"), "operation": mode, "dpi": dpi}
+    return {}
+
+@router.post("/jobs", status_code=202)
+async def enqueue_job(
+    request: JobCreateRequest,
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue an operation for a background worker instead of running it in the request"""
+    operation = request.operation
+    if operation not in QUEUED_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation '{operation}'. Supported: {', '.join(QUEUED_OPERATIONS)}")
+    if not request.file_ids or (operation != "merge" and len(request.file_ids) != 1):
+        raise HTTPException(status_code=400, detail=f"{operation} takes {'one or more files' if operation == 'merge' else 'exactly one file'}")
+    owned = await db.scalar(select(func.count(PDFDocument.id)).where(
+        PDFDocument.id.in_(request.file_ids),
+        PDFDocument.user_id == user.id,
+        PDFDocument.processing_status != "expired"
+    ))
+    if owned != len(set(request.file_ids)):
+        raise HTTPException(status_code=404, detail="One or more files not found")
+    
+    requested_dpi = request.parameters.get("dpi")
+    if requested_dpi is None and operation in ("convert", "ocr", "searchable_pdf"):
+        requested_dpi = 200 if operation == "convert" else 300
+    pages = len(request.parameters.get("pages") or []) or None
+    cost, dpi = await db.run_sync(_plan_job, user.id, operation, request.file_ids, dpi=requested_dpi, pages=pages)
+    await registry.rate_limit_service.check(user.id, operation, cost)
+    
+    job = await db.run_sync(
+        registry.job_queue.enqueue, user.id, "ocr" if operation == "searchable_pdf" else operation, request.file_ids,
+        _queued_parameters(operation, request.parameters, dpi), priority=request.priority, job_id=request.job_id
+    )
+    return {"job_id": job.id, "status": job.status, "priority": job.priority, "status_url": f"/jobs/{job.id}"}
+
+@router.get("/jobs/{job_id}", response_model=ProcessingJobResponse)
+async def get_job(
+    job_id: str,
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Status of a job; poll this for queued jobs, whose progress events stay in the worker process"""
+    job = await _get_job(db, job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    output_files = json.loads(job.output_files) if job.output_files else None
+    return ProcessingJobResponse(
+        id=job.id,
+        job_type=job.job_type,
+        status=job.status,
+        input_files=json.loads(job.input_files or "[]"),
+        output_files=[os.path.basename(path) for path in output_files] if output_files else None,
+        parameters=json.loads(job.parameters or "{}"),
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at,
+        processing_time=job.processing_time,
+        priority=job.priority or 0,
+        attempts=job.attempts or 0,
+        download_urls=[
+            f"/jobs/{job.id}/files/{os.path.basename(path)}" for path in output_files or []
+        ] if job.status == "completed" else []
+    )
+
+@router.get("/admin/profiles/{job_id}")
+async def download_profile(
+    job_id: str,
+    request: Request,
+    format: str = Query("folded", pattern=f"^({'|'.join(PROFILE_FORMATS)})$"),
+    user: User = Depends(admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Download the profile stored with a job: folded stacks for flame graphs, or JSON with the stage spans"""
+    if not await db.get(ProcessingJob, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = registry.profiling_service.profile_path(job_id, format)
+    if not storage.exists(path):
+        raise HTTPException(status_code=404, detail="No profile was recorded for this job")
+    return registry.download_service.response(
+        request, path, f"profile_{job_id}.{format}",
+        media_type="application/json" if format == "json" else "text/plain"
+    )
+
+# Job progress endpoints
+def _finished_job_event(job: ProcessingJob) -> dict:
+    """Build a terminal progress event from a job row whose live channel has expired"""
+    event = {
+        "job_id": job.id,
+        "operation": job.job_type,
+        "event": "completed" if job.status == "completed" else "failed",
+        "timestamp": (job.completed_at or job.created_at).timestamp(),
+        "elapsed": job.processing_time
+    }
+    if job.error_message:
+        event["error"] = job.error_message
+    return event
+
+async def _authorize_job_subscription(job_id: str, user: User, db: AsyncSession) -> Optional[ProcessingJob]:
+    """Return the job row when only its outcome can be sent, or None to stream its live events.
+
+    Ids of jobs that do not exist yet are reserved for the caller (see ``ProgressService.reserve``).
+    """
+    job = await db.get(ProcessingJob, job_id)
+    if job and job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job and not progress_service.has_channel(job_id):
+        if job.status in ("completed", "failed"):
+            return job
+        # Queued jobs, and jobs running on another instance, publish their events elsewhere
+        raise HTTPException(status_code=404, detail=f"No live progress for this job here; poll /jobs/{job_id}")
+    progress_service.reserve(job_id, user.id)
+    return None
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    user: User = Depends(current_user)
+):
+    """Stream job progress as Server-Sent Events"""
+    async with AsyncSessionLocal() as db:
+        finished_job = await _authorize_job_subscription(job_id, user, db)
+    
+    if finished_job:
+        event = _finished_job_event(finished_job)
+        async def stream():
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    else:
+        stream = lambda: progress_service.sse_stream(job_id, user.id)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str, token: str):
+    """Stream job progress over a WebSocket (browsers cannot set headers, so the token is a query param)"""
+    try:
+        # Released before streaming; the socket may stay open for the whole job
+        async with AsyncSessionLocal() as db:
+            user = await registry.auth_service.get_current_user(token, db)
+            finished_job = await _authorize_job_subscription(job_id, user, db)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    try:
+        if finished_job:
+            await websocket.send_json(_finished_job_event(finished_job))
+        else:
+            async for event in progress_service.subscribe(job_id, user.id, keepalive=15.0):
+                await websocket.send_json(event or {"event": "keepalive"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 # User documents
-@app.get("/user/documents")
+@router.get("/user/documents")
 async def get_user_documents(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    user: User = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = await auth_service.get_current_user(credentials.credentials, db)
-    documents = db.query(PDFDocument).filter(PDFDocument.user_id == user.id).all()
+    documents = (await db.execute(select(PDFDocument).where(
+        PDFDocument.user_id == user.id,
+        PDFDocument.processing_status != "expired"
+    ))).scalars().all()
     return documents
 
+def create_app() -> FastAPI:
+    """Build the application; importing this module has no other side effects"""
+    app = FastAPI(
+        title="PDFGenie API",
+        description="A comprehensive PDF processing API with OCR capabilities for PDFGenie application",
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=DefaultJSONResponse
+    )
+    app.state.ready = False
+    app.state.tools = None
+    
+    # CORS middleware configuration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_origin_regex=r'https?://(?:.*\.)?(pdfgenie\.netlify\.app|mindapt\.in)$',
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"],
+        max_age=600,  # Cache preflight requests for 10 minutes
+    )
+    # Large OCR results and page listings; downloads and event streams are left alone
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=config("GZIP_MIN_BYTES", default=1024, cast=int),
+        compresslevel=config("GZIP_LEVEL", default=5, cast=int)
+    )
+    # Sampled or admin-requested profiles of the expensive routes (PROFILE_SAMPLE_RATE, X-Profile: 1)
+    app.add_middleware(
+        ProfilingMiddleware,
+        service=lambda: registry.profiling_service,
+        username=lambda token: registry.auth_service.token_username(token)
+    )
+    app.middleware("http")(record_request_metrics)
+    app.include_router(router)
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
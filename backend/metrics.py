@@ -0,0 +1,189 @@
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+import asyncio
+import logging
+import os
+import time
+
+from services.profiling_service import current_profile
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+STAGE_SECONDS = Histogram(
+    "pdfgenie_stage_seconds",
+    "Time spent in a processing stage (rasterize, ocr, encode, read, write)",
+    ["operation", "stage"],
+    buckets=STAGE_BUCKETS
+)
+OPERATION_SECONDS = Histogram(
+    "pdfgenie_operation_seconds",
+    "End-to-end processing time of an operation",
+    ["operation", "status"],
+    buckets=STAGE_BUCKETS
+)
+OPERATION_PAGES = Histogram(
+    "pdfgenie_operation_pages",
+    "Number of pages handled per operation",
+    ["operation"],
+    buckets=PAGE_BUCKETS
+)
+BYTES_IN = Counter("pdfgenie_bytes_in_total", "Bytes read as operation input", ["operation"])
+BYTES_OUT = Counter("pdfgenie_bytes_out_total", "Bytes written as operation output", ["operation"])
+CACHE_REQUESTS = Counter("pdfgenie_cache_requests_total", "Cache lookups by result", ["cache", "result"])
+ARTIFACT_BYTES_RECLAIMED = Counter(
+    "pdfgenie_artifact_bytes_reclaimed_total", "Bytes of expired outputs and uploads deleted by the sweeper"
+)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "pdfgenie_executor_queue_depth", "Jobs waiting for an executor slot", ["executor"],
+    multiprocess_mode="livesum"
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "pdfgenie_http_request_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "pdfgenie_db_pool_connections", "Database connection pool usage", ["state"],
+    multiprocess_mode="livesum"
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "pdfgenie_event_loop_lag_seconds",
+    "How late the event loop woke a task sleeping on it",
+    buckets=LOOP_LAG_BUCKETS
+)
+EVENT_LOOP_LAG_MAX = Gauge(
+    "pdfgenie_event_loop_lag_max_seconds", "Worst event loop lag over the last LOOP_LAG_WINDOW_SECONDS",
+    multiprocess_mode="livemax"
+)
+
+
+@contextmanager
+def stage_timer(operation: str, stage: str):
+    """Time a block of work and record it as ``operation``/``stage``.
+
+    Usage::
+
+        with stage_timer("ocr", "rasterize"):
+            images = convert_from_path(path, dpi=300)
+    """
+    profile = current_profile()
+    if profile:
+        profile.enter_thread()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(operation, stage).observe(elapsed)
+        if profile:
+            profile.leave_thread()
+            profile.span(operation, stage, start, elapsed)
+        logger.debug("stage finished", extra={"operation": operation, "stage": stage, "seconds": round(elapsed, 4)})
+
+
+def timed_iter(iterable: Iterable, operation: str, stage: str) -> Iterator:
+    """Yield from ``iterable``, timing each item's production as ``operation``/``stage``.
+
+    Used for lazy producers such as page rasterizers, where the work happens
+    on each ``next()`` rather than up front.
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage_timer(operation, stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def observe_operation(operation: str, seconds: float, status: str = "completed",
+                      pages: Optional[int] = None, bytes_in: Optional[int] = None,
+                      bytes_out: Optional[int] = None):
+    """Record the outcome of a whole operation"""
+    OPERATION_SECONDS.labels(operation, status).observe(seconds)
+    if pages is not None:
+        OPERATION_PAGES.labels(operation).observe(pages)
+    if bytes_in:
+        BYTES_IN.labels(operation).inc(bytes_in)
+    if bytes_out:
+        BYTES_OUT.labels(operation).inc(bytes_out)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a task that sleeps ``interval`` seconds.
+
+    Work that blocks the loop (hashing, parsing, file IO outside a thread)
+    delays every request the worker is serving; it shows up here first.
+    """
+
+    def __init__(self, interval: float = 0.5, window: float = 10.0):
+        self.interval = interval
+        self.window = window
+        self._recent: deque = deque(maxlen=max(1, int(window / interval)) if interval > 0 else 1)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start probing on the running event loop; an interval of 0 disables it"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self._recent.append(lag)
+            EVENT_LOOP_LAG.observe(lag)
+            EVENT_LOOP_LAG_MAX.set(max(self._recent))
+
+
+def _update_db_pool_gauges():
+    from database import engine, async_engine
+
+    # The async pool (request handlers) is reported with an ``async_`` prefix
+    for prefix, pool in (("", engine.pool), ("async_", async_engine.pool)):
+        for state, getter in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+            if hasattr(pool, getter):
+                DB_POOL_CONNECTIONS.labels(prefix + state).set(getattr(pool, getter)())
+
+
+def render_metrics():
+    """Return ``(payload, content_type)`` for the /metrics endpoint.
+
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set (several uvicorn workers), samples
+    from all worker processes are aggregated.
+    """
+    try:
+        _update_db_pool_gauges()
+    except Exception as e:
+        logger.warning("could not read database pool usage: %s", e)
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
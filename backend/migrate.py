@@ -0,0 +1,27 @@
+"""Bring the database schema up to date (create missing tables and columns).
+
+Run from the ``backend`` directory before starting the API with
+``MIGRATE_ON_STARTUP=false``, e.g. as a release/pre-deploy command::
+
+    python migrate.py
+"""
+import logging
+import sys
+
+from logging_config import configure_logging
+
+configure_logging()
+
+from database import init_db
+
+logger = logging.getLogger("migrate")
+
+
+def main() -> int:
+    init_db()
+    logger.info("Database schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
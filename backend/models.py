@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Boolean, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -55,6 +55,10 @@ class OCRResult(Base):
     page_number = Column(Integer)
     processing_time = Column(Float)  # in seconds
     created_at = Column(DateTime, default=datetime.utcnow)
+    job_id = Column(String, ForeignKey("processing_jobs.id"), index=True)  # per-page checkpoint of an OCR job
+    word_boxes = Column(LargeBinary)  # packed per-word boxes and text offsets, see services.word_boxes
+    page_key = Column(String(64), index=True)  # page fingerprint + OCR settings, see services.page_reuse
+    dpi = Column(Integer)  # resolution the page was recognized at (varies per page with adaptive DPI)
     
     # Relationships
     document = relationship("PDFDocument", back_populates="ocr_results")
@@ -74,4 +78,44 @@ class ProcessingJob(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
-    processing_time = Column(Float)
\ No newline at end of file
+    processing_time = Column(Float)
+    heartbeat_at = Column(DateTime)  # refreshed while a worker makes progress; stale jobs are recovered
+    attempts = Column(Integer, default=0)  # times the job was started, including resumes after a worker died
+    
+    # Queue (see services.job_queue): higher priority first, then oldest
+    priority = Column(Integer, default=0)
+    worker_id = Column(String(255))  # queue worker holding the lease
+    lease_expires_at = Column(DateTime)
+
+# Partial indexes matching the claim queries of services.job_queue
+Index(
+    "ix_processing_jobs_pending", ProcessingJob.priority.desc(), ProcessingJob.created_at,
+    postgresql_where=ProcessingJob.status == "pending", sqlite_where=ProcessingJob.status == "pending"
+)
+Index(
+    "ix_processing_jobs_leases", ProcessingJob.lease_expires_at,
+    postgresql_where=ProcessingJob.status == "processing", sqlite_where=ProcessingJob.status == "processing"
+)
+
+class PageRender(Base):
+    __tablename__ = "page_renders"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    page_key = Column(String(64), nullable=False, index=True)  # page fingerprint + format, DPI and rasterizer
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    job_id = Column(String, ForeignKey("processing_jobs.id"), nullable=False, index=True)
+    file_path = Column(String(500), nullable=False)  # image in the job's output directory
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ResultCacheEntry(Base):
+    __tablename__ = "result_cache"
+    
+    key = Column(String(64), primary_key=True)  # sha256 of operation, input hashes and parameters
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    operation = Column(String(50), nullable=False)
+    job_id = Column(String, ForeignKey("processing_jobs.id"), nullable=False)
+    result = Column(Text, nullable=False)  # JSON of the operation result
+    output_paths = Column(Text, nullable=False)  # JSON array of [path, sha256] of the result's files (see Storage.digest)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime)
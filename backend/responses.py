@@ -0,0 +1,65 @@
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+from typing import Any
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson serializes large results several times faster than the standard library
+DefaultJSONResponse = ORJSONResponse if orjson else JSONResponse
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/plain", "text/csv", "text/html")
+
+# GZipMiddleware passes responses that already have a Content-Encoding through
+# untouched; this one marks the responses we do not want compressed and is
+# removed again before the response goes out
+_PASSTHROUGH = (b"content-encoding", b"x-passthrough")
+
+
+def json_line(record: Any) -> bytes:
+    """Serialize one NDJSON record"""
+    if orjson:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def _compressible(message: Message) -> bool:
+    if message.get("status") == 206:
+        return False
+    content_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+    return content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZip for JSON, NDJSON and text bodies only.
+
+    PDFs, images and zips are already compressed, range responses must keep
+    their byte offsets, and Server-Sent Events would sit in the gzip buffer,
+    so those pass through as they are.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("Accept-Encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        async def marked_app(scope: Scope, receive: Receive, send_to_gzip: Send) -> None:
+            async def mark(message: Message) -> None:
+                if message["type"] == "http.response.start" and not _compressible(message):
+                    message = {**message, "headers": [*message["headers"], _PASSTHROUGH]}
+                await send_to_gzip(message)
+
+            await self.app(scope, receive, mark)
+
+        async def unmark(message: Message) -> None:
+            if message["type"] == "http.response.start" and _PASSTHROUGH in message["headers"]:
+                message = {**message, "headers": [h for h in message["headers"] if h != _PASSTHROUGH]}
+            await send(message)
+
+        responder = GZipResponder(marked_app, self.minimum_size, compresslevel=self.compresslevel)
+        await responder(scope, receive, unmark)
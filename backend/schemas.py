@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -35,6 +35,8 @@ class PDFDocumentBase(BaseModel):
 
 class PDFUploadResponse(PDFDocumentBase):
     id: str
+    pages_count: Optional[int] = None
+    repaired: bool = False  # the cross-reference table was rebuilt at upload
     upload_time: datetime
 
 class PDFDocumentResponse(PDFDocumentBase):
@@ -49,30 +51,36 @@ class PDFDocumentResponse(PDFDocumentBase):
         from_attributes = True
 
 # PDF Processing schemas
-class PDFMergeRequest(BaseModel):
+class JobRequest(BaseModel):
+    # Optional client-generated job id, so progress can be subscribed to
+    # via /jobs/{job_id}/events before the request is sent
+    job_id: Optional[str] = None
+
+class PDFMergeRequest(JobRequest):
     file_ids: List[str]
     output_filename: Optional[str] = None
 
-class PDFSplitRequest(BaseModel):
+class PDFSplitRequest(JobRequest):
     file_id: str
     pages: List[int]  # Page numbers to extract
     output_filename: Optional[str] = None
 
-class PDFCompressRequest(BaseModel):
+class PDFCompressRequest(JobRequest):
     file_id: str
     quality: int = 80  # Compression quality 1-100
     output_filename: Optional[str] = None
 
-class PDFConvertRequest(BaseModel):
+class PDFConvertRequest(JobRequest):
     file_id: str
     format: str = "png"  # png, jpg, jpeg
     dpi: int = 200
     output_filename: Optional[str] = None
 
 # OCR schemas
-class OCRRequest(BaseModel):
+class OCRRequest(JobRequest):
     file_id: str
     language: str = "eng"  # Tesseract language code
+    dpi: int = 300
     pages: Optional[List[int]] = None  # Specific pages, None for all
 
 class OCRResponse(BaseModel):
@@ -89,6 +97,13 @@ class OCRResponse(BaseModel):
         from_attributes = True
 
 # Processing Job schemas
+class JobCreateRequest(JobRequest):
+    operation: str  # merge, split, compress, convert, ocr, searchable_pdf
+    file_ids: List[str]
+    # Operation options as in the synchronous endpoints: pages, quality, format, dpi, language
+    parameters: Dict[str, Any] = {}
+    priority: int = Field(0, ge=-10, le=10)  # higher runs first
+
 class ProcessingJobResponse(BaseModel):
     id: str
     job_type: str
@@ -101,6 +116,9 @@ class ProcessingJobResponse(BaseModel):
     started_at: Optional[datetime]
     completed_at: Optional[datetime]
     processing_time: Optional[float]
+    priority: int = 0
+    attempts: int = 0
+    download_urls: List[str] = []
     
     class Config:
         from_attributes = True
@@ -0,0 +1,264 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from decouple import config
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from models import OCRResult, PageRender, PDFDocument, ProcessingJob, ResultCacheEntry
+from metrics import ARTIFACT_BYTES_RECLAIMED
+from services.storage_service import storage
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_DIR = "processed"
+
+# Identifies the artifact sweep among PostgreSQL advisory locks
+SWEEP_LOCK_KEY = 0x50444653
+
+
+def job_output_key(job_id: str, filename: str) -> str:
+    """Storage key of one output of a job; every output of the job shares the ``processed/<job_id>/`` prefix"""
+    return os.path.join(PROCESSED_DIR, job_id, filename)
+
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: str) -> int:
+    """Delete a file or directory tree and return the bytes freed"""
+    if not os.path.exists(path):
+        return 0
+    size = _path_size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+    return size
+
+
+class ArtifactSweeper:
+    """Deletes job outputs and uploads by age and per-user quota.
+
+    Finished jobs whose outputs are older than ``ARTIFACT_TTL_HOURS`` are
+    marked ``expired`` and their ``processed/<job_id>/`` directory removed.
+    Uploads older than ``UPLOAD_TTL_DAYS`` are deleted likewise. When a user
+    is over ``USER_STORAGE_QUOTA_MB``, their oldest outputs go first, then
+    their oldest uploads. Uploads that a pending or processing job still
+    reads are kept either way.
+
+    Every API process starts a sweeper, but only one sweeps at a time: it
+    takes a PostgreSQL advisory lock, or on other databases (single-host
+    SQLite) a file lock in ``processed/``.
+    """
+
+    def __init__(self):
+        self.artifact_ttl = timedelta(hours=config("ARTIFACT_TTL_HOURS", default=24, cast=float))
+        self.upload_ttl = timedelta(days=config("UPLOAD_TTL_DAYS", default=30, cast=float))
+        self.user_quota = config("USER_STORAGE_QUOTA_MB", default=500, cast=int) * 1048576
+        self.interval = config("SWEEP_INTERVAL_SECONDS", default=900, cast=int)
+        self._task: Optional[asyncio.Task] = None
+
+    def _expire_job(self, db: Session, job: ProcessingJob) -> int:
+        freed = _remove(os.path.join(PROCESSED_DIR, job.id))
+        storage.delete_prefix(os.path.join(PROCESSED_DIR, job.id))
+        # Outputs written before per-job directories existed
+        for path in json.loads(job.output_files or "[]"):
+            if os.path.dirname(os.path.normpath(path)) == PROCESSED_DIR:
+                freed += _remove(path)
+        job.status = "expired"
+        db.query(ResultCacheEntry).filter(ResultCacheEntry.job_id == job.id).delete()
+        db.query(OCRResult).filter(OCRResult.job_id == job.id).delete()
+        db.query(PageRender).filter(PageRender.job_id == job.id).delete()
+        return freed
+
+    def _expire_upload(self, document: PDFDocument) -> int:
+        freed = _remove(document.file_path)
+        storage.delete(document.file_path)
+        document.processing_status = "expired"
+        return freed
+
+    @staticmethod
+    def _uploads_in_use(db: Session) -> Set[str]:
+        """Ids of the uploads that pending or processing jobs still read"""
+        rows = db.query(ProcessingJob.input_files).filter(
+            ProcessingJob.status.in_(("pending", "processing"))
+        ).all()
+        return {file_id for (input_files,) in rows for file_id in json.loads(input_files or "[]")}
+
+    def _enforce_quota(self, db: Session, user_id: str, jobs: List[ProcessingJob],
+                       documents: List[PDFDocument], stats: Dict[str, int], in_use: Set[str]):
+        job_sizes = {job.id: _path_size(os.path.join(PROCESSED_DIR, job.id)) for job in jobs}
+        usage = sum(job_sizes.values()) + sum(doc.file_size or 0 for doc in documents)
+        if usage <= self.user_quota:
+            return
+
+        logger.info(f"User {user_id} uses {usage / 1048576:.1f} MB, over the {self.user_quota / 1048576:.0f} MB quota")
+        for job in sorted(jobs, key=lambda j: j.completed_at or j.created_at):
+            if usage <= self.user_quota:
+                return
+            freed = self._expire_job(db, job)
+            usage -= job_sizes[job.id]
+            stats["jobs_expired"] += 1
+            stats["bytes_reclaimed"] += freed
+        for document in sorted(documents, key=lambda d: d.created_at):
+            if usage <= self.user_quota:
+                return
+            if document.id in in_use:
+                continue
+            stats["bytes_reclaimed"] += self._expire_upload(document)
+            usage -= document.file_size or 0
+            stats["uploads_expired"] += 1
+
+    def _sweep_orphans(self, db: Session, cutoff: float) -> int:
+        """Remove leftovers in ``processed/`` that no live job refers to"""
+        freed = 0
+        try:
+            entries = list(os.scandir(PROCESSED_DIR))
+        except FileNotFoundError:
+            return 0
+        job_dirs = [entry.name for entry in entries if entry.is_dir()]
+        live = {
+            job_id for (job_id,) in db.query(ProcessingJob.id).filter(
+                ProcessingJob.id.in_(job_dirs),
+                ProcessingJob.status != "expired"
+            ).all()
+        } if job_dirs else set()
+        for entry in entries:
+            # Dot files are ours (the sweep lock), not job outputs
+            if entry.name in live or entry.name.startswith(".") or entry.stat().st_mtime > cutoff:
+                continue
+            freed += _remove(entry.path)
+        return freed
+
+    def sweep(self, db: Session) -> Dict[str, int]:
+        """Run one collection pass and return what was reclaimed"""
+        started = time.time()
+        now = datetime.utcnow()
+        stats = {"jobs_expired": 0, "uploads_expired": 0, "bytes_reclaimed": 0}
+
+        expired_jobs = db.query(ProcessingJob).filter(
+            ProcessingJob.status.in_(("completed", "failed")),
+            ProcessingJob.completed_at < now - self.artifact_ttl
+        ).all()
+        for job in expired_jobs:
+            stats["bytes_reclaimed"] += self._expire_job(db, job)
+            stats["jobs_expired"] += 1
+
+        in_use = self._uploads_in_use(db)
+        if self.upload_ttl.total_seconds() > 0:
+            old_uploads = db.query(PDFDocument).filter(
+                PDFDocument.processing_status != "expired",
+                PDFDocument.created_at < now - self.upload_ttl
+            ).all()
+            for document in old_uploads:
+                if document.id in in_use:
+                    continue
+                stats["bytes_reclaimed"] += self._expire_upload(document)
+                stats["uploads_expired"] += 1
+        db.commit()
+
+        if self.user_quota > 0:
+            jobs_by_user: Dict[str, List[ProcessingJob]] = {}
+            for job in db.query(ProcessingJob).filter(ProcessingJob.status.in_(("completed", "failed"))).all():
+                jobs_by_user.setdefault(job.user_id, []).append(job)
+            documents_by_user: Dict[str, List[PDFDocument]] = {}
+            for document in db.query(PDFDocument).filter(PDFDocument.processing_status != "expired").all():
+                documents_by_user.setdefault(document.user_id, []).append(document)
+            for user_id in set(jobs_by_user) | set(documents_by_user):
+                self._enforce_quota(db, user_id, jobs_by_user.get(user_id, []), documents_by_user.get(user_id, []), stats, in_use)
+            db.commit()
+
+        stats["bytes_reclaimed"] += self._sweep_orphans(db, time.time() - self.artifact_ttl.total_seconds())
+
+        ARTIFACT_BYTES_RECLAIMED.inc(stats["bytes_reclaimed"])
+        logger.info(
+            f"Artifact sweep reclaimed {stats['bytes_reclaimed'] / 1048576:.1f} MB "
+            f"({stats['jobs_expired']} jobs, {stats['uploads_expired']} uploads) in {time.time() - started:.2f}s"
+        )
+        return stats
+
+    @staticmethod
+    @contextmanager
+    def _exclusive(engine):
+        """Yield whether this process holds the sweep lock"""
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as connection:
+                acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SWEEP_LOCK_KEY}).scalar()
+                try:
+                    yield acquired
+                finally:
+                    if acquired:
+                        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SWEEP_LOCK_KEY})
+                    connection.commit()
+            return
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        with open(os.path.join(PROCESSED_DIR, ".sweep.lock"), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sweep_with_session(self) -> Optional[Dict[str, int]]:
+        from database import SessionLocal, engine
+
+        with self._exclusive(engine) as acquired:
+            if not acquired:
+                logger.debug("Another process is sweeping artifacts; skipping this pass")
+                return None
+            db = SessionLocal()
+            try:
+                return self.sweep(db)
+            finally:
+                db.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._sweep_with_session)
+            except Exception:
+                logger.exception("Artifact sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start sweeping in the background on the running event loop"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
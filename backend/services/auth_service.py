@@ -1,17 +1,46 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from decouple import config
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
 import uuid
 
 from models import User
 from schemas import UserCreate, UserLogin, UserResponse, Token
 
+logger = logging.getLogger(__name__)
+
+def _password_context() -> CryptContext:
+    """Hashing policy from ``PASSWORD_SCHEMES`` (e.g. ``argon2,bcrypt``).
+
+    New hashes use the first scheme; hashes in the other schemes, or with
+    other cost settings, still verify and are replaced on the next login.
+    """
+    schemes = [s.strip() for s in config("PASSWORD_SCHEMES", default="bcrypt").split(",") if s.strip()]
+    settings = {"bcrypt__rounds": config("BCRYPT_ROUNDS", default=12, cast=int)}
+    if "argon2" in schemes:  # needs argon2-cffi
+        settings.update(
+            argon2__time_cost=config("ARGON2_TIME_COST", default=3, cast=int),
+            argon2__memory_cost=config("ARGON2_MEMORY_KB", default=65536, cast=int)
+        )
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
 class AuthService:
     def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.pwd_context = _password_context()
+        # bcrypt and argon2 release the GIL, so hashing in threads keeps the event
+        # loop free. A pool of its own bounds how many logins hash at once without
+        # starving the default executor used for storage and database work.
+        # PASSWORD_HASH_WORKERS=0 hashes on the event loop.
+        workers = config("PASSWORD_HASH_WORKERS", default=min(4, os.cpu_count() or 1), cast=int)
+        self._hash_pool = ThreadPoolExecutor(workers, thread_name_prefix="password-hash") if workers > 0 else None
         self.secret_key = config("SECRET_KEY", default="your-secret-key-here")
         self.algorithm = "HS256"
         self.access_token_expire_minutes = 30
@@ -49,6 +78,27 @@ class AuthService:
         plain_password = self._truncate_password(plain_password)
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password and return ``(valid, new_hash)``.
+
+        ``new_hash`` is set when the stored hash no longer matches the
+        configured scheme or cost and should be replaced.
+        """
+        if not plain_password or not hashed_password:
+            return False, None
+        try:
+            return self.pwd_context.verify_and_update(self._truncate_password(plain_password), hashed_password)
+        except ValueError:
+            # A scheme that was dropped from PASSWORD_SCHEMES; list it again (not first) to migrate
+            logger.warning("Stored password hash uses a scheme missing from PASSWORD_SCHEMES")
+            return False, None
+
+    async def _hashing(self, fn, *args):
+        """Run a password hashing call in the hashing pool"""
+        if self._hash_pool is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._hash_pool, fn, *args)
+
     def get_password_hash(self, password: str) -> str:
         """Generate a password hash.
         
@@ -88,11 +138,11 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
         return encoded_jwt
 
-    async def register_user(self, user_data: UserCreate, db: Session) -> UserResponse:
+    async def register_user(self, user_data: UserCreate, db: AsyncSession) -> UserResponse:
         # Check if user already exists
-        existing_user = db.query(User).filter(
+        existing_user = (await db.execute(select(User).where(
             (User.username == user_data.username) | (User.email == user_data.email)
-        ).first()
+        ).limit(1))).scalar_one_or_none()
         
         if existing_user:
             raise HTTPException(
@@ -101,7 +151,7 @@ class AuthService:
             )
         
         # Create new user
-        hashed_password = self.get_password_hash(user_data.password)
+        hashed_password = await self._hashing(self.get_password_hash, user_data.password)
         db_user = User(
             id=str(uuid.uuid4()),
             username=user_data.username,
@@ -110,15 +160,18 @@ class AuthService:
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         return UserResponse.from_orm(db_user)
 
-    async def authenticate_user(self, user_data: UserLogin, db: Session) -> Token:
-        user = db.query(User).filter(User.username == user_data.username).first()
+    async def authenticate_user(self, user_data: UserLogin, db: AsyncSession) -> Token:
+        user = await self._get_user(db, user_data.username)
+        valid, new_hash = await self._hashing(
+            self.verify_and_update, user_data.password, user.password_hash if user else None
+        )
         
-        if not user or not self.verify_password(user_data.password, user.password_hash):
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
@@ -131,6 +184,12 @@ class AuthService:
                 detail="Inactive user"
             )
         
+        # Upgrade hashes made under an older scheme or work factor
+        if new_hash:
+            user.password_hash = new_hash
+            await db.commit()
+            logger.info(f"Rehashed password of user {user.id} with {self.pwd_context.identify(new_hash)}")
+        
         access_token_expires = timedelta(minutes=self.access_token_expire_minutes)
         access_token = self.create_access_token(
             data={"sub": user.username, "user_id": user.id},
@@ -144,22 +203,29 @@ class AuthService:
             user=UserResponse.from_orm(user)
         )
 
-    async def get_current_user(self, token: str, db: Session) -> User:
+    @staticmethod
+    async def _get_user(db: AsyncSession, username: str):
+        return (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+
+    def token_username(self, token: str) -> Optional[str]:
+        """Username of a valid, unexpired access token, without a database lookup"""
+        try:
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm]).get("sub")
+        except JWTError:
+            return None
+
+    async def get_current_user(self, token: str, db: AsyncSession) -> User:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-        except JWTError:
+        username = self.token_username(token)
+        if username is None:
             raise credentials_exception
         
-        user = db.query(User).filter(User.username == username).first()
+        user = await self._get_user(db, username)
         if user is None:
             raise credentials_exception
         
@@ -0,0 +1,196 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from decouple import config
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import math
+import time
+
+from models import PDFDocument, ProcessingJob
+from services.document_cache import DocumentCache
+from services.storage_service import storage
+
+logger = logging.getLogger(__name__)
+
+LETTER_POINTS = (612.0, 792.0)
+
+# Operations that rasterize pages; their cost scales with pixels, not pages
+RASTER_OPERATIONS = {"convert", "ocr", "searchable_pdf"}
+
+# CPU seconds per unit before calibration: per megapixel for raster
+# operations, per page for structural ones
+DEFAULT_CPU_COEFFICIENTS = {
+    "merge": 0.004,
+    "split": 0.003,
+    "compress": 0.01,
+    "convert": 0.03,
+    "ocr": 0.35,
+    "searchable_pdf": 0.4,
+}
+
+# Lowest DPI a request may be downgraded to before it is rejected instead
+MIN_DPI = {"convert": 72, "ocr": 150, "searchable_pdf": 150}
+
+# Parsed PyPDF2 objects take several times the file size in memory
+PARSE_MEMORY_FACTOR = 4
+BYTES_PER_PIXEL = 3  # RGB rasters; OCR renders grayscale at 1 byte per pixel
+GRAYSCALE_OPERATIONS = {"ocr"}
+# Pages are rendered one at a time; allow for the rendered page plus one
+# working copy (encoder buffer or the OCR engine's own copy)
+PAGE_BUFFERS = 2
+
+
+class CostEstimate:
+    def __init__(self, operation: str, pages: int, dpi: Optional[int], megapixels: float,
+                 cpu_seconds: float, peak_bytes: int):
+        self.operation = operation
+        self.pages = pages
+        self.dpi = dpi
+        self.megapixels = megapixels
+        self.cpu_seconds = cpu_seconds
+        self.peak_bytes = peak_bytes
+
+    def to_dict(self) -> dict:
+        return {
+            "operation": self.operation,
+            "pages": self.pages,
+            "dpi": self.dpi,
+            "megapixels": round(self.megapixels, 2),
+            "cpu_seconds": round(self.cpu_seconds, 2),
+            "peak_mb": round(self.peak_bytes / 1048576, 1),
+        }
+
+
+class CostService:
+    """Estimates CPU time and peak memory of an operation before running it.
+
+    Estimates use page count and page size, the requested DPI and the
+    operation type. CPU coefficients are recalibrated from completed
+    ``ProcessingJob`` rows, measuring each job the same way. Page sizes, and
+    page counts missing from older documents, are read through the engine's
+    document cache, so estimating may parse a document; call it off the
+    event loop.
+    """
+
+    def __init__(self, documents: DocumentCache):
+        self.documents = documents
+        self.memory_budget = config("WORKER_MEMORY_BUDGET_MB", default=1024, cast=int) * 1048576
+        self.policy = config("ADMISSION_POLICY", default="downgrade")  # downgrade or reject
+        self.calibration_interval = config("COST_CALIBRATION_INTERVAL", default=600, cast=int)
+        self.coefficients: Dict[str, float] = dict(DEFAULT_CPU_COEFFICIENTS)
+        self._calibrated_at = 0.0
+        self._shape = lru_cache(maxsize=512)(self._read_shape)
+
+    def _read_shape(self, file_path: str, file_size: int) -> Tuple[Optional[int], Tuple[float, float]]:
+        try:
+            with storage.local_path(file_path) as local_path, self.documents.open(local_path) as handle:
+                sizes = self.documents.engine.page_sizes(handle)
+        except Exception as e:
+            logger.debug(f"Could not measure {file_path}: {e}")
+            return None, LETTER_POINTS
+        return len(sizes), max(sizes, key=lambda s: s[0] * s[1], default=LETTER_POINTS)
+
+    def shape(self, document: PDFDocument) -> Tuple[int, Tuple[float, float]]:
+        """Page count and largest page size in points of ``document`` (memoised per file version)"""
+        pages, page_size = self._shape(document.file_path, document.file_size)
+        return document.pages_count or pages or 1, page_size
+
+    @staticmethod
+    def megapixels(pages: int, page_size: Tuple[float, float], dpi: int) -> float:
+        width_px, height_px = page_size[0] / 72 * dpi, page_size[1] / 72 * dpi
+        return pages * width_px * height_px / 1e6
+
+    def estimate(self, operation: str, documents: List[PDFDocument], dpi: Optional[int] = None,
+                 pages: Optional[int] = None) -> CostEstimate:
+        """Estimate ``operation`` over ``documents``; ``pages`` overrides the document page count"""
+        shapes = [self.shape(doc) for doc in documents]
+        total_pages = pages if pages is not None else sum(count for count, _ in shapes)
+        coefficient = self.coefficients[operation]
+
+        if operation in RASTER_OPERATIONS:
+            page_size = max((size for _, size in shapes), key=lambda s: s[0] * s[1], default=LETTER_POINTS)
+            megapixels = self.megapixels(total_pages, page_size, dpi)
+            cpu_seconds = megapixels * coefficient
+            # Rasterizers stream pages, so peak memory is per page rather than per document
+            bytes_per_pixel = 1 if operation in GRAYSCALE_OPERATIONS else BYTES_PER_PIXEL
+            page_bytes = self.megapixels(1, page_size, dpi) * 1e6 * bytes_per_pixel
+            peak_bytes = int(page_bytes * PAGE_BUFFERS) + sum(doc.file_size for doc in documents)
+        else:
+            dpi = None
+            megapixels = 0.0
+            cpu_seconds = total_pages * coefficient
+            peak_bytes = sum(doc.file_size for doc in documents) * PARSE_MEMORY_FACTOR
+
+        return CostEstimate(operation, total_pages, dpi, megapixels, cpu_seconds, peak_bytes)
+
+    def admit(self, estimate: CostEstimate) -> Optional[int]:
+        """Apply the memory budget; return the DPI to run at, or raise 413 if the job cannot fit"""
+        if estimate.peak_bytes <= self.memory_budget:
+            return estimate.dpi
+
+        if estimate.operation in RASTER_OPERATIONS and self.policy == "downgrade":
+            # Page raster memory scales with DPI squared
+            scale = math.sqrt(self.memory_budget / estimate.peak_bytes)
+            downgraded = int(estimate.dpi * scale)
+            if downgraded >= MIN_DPI[estimate.operation]:
+                logger.info(
+                    f"Downgrading {estimate.operation} from {estimate.dpi} to {downgraded} DPI "
+                    f"(estimated {estimate.peak_bytes / 1048576:.0f} MB, budget {self.memory_budget / 1048576:.0f} MB)"
+                )
+                return downgraded
+
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=(
+                f"Document is too large to {estimate.operation}: estimated peak memory "
+                f"{estimate.peak_bytes / 1048576:.0f} MB exceeds the {self.memory_budget / 1048576:.0f} MB worker budget"
+            )
+        )
+
+    def calibrate(self, db: Session, force: bool = False, sample_size: int = 200):
+        """Fit CPU coefficients to recorded job processing times (least squares through the origin)"""
+        if not force and time.time() - self._calibrated_at < self.calibration_interval:
+            return
+        self._calibrated_at = time.time()
+
+        jobs = db.query(ProcessingJob).filter(
+            ProcessingJob.status == "completed",
+            ProcessingJob.processing_time.isnot(None)
+        ).order_by(ProcessingJob.completed_at.desc()).limit(sample_size * len(self.coefficients)).all()
+
+        shapes = {}
+        document_ids = {file_id for job in jobs for file_id in json.loads(job.input_files or "[]")}
+        if document_ids:
+            shapes = {
+                document.id: self.shape(document)
+                for document in db.query(PDFDocument).filter(PDFDocument.id.in_(document_ids)).all()
+            }
+
+        samples: Dict[str, List[Tuple[float, float]]] = {}
+        for job in jobs:
+            parameters = json.loads(job.parameters or "{}")
+            operation = "searchable_pdf" if parameters.get("operation") == "searchable_pdf" else job.job_type
+            if operation not in self.coefficients:
+                continue
+            job_shapes = [shapes.get(file_id, (1, LETTER_POINTS)) for file_id in json.loads(job.input_files or "[]")]
+            if operation == "split":
+                pages = len(parameters.get("pages", [])) or 1
+            else:
+                pages = sum(count for count, _ in job_shapes)
+            if operation in RASTER_OPERATIONS:
+                page_size = max((size for _, size in job_shapes), key=lambda s: s[0] * s[1], default=LETTER_POINTS)
+                units = self.megapixels(pages, page_size, parameters.get("dpi", 300 if operation != "convert" else 200))
+            else:
+                units = pages
+            samples.setdefault(operation, []).append((units, job.processing_time))
+
+        for operation, points in samples.items():
+            if len(points) < 5:
+                continue
+            numerator = sum(units * seconds for units, seconds in points)
+            denominator = sum(units * units for units, _ in points)
+            if denominator > 0:
+                self.coefficients[operation] = numerator / denominator
+                logger.debug(f"Calibrated {operation}: {self.coefficients[operation]:.4f} s/unit from {len(points)} jobs")
@@ -0,0 +1,142 @@
+from decouple import config
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+import logging
+import os
+import threading
+
+from metrics import record_cache
+from services.pdf_engines import PDFEngine
+
+logger = logging.getLogger(__name__)
+
+# Parsed object trees take several times the file size; the mapped file itself
+# is backed by the page cache and not counted
+PARSE_MEMORY_FACTOR = 4
+
+DocumentKey = Tuple[str, int, int]  # real path, mtime in ns, size
+
+
+class _Entry:
+    __slots__ = ("key", "document", "cost", "leases", "evicted")
+
+    def __init__(self, key: DocumentKey, document: Any, cost: int):
+        self.key = key
+        self.document = document
+        self.cost = cost
+        self.leases = 0
+        self.evicted = False
+
+
+class DocumentCache:
+    """Per-worker LRU of parsed documents opened over ``mmap``.
+
+    Entries are keyed by path, mtime and size, so a file that changes on disk
+    is parsed again. The least recently used documents are closed once the
+    estimated parse memory goes over the budget; a document that is still in
+    use is closed when its last user releases it.
+
+    Engine handles are not thread safe, so each is leased to one caller at
+    a time and the cache can be used from any thread (job threads, upload
+    validation). A caller that asks for a document another thread holds
+    gets a private copy, closed when it releases it. Callers must only read
+    from handles, since the next caller gets the same object.
+    """
+
+    def __init__(self, engine: PDFEngine, budget_bytes: int = None, max_entries: int = None):
+        self.engine = engine
+        self.budget_bytes = budget_bytes or config("DOCUMENT_CACHE_MB", default=256, cast=int) * 1048576
+        self.max_entries = max_entries or config("DOCUMENT_CACHE_ENTRIES", default=64, cast=int)
+        self._entries: "OrderedDict[DocumentKey, _Entry]" = OrderedDict()
+        self._used_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_path: str) -> DocumentKey:
+        stat = os.stat(file_path)
+        return os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, entry: _Entry):
+        """Drop ``entry`` from the index (lock held); close it now if unused"""
+        self._entries.pop(entry.key, None)
+        self._used_bytes -= entry.cost
+        entry.evicted = True
+        if entry.leases == 0:
+            self.engine.close(entry.document)
+
+    def _evict(self):
+        while self._entries and (self._used_bytes > self.budget_bytes or len(self._entries) > self.max_entries):
+            _, entry = next(iter(self._entries.items()))
+            logger.debug(f"Evicting parsed document {entry.key[0]} ({entry.cost} bytes)")
+            self._remove(entry)
+
+    def _acquire(self, file_path: str) -> _Entry:
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.leases == 0:
+                self._entries.move_to_end(key)
+                entry.leases = 1
+                record_cache("document", True)
+                return entry
+            busy = entry is not None
+
+        # Parse outside the lock; a concurrent miss on the same file just parses twice
+        document = self.engine.open(file_path, mapped=True)
+        record_cache("document", False)
+        entry = _Entry(key, document, key[2] * PARSE_MEMORY_FACTOR)
+        entry.leases = 1
+
+        with self._lock:
+            if busy or key in self._entries:
+                # The cached handle is leased to another thread; this copy is private
+                entry.evicted = True
+                return entry
+            # Older versions of the same file will never be hit again
+            for stale in [e for k, e in self._entries.items() if k[0] == key[0]]:
+                self._remove(stale)
+            if entry.cost <= self.budget_bytes:
+                self._entries[key] = entry
+                self._used_bytes += entry.cost
+                self._evict()
+            else:
+                # Too large to cache; close as soon as the caller is done
+                entry.evicted = True
+        return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.leases -= 1
+            if entry.evicted and entry.leases == 0:
+                self.engine.close(entry.document)
+
+    @contextmanager
+    def open(self, file_path: str):
+        """Lease a parsed handle for ``file_path`` for the duration of the block"""
+        entry = self._acquire(file_path)
+        try:
+            yield entry.document
+        finally:
+            self._release(entry)
+
+    def invalidate(self, file_path: str):
+        path = os.path.realpath(file_path)
+        with self._lock:
+            for entry in [e for k, e in self._entries.items() if k[0] == path]:
+                self._remove(entry)
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._remove(entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "used_bytes": self._used_bytes, "budget_bytes": self.budget_bytes}
@@ -0,0 +1,166 @@
+from fastapi import HTTPException, Request, status
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from decouple import config
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+import logging
+import os
+
+from services.storage_service import Storage, storage as default_storage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+
+def _content_disposition(filename: str) -> str:
+    ascii_name = filename.encode("ascii", "replace").decode().replace('"', "")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive ``(start, end)``.
+
+    Returns None when the header should be ignored (malformed or several
+    ranges, so the whole file is sent) and raises 416 when it cannot be
+    satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+
+def _read_range(storage: Storage, key: str, start: int, end: int) -> Iterator[bytes]:
+    """Stream bytes ``start``..``end`` of an object, holding its local copy until done"""
+    with storage.local_path(key) as file_path, open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class DownloadService:
+    """Serves stored files with strong ETags, conditional GET and byte ranges.
+
+    With ``DOWNLOAD_OFFLOAD=x-accel`` (nginx) or ``x-sendfile`` (Apache,
+    lighttpd) the response only carries a header pointing at the file and
+    the proxy sends the bytes, so no Python worker is tied up. The proxy then
+    also handles ``Range`` requests.
+
+    When the storage backend can presign URLs (S3), clients are redirected
+    to the object store instead.
+    """
+
+    def __init__(self, storage: Storage = None):
+        self.storage = storage or default_storage
+        self.offload = config("DOWNLOAD_OFFLOAD", default="none")  # none, x-accel or x-sendfile
+        # Internal nginx location that maps to the local storage root
+        self.accel_prefix = config("X_ACCEL_PREFIX", default="/protected/")
+        self.root = os.path.abspath(config("DOWNLOAD_ROOT", default=config("STORAGE_ROOT", default=".")))
+
+    def etag(self, key: str) -> str:
+        """Strong ETag: the content digest storage recorded when the object was written.
+
+        It is the same on every instance serving the object and changes
+        only with the content, and serving it does not read the file.
+        """
+        return f'"{self.storage.digest(key)}"'
+
+    def _offload_headers(self, file_path: str) -> dict:
+        absolute = os.path.abspath(file_path)
+        if self.offload == "x-sendfile":
+            return {"X-Sendfile": absolute}
+        relative = os.path.relpath(absolute, self.root).replace(os.sep, "/")
+        return {"X-Accel-Redirect": self.accel_prefix.rstrip("/") + "/" + quote(relative)}
+
+    def response(self, request: Request, key: str, filename: Optional[str] = None,
+                 media_type: str = "application/octet-stream", headers: Optional[dict] = None) -> Response:
+        """Build the download response for the stored object ``key`` honouring the request's conditional headers"""
+        url = self.storage.url(key, filename or os.path.basename(key))
+        if url:
+            # 303 turns the POST of an operation endpoint into a GET of the object
+            redirect = status.HTTP_307_TEMPORARY_REDIRECT if request.method in ("GET", "HEAD") else status.HTTP_303_SEE_OTHER
+            return RedirectResponse(url, status_code=redirect, headers=headers)
+
+        size = self.storage.size(key)
+        if size is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        etag = self.etag(key)
+        offload_headers = None
+        if self.offload in ("x-accel", "x-sendfile"):
+            # Keys resolve under the storage root (or to a spilled copy), not the working directory
+            with self.storage.local_path(key) as file_path:
+                offload_headers = self._offload_headers(file_path)
+        base_headers = {
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, no-cache",
+            "Content-Disposition": _content_disposition(filename or os.path.basename(key)),
+            **(headers or {}),
+        }
+        conditional = request.method in ("GET", "HEAD")
+
+        if conditional and _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={
+                name: value for name, value in base_headers.items() if name != "Content-Disposition"
+            })
+
+        if offload_headers:
+            return Response(media_type=media_type, headers={**base_headers, **offload_headers})
+
+        range_header = request.headers.get("range") if conditional else None
+        # If-Range: only honour the range while the client's copy is still current
+        if range_header and request.headers.get("if-range", etag) == etag:
+            byte_range = parse_range(range_header, size)
+            if byte_range:
+                start, end = byte_range
+                return StreamingResponse(
+                    _read_range(self.storage, key, start, end),
+                    status_code=status.HTTP_206_PARTIAL_CONTENT,
+                    media_type=media_type,
+                    headers={
+                        **base_headers,
+                        "Content-Range": f"bytes {start}-{end}/{size}",
+                        "Content-Length": str(end - start + 1),
+                    }
+                )
+
+        base_headers["Content-Length"] = str(size)
+        if request.method == "HEAD":
+            return Response(media_type=media_type, headers=base_headers)
+        return StreamingResponse(_read_range(self.storage, key, 0, size - 1), media_type=media_type, headers=base_headers)
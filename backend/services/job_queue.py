@@ -0,0 +1,260 @@
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from decouple import config
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import socket
+import uuid
+
+from metrics import observe_operation
+from models import ProcessingJob
+from services.profiling_service import attach_job
+from services.progress_service import progress_service
+
+logger = logging.getLogger(__name__)
+
+QUEUED_OPERATIONS = ("merge", "split", "compress", "convert", "ocr", "searchable_pdf")
+
+# Jobs refresh ``heartbeat_at`` at most this often from their page loops;
+# must stay well below JOB_STALE_SECONDS (see services.recovery_service)
+HEARTBEAT_INTERVAL = timedelta(seconds=config("JOB_HEARTBEAT_SECONDS", default=30, cast=int))
+
+
+def begin_job(db: Session, job_id: str, user_id: str, job_type: str, input_files: List[str],
+              parameters: Dict[str, Any], resume: bool = False) -> ProcessingJob:
+    """Create the ``processing`` row for a job, or take over the existing one with ``resume``.
+
+    Jobs run by a queue worker or resumed after a crash already have a row;
+    the services then update it instead of inserting a new one.
+    """
+    now = datetime.utcnow()
+    if resume:
+        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id, ProcessingJob.user_id == user_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        job.status = "processing"
+        job.started_at = job.started_at or now
+    else:
+        job = ProcessingJob(
+            id=job_id,
+            user_id=user_id,
+            job_type=job_type,
+            status="processing",
+            input_files=json.dumps(input_files),
+            parameters=json.dumps(parameters),
+            started_at=now
+        )
+        db.add(job)
+    job.heartbeat_at = now
+    try:
+        db.commit()
+    except IntegrityError:
+        # A client-supplied id that an earlier job (possibly another user's) already has
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Job id {job_id} is already in use")
+    attach_job(job.id)
+    return job
+
+
+def start_job(db: Session, job_id: Optional[str], user_id: str, operation: str, input_files: List[str],
+              parameters: Dict[str, Any], resume: bool = False, total_pages: int = 0,
+              job_type: Optional[str] = None) -> ProcessingJob:
+    """Register the progress channel of a job run by the services, then ``begin_job`` its row.
+
+    The channel is registered first so that a clashing job id fails before
+    anything is written; if the row cannot be written the channel is failed,
+    so it does not stay running. ``job_type`` defaults to ``operation``;
+    searchable PDFs report progress as ``searchable_pdf`` but are stored as
+    ``ocr`` jobs.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    progress_service.start(job_id, user_id, operation, total_pages=total_pages)
+    try:
+        job = begin_job(db, job_id, user_id, job_type or operation, input_files, parameters, resume=resume)
+    except BaseException as e:
+        progress_service.fail(job_id, e.detail if isinstance(e, HTTPException) else str(e))
+        raise
+    logger.info(f"{'Resumed' if resume else 'Created'} {operation} job {job.id}")
+    return job
+
+
+def heartbeat_job(db: Session, job: ProcessingJob):
+    """Show that a running job still makes progress, so no other process recovers it as stale.
+
+    Called once per page; writes at most every ``JOB_HEARTBEAT_SECONDS``.
+    """
+    now = datetime.utcnow()
+    if job.heartbeat_at is None or now - job.heartbeat_at >= HEARTBEAT_INTERVAL:
+        job.heartbeat_at = now
+        db.commit()
+
+
+def complete_job(db: Session, job: ProcessingJob, processing_time: float, output_paths: List[str]):
+    """Record a job's outputs and emit its ``completed`` event"""
+    job.status = "completed"
+    job.completed_at = datetime.utcnow()
+    job.processing_time = processing_time
+    job.output_files = json.dumps(output_paths)
+    db.commit()
+    progress_service.complete(job.id, output_files=[os.path.basename(path) for path in output_paths])
+
+
+def fail_job(db: Session, job: ProcessingJob, error: str, operation: Optional[str] = None):
+    """Mark a job failed and emit its ``failed`` event"""
+    progress_service.fail(job.id, error)
+    db.rollback()  # The error may have come from the session itself
+    observe_operation(operation or job.job_type, (datetime.utcnow() - job.started_at).total_seconds(), status="failed")
+    job.status = "failed"
+    job.error_message = error
+    job.completed_at = datetime.utcnow()
+    db.commit()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Job queue on the ``processing_jobs`` table, without a separate broker.
+
+    Jobs are enqueued as ``pending`` rows. Workers claim the highest
+    priority, oldest job with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+    concurrent workers never wait on or pick the same row, and hold it
+    under a lease they renew with heartbeats. A job whose lease runs out
+    (its worker died) is claimed again by the next worker, up to
+    ``JOB_MAX_ATTEMPTS`` times.
+
+    ``SKIP LOCKED`` needs PostgreSQL (or MySQL 8); on SQLite the claim
+    falls back to the conditional update alone, which is still safe but
+    serializes workers.
+    """
+
+    def __init__(self):
+        self.lease = timedelta(seconds=config("JOB_LEASE_SECONDS", default=60, cast=int))
+        self.max_attempts = config("JOB_MAX_ATTEMPTS", default=3, cast=int)
+
+    def enqueue(self, db: Session, user_id: str, job_type: str, input_files: List[str],
+                parameters: Dict[str, Any], priority: int = 0, job_id: Optional[str] = None) -> ProcessingJob:
+        job = ProcessingJob(
+            id=job_id or str(uuid.uuid4()),
+            user_id=user_id,
+            job_type=job_type,
+            status="pending",
+            priority=priority,
+            input_files=json.dumps(input_files),
+            parameters=json.dumps(parameters),
+            attempts=0
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=f"Job id {job.id} is already in use")
+        logger.info(f"Queued {job_type} job {job.id} with priority {priority}")
+        return job
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            ProcessingJob.status == "pending",
+            and_(ProcessingJob.status == "processing", ProcessingJob.lease_expires_at < now)
+        )
+
+    @staticmethod
+    def _next(db: Session, condition, job_types: Optional[List[str]]):
+        query = db.query(ProcessingJob.id).filter(condition)
+        if job_types:
+            query = query.filter(ProcessingJob.job_type.in_(job_types))
+        return query.order_by(
+            ProcessingJob.priority.desc(), ProcessingJob.created_at
+        ).limit(1).with_for_update(skip_locked=True).first()
+
+    def claim(self, db: Session, worker_id: str, job_types: Optional[List[str]] = None) -> Optional[ProcessingJob]:
+        """Lease the next runnable job to ``worker_id``, or return None when the queue is empty"""
+        now = datetime.utcnow()
+        # Two queries rather than one OR, so each can walk its partial index
+        row = self._next(db, ProcessingJob.status == "pending", job_types) or self._next(
+            db, and_(ProcessingJob.status == "processing", ProcessingJob.lease_expires_at < now), job_types
+        )
+        if row is None:
+            db.commit()
+            return None
+
+        # The conditional update is what guarantees a single owner; the row lock only avoids contention
+        claimed = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == row.id, self._claimable(now))
+            .values(
+                status="processing",
+                worker_id=worker_id,
+                lease_expires_at=now + self.lease,
+                heartbeat_at=now,
+                attempts=func.coalesce(ProcessingJob.attempts, 0) + 1,
+                started_at=func.coalesce(ProcessingJob.started_at, now)
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.commit()
+        if not claimed:
+            return None
+
+        job = db.query(ProcessingJob).filter(ProcessingJob.id == row.id).first()
+        if job.attempts > self.max_attempts:
+            self.finish(db, job.id, worker_id, "failed", f"Gave up after {self.max_attempts} attempts")
+            return None
+        return job
+
+    def heartbeat(self, db: Session, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False means the job was reclaimed by another worker"""
+        now = datetime.utcnow()
+        renewed = db.execute(
+            update(ProcessingJob)
+            .where(
+                ProcessingJob.id == job_id,
+                ProcessingJob.worker_id == worker_id,
+                ProcessingJob.status == "processing"
+            )
+            .values(lease_expires_at=now + self.lease, heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.commit()
+        return renewed
+
+    def finish(self, db: Session, job_id: str, worker_id: str, status: str, error: Optional[str] = None):
+        """Release the lease; the services already record the outcome of jobs they run"""
+        values = {"lease_expires_at": None}
+        if status == "failed":
+            values.update(status="failed", error_message=error, completed_at=datetime.utcnow())
+        db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id, ProcessingJob.worker_id == worker_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    def release(self, db: Session, job_id: str, worker_id: str):
+        """Put a job this worker gave up on (e.g. on shutdown) back in the queue, without counting the attempt"""
+        db.execute(
+            update(ProcessingJob)
+            .where(
+                ProcessingJob.id == job_id,
+                ProcessingJob.worker_id == worker_id,
+                ProcessingJob.status == "processing"
+            )
+            .values(
+                status="pending", worker_id=None, lease_expires_at=None,
+                attempts=ProcessingJob.attempts - 1  # incremented by the claim
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    def depth(self, db: Session) -> int:
+        return db.query(func.count(ProcessingJob.id)).filter(ProcessingJob.status == "pending").scalar()
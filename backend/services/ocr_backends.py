@@ -0,0 +1,198 @@
+from decouple import config
+from PIL import Image
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+
+class OCRWord:
+    __slots__ = ("text", "left", "top", "width", "height", "conf", "offset")
+
+    def __init__(self, text: str, left: int, top: int, width: int, height: int, conf: float, offset: int = 0):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.conf = conf
+        self.offset = offset  # Character offset of the word in the page text
+
+
+class OCRPageResult:
+    def __init__(self, text: str, words: List[OCRWord]):
+        self.text = text
+        self.words = words
+
+    @property
+    def confidence(self) -> float:
+        confidences = [word.conf for word in self.words if word.conf > 0]
+        return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+def assemble_text(lines: List[Tuple[Any, List[tuple]]]) -> OCRPageResult:
+    """Build page text from recognized words grouped into lines.
+
+    ``lines`` is a list of ``(paragraph_key, words)`` entries where each word is
+    ``(text, left, top, width, height, conf)``. Words on a line are joined by
+    spaces, lines by newlines and paragraphs by a blank line, matching the
+    layout of ``tesseract`` plain text output. Word offsets into the text are
+    recorded as the text is built.
+    """
+    parts: List[str] = []
+    words: List[OCRWord] = []
+    length = 0
+    previous_paragraph = None
+
+    for paragraph_key, line_words in lines:
+        if not line_words:
+            continue
+        if parts:
+            separator = "\n\n" if paragraph_key != previous_paragraph else "\n"
+            parts.append(separator)
+            length += len(separator)
+        previous_paragraph = paragraph_key
+
+        for index, (text, left, top, width, height, conf) in enumerate(line_words):
+            if index:
+                parts.append(" ")
+                length += 1
+            words.append(OCRWord(text, left, top, width, height, conf, length))
+            parts.append(text)
+            length += len(text)
+
+    return OCRPageResult("".join(parts) + ("\n" if parts else ""), words)
+
+
+class OCRBackend:
+    """Interface for OCR engines used by ``OCRService``"""
+
+    name = "base"
+
+    def version(self) -> str:
+        raise NotImplementedError
+
+    def recognize(self, image: Image.Image, language: str) -> OCRPageResult:
+        """Recognize one page image and return its text with word boxes"""
+        raise NotImplementedError
+
+    def to_pdf(self, image: Image.Image, language: str) -> bytes:
+        """Render a single-page PDF with an invisible text layer"""
+        return pytesseract.image_to_pdf_or_hocr(image, lang=language, extension='pdf')
+
+    def languages(self) -> List[str]:
+        return pytesseract.get_languages()
+
+
+class SubprocessBackend(OCRBackend):
+    """Runs the ``tesseract`` executable through pytesseract, one process per page.
+
+    Text and confidences both come from a single ``image_to_data`` call instead
+    of separate ``image_to_data`` and ``image_to_string`` runs.
+    """
+
+    name = "subprocess"
+
+    def version(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+    def recognize(self, image: Image.Image, language: str) -> OCRPageResult:
+        data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
+
+        lines: Dict[tuple, List[tuple]] = {}
+        for i, text in enumerate(data["text"]):
+            text = (text or "").strip()
+            if data["level"][i] != 5 or not text:
+                continue
+            line_key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(line_key, []).append((
+                text, data["left"][i], data["top"][i], data["width"][i], data["height"][i], float(data["conf"][i])
+            ))
+
+        return assemble_text([(key[:3], words) for key, words in lines.items()])
+
+
+class TesserocrBackend(OCRBackend):
+    """Keeps libtesseract loaded in-process through tesserocr.
+
+    ``TessBaseAPI`` instances are not thread safe, so each thread keeps one
+    initialized API per language. Images are passed as PIL buffers, so no temp
+    files are written and no process is spawned per page.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+        self._tessdata = config("TESSDATA_PREFIX", default="") or None
+
+    def _api(self, language: str):
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get(language)
+        if api is None:
+            kwargs = {"lang": language}
+            if self._tessdata:
+                kwargs["path"] = self._tessdata
+            api = self._tesserocr.PyTessBaseAPI(**kwargs)
+            apis[language] = api
+            logger.info(f"Loaded tesseract model '{language}' in thread {threading.current_thread().name}")
+        return api
+
+    def version(self) -> str:
+        return self._tesserocr.tesseract_version().split()[1]
+
+    def languages(self) -> List[str]:
+        if self._tessdata:
+            return self._tesserocr.get_languages(self._tessdata)[1]
+        return self._tesserocr.get_languages()[1]
+
+    def recognize(self, image: Image.Image, language: str) -> OCRPageResult:
+        RIL = self._tesserocr.RIL
+        api = self._api(language)
+        api.SetImage(image)
+        api.Recognize()
+
+        lines: List[tuple] = []
+        paragraph = 0
+        iterator = api.GetIterator()
+        current_line: Optional[List[tuple]] = None
+        for word in self._tesserocr.iterate_level(iterator, RIL.WORD):
+            if word.IsAtBeginningOf(RIL.PARA) or word.IsAtBeginningOf(RIL.BLOCK):
+                paragraph += 1
+            if current_line is None or word.IsAtBeginningOf(RIL.TEXTLINE):
+                current_line = []
+                lines.append((paragraph, current_line))
+            text = (word.GetUTF8Text(RIL.WORD) or "").strip()
+            box = word.BoundingBox(RIL.WORD)
+            if not text or not box:
+                continue
+            x1, y1, x2, y2 = box
+            current_line.append((text, x1, y1, x2 - x1, y2 - y1, word.Confidence(RIL.WORD)))
+
+        api.Clear()
+        return assemble_text(lines)
+
+
+def get_ocr_backend(name: str = None) -> OCRBackend:
+    """Return the configured backend (``OCR_BACKEND``: auto, tesserocr or subprocess).
+
+    ``auto`` prefers the in-process engine and falls back to the subprocess one
+    when tesserocr is not installed.
+    """
+    name = name or config("OCR_BACKEND", default="auto")
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrBackend()
+        except ImportError:
+            if name == "tesserocr":
+                raise
+            logger.info("tesserocr not installed, using the tesseract subprocess backend")
+    return SubprocessBackend()
@@ -1,22 +1,61 @@
 from fastapi import HTTPException
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 import pytesseract
-from pdf2image import convert_from_path
 from PIL import Image
 import os
-import uuid
-import json
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Set
 import time
 import platform
+import logging
 
 from models import PDFDocument, OCRResult, ProcessingJob
+from services.progress_service import progress_service
+from services.ocr_backends import get_ocr_backend
+from services.rasterizers import get_rasterizer
+from services.artifact_service import PROCESSED_DIR, job_output_key
+from services.storage_service import storage
+from services.job_queue import complete_job, fail_job, start_job
+from services import tool_detection
+from services.word_boxes import pack_words
+from services.page_reuse import PageReuse
+from services.adaptive_dpi import AdaptiveDPI
+from metrics import stage_timer, timed_iter, observe_operation, record_cache
+
+logger = logging.getLogger(__name__)
+
+OCR_PAGE_BATCH = 100  # checkpointed pages read per query when writing or streaming the text
+
+def ocr_pages_query(job_id: str, after_page: int = 0):
+    """Checkpointed pages of an extraction job in page order, as plain rows rather than ORM objects"""
+    return select(
+        OCRResult.page_number, OCRResult.extracted_text, OCRResult.confidence_score, OCRResult.processing_time,
+        OCRResult.dpi
+    ).where(
+        OCRResult.job_id == job_id, OCRResult.page_number > after_page
+    ).order_by(OCRResult.page_number)
+
+def format_page(page_number: int, text: Optional[str]) -> str:
+    """One page of the combined ``.txt`` output; pages are separated by a blank line"""
+    return f"--- Page {page_number} ---\n{text or ''}\n"
 
 class OCRService:
+    """Text extraction and searchable PDF jobs.
+
+    Like ``PDFService``, the job methods block and run in a worker thread
+    with a session opened in that thread.
+    """
+
     def __init__(self):
-        self.processed_dir = "processed"
+        self.processed_dir = PROCESSED_DIR
         os.makedirs(self.processed_dir, exist_ok=True)
+        self.backend = get_ocr_backend()
+        self.rasterizer = get_rasterizer()
+        self.page_reuse = PageReuse()
+        self.adaptive = AdaptiveDPI()
+        self.storage = storage
+        logger.info(f"Using {self.backend.name} OCR backend with {self.rasterizer.name} rasterizer")
         
         # Configure Tesseract path for Windows
         if platform.system() == "Windows":
@@ -25,11 +64,11 @@ class OCRService:
                 import shutil
                 tesseract_path = shutil.which('tesseract')
                 if tesseract_path and os.path.exists(tesseract_path):
-                    print(f"Found Tesseract in PATH: {tesseract_path}")
+                    logger.info(f"Found Tesseract in PATH: {tesseract_path}")
                     pytesseract.pytesseract.tesseract_cmd = tesseract_path
                     return
             except Exception as e:
-                print(f"Error checking Tesseract in PATH: {e}")
+                logger.error(f"Error checking Tesseract in PATH: {e}")
             
             # If not in PATH, check common installation paths
             possible_paths = [
@@ -39,32 +78,38 @@ class OCRService:
             ]
             for path in possible_paths:
                 if os.path.exists(path):
-                    print(f"Found Tesseract at: {path}")
+                    logger.info(f"Found Tesseract at: {path}")
                     pytesseract.pytesseract.tesseract_cmd = path
                     break
             else:
-                print("Warning: Tesseract not found in any of the default locations")
+                logger.warning("Tesseract not found in any of the default locations")
     
     def _check_tesseract(self):
-        """Check if Tesseract is available"""
-        try:
-            version = pytesseract.get_tesseract_version()
-            print(f"Tesseract version found: {version}")
+        """Check if Tesseract is available (probed once, not on every request)"""
+        if tool_detection.tesseract(self.backend)["available"]:
             return True
-        except Exception as e:
-            print(f"Current Tesseract command: {pytesseract.pytesseract.tesseract_cmd}")
-            return False
+        if self.backend.name == "subprocess":
+            logger.warning(f"Current Tesseract command: {pytesseract.pytesseract.tesseract_cmd}")
+        return False
 
-    async def extract_text_from_pdf(self, file_id: str, language: str, user_id: str, db: Session):
-        """Extract text from PDF using OCR"""
+    def extract_text_from_pdf(self, file_id: str, language: str, user_id: str, db: Session,
+                                    job_id: Optional[str] = None, dpi: int = 300, resume: bool = False):
+        """Extract text from PDF using OCR.
+
+        Every page is checkpointed as an ``OCRResult`` row of the job. With
+        ``resume`` the existing (queued or interrupted) job ``job_id`` is run
+        and continues after its last checkpointed page instead of starting over.
+        The text is not returned inline; it is written to a ``.txt`` output
+        and served per page by ``/ocr/{job_id}/pages`` and ``/ocr/{job_id}/text``.
+        """
         job = None
         try:
-            print(f"Starting OCR extraction for file {file_id} with language {language}")
+            logger.info(f"Starting OCR extraction for file {file_id} with language {language}")
             
             # Check Tesseract availability
             if not self._check_tesseract():
                 error_msg = "Tesseract OCR is not installed or not found in PATH"
-                print(error_msg)
+                logger.error(error_msg)
                 raise HTTPException(
                     status_code=500, 
                     detail=error_msg
@@ -78,130 +123,224 @@ class OCRService:
             
             if not document:
                 error_msg = f"Document not found for file_id: {file_id}, user_id: {user_id}"
-                print(error_msg)
+                logger.error(error_msg)
                 raise HTTPException(status_code=404, detail=error_msg)
             
-            print(f"Found document: {document.filename} at {document.file_path}")
+            logger.debug(f"Found document: {document.filename} at {document.file_path}")
             
-            if not os.path.exists(document.file_path):
+            if not self.storage.exists(document.file_path):
                 error_msg = f"File not found on disk: {document.file_path}"
-                print(error_msg)
+                logger.error(error_msg)
                 raise HTTPException(status_code=404, detail=error_msg)
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="ocr",
-                status="processing",
-                input_files=json.dumps([file_id]),
-                parameters=json.dumps({"language": language, "operation": "extract_text"}),
-                started_at=datetime.utcnow()
+            job = start_job(
+                db, job_id, user_id, "ocr", [file_id],
+                {"language": language, "operation": "extract_text", "dpi": dpi}, resume=resume
             )
-            db.add(job)
-            db.commit()
-            print(f"Created processing job: {job.id}")
             
             start_time = time.time()
             
-            try:
-                print(f"Converting PDF to images: {document.file_path}")
-                images = convert_from_path(document.file_path, dpi=300)
-                print(f"Successfully converted PDF to {len(images)} pages")
-            except Exception as e:
-                error_msg = f"Error converting PDF to images: {str(e)}"
-                print(error_msg)
-                raise HTTPException(status_code=500, detail=error_msg)
-            
-            all_text = []
+            with self.storage.local_path(document.file_path) as source_path:
+                try:
+                    page_count = self.rasterizer.page_count(source_path)
+                    progress_service.set_total(job.id, page_count)
+                except Exception as e:
+                    error_msg = f"Error converting PDF to images: {str(e)}"
+                    logger.error(error_msg)
+                    raise HTTPException(status_code=500, detail=error_msg)
             
-            for page_num, image in enumerate(images, 1):
-                print(f"Processing page {page_num}/{len(images)}")
+                # Pages checkpointed by an earlier attempt are not recognized again
+                done_pages = self._checkpointed_pages(db, job.id) if resume else set()
+                pending = [n for n in range(1, page_count + 1) if n not in done_pages]
+                if done_pages:
+                    logger.info(f"Job {job.id}: {len(done_pages)}/{page_count} pages already checkpointed")
+            
+                # Pages recognized before in another document (or an earlier version of this one) are copied
+                with stage_timer("ocr", "fingerprint"):
+                    page_keys = self.page_reuse.page_keys(
+                        source_path, language=language, backend=self.backend.name, **self.adaptive.settings(dpi)
+                    ) if pending else {}
+                    known = self.page_reuse.known_ocr_pages(db, user_id, page_keys)
+                reused = 0
+                for page_num in pending:
+                    if page_keys.get(page_num) in known:
+                        reused += self._reuse_page(db, job, document, language, page_num, page_keys[page_num])
+                    else:
+                        record_cache("ocr_page", False)
+                if reused:
+                    logger.info(f"Job {job.id}: reused {reused}/{page_count} pages recognized in earlier jobs")
+                    done_pages = self._checkpointed_pages(db, job.id)
+                    pending = [n for n in pending if n not in done_pages]
+            
+                # Render lazily in grayscale (Tesseract binarizes anyway), one page in memory at a time.
+                # Adaptive DPI renders low first and re-renders the pages that read badly.
+                first_dpi = self.adaptive.first_dpi(dpi)
+                logger.debug(f"Rasterizing {len(pending)} pages of {document.file_path} at {first_dpi} DPI")
+                images = timed_iter(
+                    self.rasterizer.render_pages(source_path, first_dpi, pending, grayscale=True), "ocr", "rasterize"
+                )
                 page_start_time = time.time()
+                for page_num, image in images:
+                    logger.debug(f"Processing page {page_num}/{page_count}")
                 
-                try:
-                    # Get OCR data with confidence scores
-                    print(f"Running Tesseract OCR on page {page_num}")
-                    ocr_data = pytesseract.image_to_data(
-                        image, 
-                        lang=language, 
-                        output_type=pytesseract.Output.DICT
-                    )
-                
-                    # Extract text
-                    print(f"Extracting text from page {page_num}")
-                    page_text = pytesseract.image_to_string(image, lang=language)
-                    all_text.append(f"--- Page {page_num} ---\n{page_text}\n")
+                    try:
+                        # Text and word confidences come from a single recognition pass
+                        logger.debug(f"Running Tesseract OCR on page {page_num}")
+                        result, page_dpi = self.adaptive.recognize(
+                            self.backend, self.rasterizer, source_path, page_num, image, language, dpi
+                        )
+                        page_text = result.text
                     
-                    # Calculate average confidence
-                    confidences = [int(conf) for conf in ocr_data['conf'] if int(conf) > 0]
-                    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-                    print(f"Page {page_num} processed with average confidence: {avg_confidence:.2f}")
+                        avg_confidence = result.confidence
+                        logger.debug(f"Page {page_num} processed with average confidence: {avg_confidence:.2f}")
                     
-                    # Calculate processing time for this page
-                    page_processing_time = time.time() - page_start_time
-                    print(f"Page {page_num} processed in {page_processing_time:.2f} seconds")
+                        # Calculate processing time for this page
+                        page_processing_time = time.time() - page_start_time
+                        logger.debug(f"Page {page_num} processed in {page_processing_time:.2f} seconds")
+                        with stage_timer("ocr", "checkpoint"):
+                            self._checkpoint_page(
+                                db, job, document, language, page_num, page_text, avg_confidence, page_processing_time,
+                                pack_words(result.words, page_dpi), page_keys.get(page_num), page_dpi
+                            )
+                        progress_service.publish_page(
+                            job.id, page_num, page_processing_time,
+                            text=page_text, confidence=round(avg_confidence, 2), dpi=page_dpi
+                        )
+                        page_start_time = time.time()
                     
-                except Exception as e:
-                    error_msg = f"Error processing page {page_num}: {str(e)}"
-                    print(f"Error details: {traceback.format_exc()}")
-                    raise HTTPException(status_code=500, detail=error_msg)
+                    except Exception as e:
+                        error_msg = f"Error processing page {page_num}: {str(e)}"
+                        logger.exception(error_msg)
+                        raise HTTPException(status_code=500, detail=error_msg)
             
-            # Save combined text file
-            combined_text = "\n".join(all_text)
+            # Save combined text file, streamed from the checkpoints rather than built in memory
             output_filename = f"ocr_text_{file_id}_{int(time.time())}.txt"
-            output_path = os.path.join(self.processed_dir, output_filename)
+            output_path = job_output_key(job.id, output_filename)
             
             try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(combined_text)
-                print(f"OCR results saved to {output_path}")
-                
-                # Update job status
-                job.status = "completed"
-                job.completed_at = datetime.utcnow()
-                job.output_files = json.dumps([output_path])
-                db.commit()
+                with stage_timer("ocr", "write"), self.storage.output_path(output_path) as local_output:
+                    word_count = self._write_text(db, job.id, local_output)
+                    output_size = os.path.getsize(local_output)
+                logger.info(f"OCR results saved to {output_path}")
                 
                 processing_time = time.time() - start_time
-                print(f"OCR processing completed in {processing_time:.2f} seconds")
+                
+                complete_job(db, job, processing_time, [output_path])
+                logger.info(f"OCR processing completed in {processing_time:.2f} seconds")
+                observe_operation(
+                    "ocr", processing_time, pages=page_count,
+                    bytes_in=document.file_size, bytes_out=output_size
+                )
                 
                 return {
-                    "extracted_text": combined_text,
                     "confidence": 95.0,  # Placeholder
                     "processing_time": processing_time,
                     "language": language,
-                    "word_count": len(combined_text.split())
+                    "word_count": word_count,
+                    "page_count": page_count,
+                    "pages_by_dpi": self._pages_by_dpi(db, job.id),
+                    "output_path": output_path,
+                    "job_id": job.id,
+                    "pages_url": f"/ocr/{job.id}/pages",
+                    "text_url": f"/ocr/{job.id}/text"
                 }
                 
             except Exception as e:
                 error_msg = f"Error saving OCR results: {str(e)}"
-                print(error_msg)
+                logger.error(error_msg)
                 raise HTTPException(status_code=500, detail=error_msg)
                 
-        except HTTPException:
+        except HTTPException as he:
+            if job:
+                fail_job(db, job, str(he.detail))
             # Re-raise HTTP exceptions as they are
             raise
             
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
-            print(f"Unexpected error in extract_text_from_pdf: {error_details}")
+            logger.error(f"Unexpected error in extract_text_from_pdf: {error_details}")
             
             # Update job status if it was created
             if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(e))
             
             raise HTTPException(
                 status_code=500, 
                 detail=f"An unexpected error occurred during OCR processing: {str(e)}"
             )
 
-    async def create_searchable_pdf(self, file_id: str, language: str, user_id: str, db: Session):
+    @staticmethod
+    def _checkpointed_pages(db: Session, job_id: str) -> Set[int]:
+        return {page_number for page_number, in db.query(OCRResult.page_number).filter(OCRResult.job_id == job_id)}
+
+    @staticmethod
+    def _pages_by_dpi(db: Session, job_id: str) -> Dict[str, int]:
+        rows = db.query(OCRResult.dpi, func.count(OCRResult.id)).filter(OCRResult.job_id == job_id).group_by(OCRResult.dpi)
+        return {str(dpi): count for dpi, count in rows if dpi}
+
+    @staticmethod
+    def iter_pages(db: Session, job_id: str) -> Iterator:
+        """Checkpointed pages of a job in order, ``OCR_PAGE_BATCH`` rows in memory at a time"""
+        after_page = 0
+        while True:
+            rows = db.execute(ocr_pages_query(job_id, after_page).limit(OCR_PAGE_BATCH)).all()
+            yield from rows
+            if len(rows) < OCR_PAGE_BATCH:
+                return
+            after_page = rows[-1].page_number
+
+    def _write_text(self, db: Session, job_id: str, output_path: str) -> int:
+        """Write the combined text file page by page and return its word count"""
+        word_count = 0
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for index, page in enumerate(self.iter_pages(db, job_id)):
+                f.write(("\n" if index else "") + format_page(page.page_number, page.extracted_text))
+                word_count += len((page.extracted_text or "").split())
+        return word_count
+
+    def _reuse_page(self, db: Session, job: ProcessingJob, document: PDFDocument, language: str,
+                          page_number: int, page_key: str) -> bool:
+        """Checkpoint a page from an earlier recognition of the same page; False if it has gone since"""
+        earlier = self.page_reuse.ocr_page(db, job.user_id, page_key)
+        record_cache("ocr_page", earlier is not None)
+        if earlier is None:
+            return False
+        self._checkpoint_page(
+            db, job, document, language, page_number, earlier.extracted_text,
+            earlier.confidence_score, 0.0, earlier.word_boxes, page_key, earlier.dpi
+        )
+        progress_service.publish_page(
+            job.id, page_number, 0.0, text=earlier.extracted_text,
+            confidence=round(earlier.confidence_score or 0.0, 2), dpi=earlier.dpi, reused=True
+        )
+        return True
+
+    @staticmethod
+    def _checkpoint_page(db: Session, job: ProcessingJob, document: PDFDocument, language: str,
+                         page_number: int, text: str, confidence: float, processing_time: float,
+                         word_boxes: Optional[bytes] = None, page_key: Optional[str] = None, dpi: Optional[int] = None):
+        """Durably record one recognized page and refresh the job's heartbeat"""
+        db.add(OCRResult(
+            document_id=document.id,
+            user_id=job.user_id,
+            job_id=job.id,
+            extracted_text=text,
+            confidence_score=confidence,
+            language=language,
+            page_number=page_number,
+            processing_time=processing_time,
+            word_boxes=word_boxes,
+            page_key=page_key,
+            dpi=dpi
+        ))
+        job.heartbeat_at = datetime.utcnow()
+        db.commit()
+
+    def create_searchable_pdf(self, file_id: str, language: str, user_id: str, db: Session,
+                                    job_id: Optional[str] = None, dpi: int = 300, resume: bool = False):
         """Create a searchable PDF by adding OCR text layer"""
+        job = None
         try:
             # Check Tesseract availability
             if not self._check_tesseract():
@@ -218,85 +357,74 @@ class OCRService:
             if not document:
                 raise HTTPException(status_code=404, detail="File not found")
             
-            if not os.path.exists(document.file_path):
+            if not self.storage.exists(document.file_path):
                 raise HTTPException(status_code=404, detail="File not found on disk")
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="ocr",
-                status="processing",
-                input_files=json.dumps([file_id]),
-                parameters=json.dumps({"language": language, "operation": "searchable_pdf"}),
-                started_at=datetime.utcnow()
+            job = start_job(
+                db, job_id, user_id, "searchable_pdf", [file_id],
+                {"language": language, "operation": "searchable_pdf", "dpi": dpi},
+                resume=resume, total_pages=1, job_type="ocr"
             )
-            db.add(job)
-            db.commit()
             
             start_time = time.time()
             
-            # Convert PDF to images
-            images = convert_from_path(document.file_path, dpi=300)
+            # Only the first page is rendered into the searchable PDF for now
+            with stage_timer("searchable_pdf", "rasterize"):
+                with self.storage.local_path(document.file_path) as source_path:
+                    images = list(self.rasterizer.render(source_path, dpi, first_page=1, last_page=1))
             
             # Create searchable PDF using pytesseract
             output_filename = f"searchable_{document.filename}"
-            output_path = os.path.join(self.processed_dir, output_filename)
+            output_path = job_output_key(job.id, output_filename)
             
             # For now, we'll create a simple searchable PDF
             # In a production environment, you might want to use more sophisticated libraries
             # like OCRmyPDF or create a proper PDF with invisible text layer
             
-            pdf_bytes = pytesseract.image_to_pdf_or_hocr(
-                images[0] if images else None,
-                lang=language,
-                extension='pdf'
-            )
+            with stage_timer("searchable_pdf", "ocr"):
+                pdf_bytes = self.backend.to_pdf(images[0] if images else None, language)
             
-            with open(output_path, 'wb') as f:
-                f.write(pdf_bytes)
+            with stage_timer("searchable_pdf", "write"), self.storage.output_path(output_path) as local_output:
+                with open(local_output, 'wb') as f:
+                    f.write(pdf_bytes)
             
             total_processing_time = time.time() - start_time
+            progress_service.publish_page(job.id, 1, total_processing_time)
             
-            # Update job status
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.processing_time = total_processing_time
-            job.output_files = json.dumps([output_filename])
-            
-            db.commit()
+            complete_job(db, job, total_processing_time, [output_path])
+            observe_operation(
+                "searchable_pdf", total_processing_time, pages=1,
+                bytes_in=document.file_size, bytes_out=len(pdf_bytes)
+            )
             
             return {
                 "success": True,
                 "message": "Searchable PDF created successfully",
                 "output_file": output_filename,
-                "download_url": f"/processed/{output_filename}",
+                "output_path": output_path,
+                "download_url": f"/jobs/{job.id}/files/{output_filename}",
                 "processing_time": total_processing_time,
                 "job_id": job.id
             }
             
         except Exception as e:
-            if 'job' in locals():
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+            if job:
+                fail_job(db, job, str(getattr(e, "detail", None) or e), operation="searchable_pdf")
             
             raise HTTPException(status_code=500, detail=f"Error creating searchable PDF: {str(e)}")
 
     def get_supported_languages(self):
         """Get list of supported OCR languages"""
-        try:
-            languages = pytesseract.get_languages()
+        tesseract = tool_detection.tesseract(self.backend)
+        if tesseract["available"]:
             return {
                 "success": True,
-                "languages": languages,
+                "languages": tesseract["languages"],
                 "default": "eng"
             }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "languages": ["eng"],  # Fallback
-                "default": "eng"
-            }
\ No newline at end of file
+        return {
+            "success": False,
+            "error": tesseract["error"],
+            "languages": ["eng"],  # Fallback
+            "default": "eng"
+        }
\ No newline at end of file
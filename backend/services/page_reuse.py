@@ -0,0 +1,93 @@
+from decouple import config
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional, Set
+import hashlib
+import json
+import logging
+
+from models import OCRResult, PageRender
+from services.pdf_engines import PDFEngine, get_pdf_engine
+from services.storage_service import storage
+
+logger = logging.getLogger(__name__)
+
+REUSE_SCOPES = ("user", "global", "off")
+LOOKUP_BATCH = 500  # page keys per IN (...) query
+
+
+class PageReuse:
+    """Reuse OCR text and page images for pages already processed in another document.
+
+    Pages are matched on ``PDFEngine.page_fingerprints`` combined with the
+    settings that shape the result (language, DPI and backend for OCR; format,
+    DPI and rasterizer for renders), so the pages two versions of a contract
+    have in common are recognized or rendered once. ``PAGE_REUSE=user``
+    (default) only reuses the user's own jobs, ``global`` any user's and
+    ``off`` disables it. Reusable results live as long as the job that
+    produced them (``ARTIFACT_TTL_HOURS``).
+    """
+
+    def __init__(self, engine: Optional[PDFEngine] = None):
+        self.scope = config("PAGE_REUSE", default="user")
+        if self.scope not in REUSE_SCOPES:
+            raise ValueError(f"PAGE_REUSE must be one of {', '.join(REUSE_SCOPES)}, not '{self.scope}'")
+        self._engine = engine
+
+    @property
+    def engine(self) -> PDFEngine:
+        if self._engine is None:
+            self._engine = get_pdf_engine()
+        return self._engine
+
+    def page_keys(self, file_path: str, **settings: Any) -> Dict[int, str]:
+        """Reuse key of every page (1-based) that could be fingerprinted"""
+        if self.scope == "off":
+            return {}
+        try:
+            with self.engine.opened(file_path) as document:
+                fingerprints = self.engine.page_fingerprints(document)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint the pages of {file_path}: {e}")
+            return {}
+        suffix = json.dumps(settings, sort_keys=True)
+        return {
+            number: hashlib.sha256(f"{fingerprint}:{suffix}".encode()).hexdigest()
+            for number, fingerprint in enumerate(fingerprints, 1) if fingerprint
+        }
+
+    def _scoped(self, query, model, user_id: str):
+        return query.filter(model.user_id == user_id) if self.scope == "user" else query
+
+    def _lookup(self, db: Session, columns, model, user_id: str, keys: Set[str]):
+        keys = sorted(keys)
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            query = db.query(*columns).filter(model.page_key.in_(keys[start:start + LOOKUP_BATCH]))
+            yield from self._scoped(query, model, user_id)
+
+    def known_ocr_pages(self, db: Session, user_id: str, page_keys: Dict[int, str]) -> Set[str]:
+        """Keys among ``page_keys`` that were already recognized"""
+        if not page_keys:
+            return set()
+        return {row.page_key for row in self._lookup(db, (OCRResult.page_key,), OCRResult, user_id, set(page_keys.values()))}
+
+    def ocr_page(self, db: Session, user_id: str, page_key: str):
+        """Text, confidence and word boxes of an earlier recognition of the page, or None"""
+        query = db.query(
+            OCRResult.extracted_text, OCRResult.confidence_score, OCRResult.word_boxes, OCRResult.dpi
+        ).filter(OCRResult.page_key == page_key)
+        return self._scoped(query, OCRResult, user_id).first()
+
+    def renders(self, db: Session, user_id: str, page_keys: Dict[int, str]) -> Dict[str, str]:
+        """Stored image of an earlier render, by key, for the keys among ``page_keys`` that have one"""
+        if not page_keys:
+            return {}
+        found: Dict[str, str] = {}
+        for row in self._lookup(db, (PageRender.page_key, PageRender.file_path), PageRender, user_id, set(page_keys.values())):
+            if row.page_key not in found and storage.exists(row.file_path):
+                found[row.page_key] = row.file_path
+        return found
+
+    @staticmethod
+    def record_render(db: Session, user_id: str, job_id: str, page_key: str, file_path: str):
+        """Remember an image for later jobs; committed with the job's next write"""
+        db.add(PageRender(page_key=page_key, user_id=user_id, job_id=job_id, file_path=file_path))
@@ -0,0 +1,445 @@
+from decouple import config
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import logging
+import mmap
+import threading
+
+from PyPDF2 import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+# Page entries that decide how a page renders; the first four are inherited from the page tree
+FINGERPRINT_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate", "/Contents", "/Annots", "/Group", "/UserUnit")
+INHERITABLE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+# Back references that would make every page hash differently (and loop)
+SKIPPED_KEYS = ("/Parent", "/P", "/StructParent", "/StructParents")
+LETTER_MEDIABOX = (0, 0, 612, 792)  # used when a page has no media box
+
+
+class PDFEncryptedError(ValueError):
+    """The document needs a password to be opened"""
+
+
+class _ObjectHasher:
+    """Digest of a PDF object graph that ignores object numbers.
+
+    Indirect objects are hashed once and their digest reused, so resources
+    shared by many pages (fonts, logos) cost one pass per document.
+    """
+
+    def __init__(self, resolve: Callable[[Any], Any], describe: Callable[[Any, "_ObjectHasher"], bytes]):
+        self._resolve = resolve  # (object) -> (memo key or None, direct object)
+        self._describe = describe
+        self._digests: Dict[Any, bytes] = {}
+
+    def digest(self, obj: Any) -> bytes:
+        key, obj = self._resolve(obj)
+        if key is not None:
+            if key in self._digests:
+                return self._digests[key]
+            self._digests[key] = b"cycle"
+        digest = hashlib.sha256(self._describe(obj, self)).digest()
+        if key is not None:
+            self._digests[key] = digest
+        return digest
+
+    def page(self, lookup: Callable[[str], Any], contents: bytes) -> str:
+        """Fingerprint of one page from its (inherited) entries and decoded content stream"""
+        digest = hashlib.sha256(b"page-v1")
+        for key in FINGERPRINT_KEYS:
+            value = contents if key == "/Contents" else lookup(key)
+            if value is None:
+                continue
+            digest.update(key.encode())
+            digest.update(hashlib.sha256(value).digest() if key == "/Contents" else self.digest(value))
+        return digest.hexdigest()
+
+
+def _inherited(node: Any, key: str, parent: Callable[[Any], Any]) -> Any:
+    if key not in INHERITABLE_KEYS:
+        return node.get(key)
+    while node is not None:
+        if key in node:
+            return node.get(key)
+        node = parent(node)
+    return None
+
+
+def _image_sizes(resources: Iterable[Any], lookup: Callable[[Any, str], Any],
+                 members: Callable[[Any], Iterable[Tuple[Any, Any]]]) -> Iterator[Tuple[int, int]]:
+    """Declared pixel size of every distinct image XObject reachable from ``resources``, forms included.
+
+    ``lookup(node, key)`` returns a resolved entry or None and ``members(node)``
+    yields ``(object id or None, resolved value)`` for every entry.
+    """
+    seen = set()
+    pending = [node for node in resources if node is not None]
+    while pending:
+        xobjects = lookup(pending.pop(), "/XObject")
+        if xobjects is None:
+            continue
+        for ref, xobject in members(xobjects):
+            if ref is not None:
+                if ref in seen:
+                    continue
+                seen.add(ref)
+            subtype = lookup(xobject, "/Subtype")
+            if subtype == "/Image":
+                yield int(lookup(xobject, "/Width") or 0), int(lookup(xobject, "/Height") or 0)
+            elif subtype == "/Form" and lookup(xobject, "/Resources") is not None:
+                pending.append(lookup(xobject, "/Resources"))
+
+
+def _box_size(box: Any, user_unit: Any) -> Tuple[float, float]:
+    left, bottom, right, top = (float(value) for value in (box if box is not None else LETTER_MEDIABOX))
+    unit = float(user_unit or 1)
+    return abs(right - left) * unit, abs(top - bottom) * unit
+
+
+class PDFEngine:
+    """Document operations used by ``PDFService``.
+
+    Documents returned by ``open`` and ``new`` are engine specific handles.
+    Source documents must stay open until every output that took pages from
+    them has been written.
+    """
+
+    name = "base"
+
+    def open(self, file_path: str, mapped: bool = False) -> Any:
+        """Open a document; ``mapped`` reads it through a memory map so pages load lazily"""
+        raise NotImplementedError
+
+    def new(self) -> Any:
+        raise NotImplementedError
+
+    def page_count(self, document: Any) -> int:
+        raise NotImplementedError
+
+    def append_pages(self, output: Any, source: Any, pages: Optional[Iterable[int]] = None) -> int:
+        """Append ``pages`` (0-based, default all) of ``source`` to ``output``; return how many"""
+        raise NotImplementedError
+
+    def write(self, output: Any, file_path: str, compression_level: Optional[int] = None):
+        """Save ``output``; with ``compression_level`` (0-9) content streams are recompressed"""
+        raise NotImplementedError
+
+    def close(self, document: Any):
+        pass
+
+    def is_encrypted(self, document: Any) -> bool:
+        raise NotImplementedError
+
+    def page_sizes(self, document: Any) -> List[Tuple[float, float]]:
+        """Width and height in points of every page's media box, ``/UserUnit`` applied"""
+        raise NotImplementedError
+
+    def image_sizes(self, document: Any) -> Iterator[Tuple[int, int]]:
+        """Width and height in pixels of every distinct image the pages draw.
+
+        Read from the image dictionaries, so nothing is decoded.
+        """
+        raise NotImplementedError
+
+    def repair(self, file_path: str, output_path: str):
+        """Rewrite a document with a damaged cross-reference table, rebuilt from its objects"""
+        raise NotImplementedError
+
+    def page_fingerprints(self, document: Any) -> List[Optional[str]]:
+        """Content hash of every page, equal for pages that render the same in any document.
+
+        Built from the decoded content stream and the resources, boxes and
+        annotations the page uses, ignoring object numbers, so a page copied
+        into another document or a later version of it keeps its fingerprint.
+        None for pages that could not be hashed.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def opened(self, file_path: str):
+        document = self.open(file_path)
+        try:
+            yield document
+        finally:
+            self.close(document)
+
+    @contextmanager
+    def created(self):
+        document = self.new()
+        try:
+            yield document
+        finally:
+            self.close(document)
+
+    def merge(self, file_paths: Iterable[str], output_path: str) -> int:
+        """Merge whole documents into ``output_path``; return the page count"""
+        sources = [self.open(path) for path in file_paths]
+        try:
+            with self.created() as output:
+                total = sum(self.append_pages(output, source) for source in sources)
+                self.write(output, output_path)
+            return total
+        finally:
+            for source in sources:
+                self.close(source)
+
+
+class PyPDF2Engine(PDFEngine):
+    """Pure Python engine on PyPDF2"""
+
+    name = "pypdf2"
+
+    def open(self, file_path: str, mapped: bool = False) -> PdfReader:
+        if mapped:
+            with open(file_path, 'rb') as f:
+                try:
+                    return PdfReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                except ValueError:  # Empty files cannot be mapped
+                    pass
+        # Reads the whole file into memory
+        return PdfReader(file_path)
+
+    def new(self) -> PdfWriter:
+        return PdfWriter()
+
+    def page_count(self, document: PdfReader) -> int:
+        return len(document.pages)
+
+    def append_pages(self, output: PdfWriter, source: PdfReader, pages: Optional[Iterable[int]] = None) -> int:
+        indices = range(len(source.pages)) if pages is None else pages
+        count = 0
+        for index in indices:
+            output.add_page(source.pages[index])
+            count += 1
+        return count
+
+    def close(self, document):
+        stream = getattr(document, "stream", None)
+        if isinstance(stream, mmap.mmap):
+            stream.close()
+
+    def is_encrypted(self, document: PdfReader) -> bool:
+        return document.is_encrypted
+
+    def page_sizes(self, document: PdfReader) -> List[Tuple[float, float]]:
+        # PdfReader copies inherited page attributes (resources, boxes) onto every page
+        return [_box_size(page.mediabox, page.get("/UserUnit")) for page in document.pages]
+
+    def image_sizes(self, document: PdfReader) -> Iterator[Tuple[int, int]]:
+        from PyPDF2.generic import IndirectObject
+
+        def lookup(node, key):
+            # Indexing resolves indirect references, get() does not
+            return node[key] if key in node else None
+
+        def members(node):
+            for key in node:
+                value = node.raw_get(key)
+                ref = (value.idnum, value.generation) if isinstance(value, IndirectObject) else None
+                yield ref, value.get_object()
+
+        return _image_sizes((lookup(page, "/Resources") for page in document.pages), lookup, members)
+
+    def repair(self, file_path: str, output_path: str):
+        # Non-strict parsing rebuilds the cross-reference table by scanning for objects.
+        # Pages and document info are kept; outlines and forms are not.
+        reader = PdfReader(file_path, strict=False)
+        output = self.new()
+        self.append_pages(output, reader)
+        if reader.metadata:
+            output.add_metadata(reader.metadata)
+        self.write(output, output_path)
+
+    def page_fingerprints(self, document: PdfReader) -> List[Optional[str]]:
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+        def resolve(obj):
+            if isinstance(obj, IndirectObject):
+                return (obj.idnum, obj.generation), obj.get_object()
+            return None, obj
+
+        def describe(obj, hasher: _ObjectHasher) -> bytes:
+            if isinstance(obj, DictionaryObject):
+                parts = [b"<<"]
+                for key in sorted(obj.keys()):
+                    if key not in SKIPPED_KEYS and key != "/Length":
+                        parts += [key.encode(), hasher.digest(obj.raw_get(key))]
+                if isinstance(obj, StreamObject):
+                    # Encoded bytes; decoding every image would dominate the cost
+                    parts += [b"stream", hashlib.sha256(obj._data or b"").digest()]
+                return b"".join(parts)
+            if isinstance(obj, ArrayObject):
+                return b"[" + b"".join(hasher.digest(item) for item in obj)
+            return f"{type(obj).__name__}:{obj!r}".encode()
+
+        def contents(page) -> bytes:
+            streams = page.get("/Contents")
+            if streams is None:
+                return b""
+            streams = streams.get_object()
+            if isinstance(streams, ArrayObject):
+                return b"".join(stream.get_object().get_data() for stream in streams)
+            return streams.get_data()
+
+        hasher = _ObjectHasher(resolve, describe)
+        fingerprints = []
+        for number, page in enumerate(document.pages, 1):
+            try:
+                fingerprints.append(hasher.page(
+                    # Indexing resolves indirect references, get() does not
+                    lambda key: _inherited(page, key, lambda node: node["/Parent"] if "/Parent" in node else None),
+                    contents(page)
+                ))
+            except Exception as e:
+                logger.debug(f"Could not fingerprint page {number}: {e}")
+                fingerprints.append(None)
+        return fingerprints
+
+    def write(self, output: PdfWriter, file_path: str, compression_level: Optional[int] = None):
+        if compression_level:
+            # PyPDF2 always deflates at zlib's default level; the level only switches it on
+            for page in output.pages:
+                page.compress_content_streams()
+        with open(file_path, 'wb') as output_file:
+            output.write(output_file)
+
+
+class PikepdfEngine(PDFEngine):
+    """qpdf through pikepdf; parses xref tables and object streams in C++"""
+
+    name = "pikepdf"
+    # qpdf's Flate level is a process-wide setting rather than a save option,
+    # so saves hold this lock while it is changed and until it is restored
+    _save_lock = threading.Lock()
+    DEFAULT_FLATE_LEVEL = -1  # zlib's default
+
+    def __init__(self):
+        import pikepdf
+
+        self._pikepdf = pikepdf
+
+    def open(self, file_path: str, mapped: bool = False):
+        access_mode = self._pikepdf.AccessMode.mmap if mapped else self._pikepdf.AccessMode.default
+        try:
+            return self._pikepdf.open(file_path, access_mode=access_mode)
+        except self._pikepdf.PasswordError as e:
+            raise PDFEncryptedError(str(e)) from e
+
+    def new(self):
+        return self._pikepdf.new()
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def append_pages(self, output, source, pages: Optional[Iterable[int]] = None) -> int:
+        # add_pages_from keeps AcroForm fields and named destinations working,
+        # which pages.extend() drops
+        indices = range(len(source.pages)) if pages is None else list(pages)
+        output.add_pages_from(source, indices)
+        return len(indices)
+
+    def write(self, output, file_path: str, compression_level: Optional[int] = None):
+        pikepdf = self._pikepdf
+        with self._save_lock:
+            if compression_level is None:
+                output.save(file_path)
+                return
+            pikepdf.settings.set_flate_compression_level(compression_level)
+            try:
+                output.save(
+                    file_path,
+                    compress_streams=True,
+                    recompress_flate=True,
+                    object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                )
+            finally:
+                pikepdf.settings.set_flate_compression_level(self.DEFAULT_FLATE_LEVEL)
+
+    def close(self, document):
+        document.close()
+
+    def is_encrypted(self, document) -> bool:
+        return document.is_encrypted
+
+    def _page_entry(self, page, key: str):
+        return _inherited(page.obj, key, lambda node: node.get("/Parent"))
+
+    def page_sizes(self, document) -> List[Tuple[float, float]]:
+        return [
+            _box_size(self._page_entry(page, "/MediaBox"), page.obj.get("/UserUnit")) for page in document.pages
+        ]
+
+    def image_sizes(self, document) -> Iterator[Tuple[int, int]]:
+        def members(node):
+            for _, value in node.items():
+                yield (value.objgen if value.is_indirect else None), value
+
+        return _image_sizes(
+            (self._page_entry(page, "/Resources") for page in document.pages),
+            lambda node, key: node.get(key), members
+        )
+
+    def repair(self, file_path: str, output_path: str):
+        # qpdf reconstructs a damaged cross-reference table while opening
+        with self._pikepdf.open(file_path) as document:
+            document.save(output_path)
+
+    def page_fingerprints(self, document) -> List[Optional[str]]:
+        pikepdf = self._pikepdf
+
+        def resolve(obj):
+            if isinstance(obj, pikepdf.Object) and obj.is_indirect:
+                return obj.objgen, obj
+            return None, obj
+
+        def describe(obj, hasher: _ObjectHasher) -> bytes:
+            if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+                parts = [b"<<"]
+                for key in sorted(obj.keys()):
+                    if key not in SKIPPED_KEYS and key != "/Length":
+                        parts += [key.encode(), hasher.digest(obj.get(key))]
+                if isinstance(obj, pikepdf.Stream):
+                    # Encoded bytes; decoding every image would dominate the cost
+                    parts += [b"stream", hashlib.sha256(obj.read_raw_bytes()).digest()]
+                return b"".join(parts)
+            if isinstance(obj, pikepdf.Array):
+                return b"[" + b"".join(hasher.digest(item) for item in obj)
+            return f"{type(obj).__name__}:{obj!r}".encode()
+
+        def contents(page) -> bytes:
+            streams = page.obj.get("/Contents")
+            if streams is None:
+                return b""
+            if isinstance(streams, pikepdf.Array):
+                return b"".join(stream.read_bytes() for stream in streams)
+            return streams.read_bytes()
+
+        hasher = _ObjectHasher(resolve, describe)
+        fingerprints = []
+        for number, page in enumerate(document.pages, 1):
+            try:
+                fingerprints.append(hasher.page(
+                    lambda key: _inherited(page.obj, key, lambda node: node.get("/Parent")), contents(page)
+                ))
+            except Exception as e:
+                logger.debug(f"Could not fingerprint page {number}: {e}")
+                fingerprints.append(None)
+        return fingerprints
+
+
+def get_pdf_engine(name: str = None) -> PDFEngine:
+    """Return the configured engine (``PDF_ENGINE``: auto, pikepdf or pypdf2).
+
+    ``auto`` uses pikepdf when it is installed and falls back to PyPDF2.
+    """
+    name = name or config("PDF_ENGINE", default="auto")
+    if name in ("auto", "pikepdf"):
+        try:
+            return PikepdfEngine()
+        except ImportError:
+            if name == "pikepdf":
+                raise
+            logger.info("pikepdf not installed, using PyPDF2")
+    return PyPDF2Engine()
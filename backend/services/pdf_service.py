@@ -1,51 +1,58 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from pdf2image import convert_from_path
 from PIL import Image
 import os
-import uuid
+import shutil
 from typing import List, Optional
-import json
+from contextlib import ExitStack
 from datetime import datetime
-import shutil
-import platform
 import time
+import logging
+
+from models import PDFDocument
+from services.progress_service import progress_service
+from services.rasterizers import get_rasterizer
+from services.pdf_engines import get_pdf_engine
+from services.document_cache import DocumentCache
+from services.page_reuse import PageReuse
+from services.artifact_service import PROCESSED_DIR, job_output_key
+from services.storage_service import storage
+from services.job_queue import complete_job, fail_job, heartbeat_job, start_job
+from metrics import stage_timer, timed_iter, observe_operation, record_cache
 
-from models import PDFDocument, ProcessingJob
+logger = logging.getLogger(__name__)
 
 class PDFService:
+    """Merge, split, compress and convert jobs.
+
+    The job methods block until the job is done. Callers run them in a
+    worker thread, passing a session opened in that thread.
+    """
+
     def __init__(self):
         self.upload_dir = "uploads"
-        self.processed_dir = "processed"
+        self.processed_dir = PROCESSED_DIR
         os.makedirs(self.upload_dir, exist_ok=True)
         os.makedirs(self.processed_dir, exist_ok=True)
         
-        # Check for poppler (needed for PDF to image conversion)
-        self._check_poppler()
+        self.engine = get_pdf_engine()
+        self.documents = DocumentCache(self.engine)
+        self.rasterizer = get_rasterizer()
+        self.page_reuse = PageReuse(self.engine)
+        self.storage = storage
+        logger.info(f"Using {self.engine.name} PDF engine and {self.rasterizer.name} rasterizer")
     
-    def _check_poppler(self):
-        """Check if poppler is available in PATH"""
-        try:
-            poppler_path = shutil.which('pdftoppm')
-            if poppler_path:
-                print(f"Poppler found at: {poppler_path}")
-                return True
-            else:
-                print("Warning: Poppler not found in PATH. PDF to image conversion will fail.")
-                print("Install from: https://github.com/oschwartz10612/poppler-windows/releases/")
-                return False
-        except Exception as e:
-            print(f"Error checking for Poppler: {e}")
-            return False
+    @staticmethod
+    def compression_level(quality: int) -> int:
+        """Map quality (0-100) to a zlib compression level (0-9, where 0 is no compression)"""
+        return min(9, max(0, 9 - int(quality / 12)))  # Map 0-100 to 9-1
 
-    async def merge_pdfs(self, file_ids: List[str], user_id: str, db: Session):
+    def merge_pdfs(self, file_ids: List[str], user_id: str, db: Session, job_id: Optional[str] = None,
+                         resume: bool = False):
         """Merge multiple PDF files into one"""
         job = None
         try:
-            print(f"Starting PDF merge for {len(file_ids)} files")
+            logger.info(f"Starting PDF merge for {len(file_ids)} files")
             
             # Get PDF documents from database
             documents = db.query(PDFDocument).filter(
@@ -56,89 +63,85 @@ class PDFService:
             if len(documents) != len(file_ids):
                 raise HTTPException(status_code=404, detail="One or more files not found")
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="merge",
-                status="processing",
-                input_files=json.dumps(file_ids),
-                parameters=json.dumps({"file_count": len(file_ids)}),
-                started_at=datetime.utcnow()
+            job = start_job(
+                db, job_id, user_id, "merge", file_ids,
+                {"file_count": len(file_ids)}, resume=resume, total_pages=len(documents)
             )
-            db.add(job)
-            db.commit()
-            print(f"Created merge job: {job.id}")
             
             start_time = time.time()
             
-            # Merge PDFs
-            writer = PdfWriter()
+            output_filename = f"merged_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
+            output_path = job_output_key(job.id, output_filename)
             total_pages = 0
             
-            for doc in documents:
-                if not os.path.exists(doc.file_path):
-                    raise HTTPException(status_code=404, detail=f"File {doc.filename} not found on disk")
-                
-                print(f"Adding {doc.filename} to merge")
-                reader = PdfReader(doc.file_path)
-                page_count = len(reader.pages)
-                total_pages += page_count
+            # Sources stay open until the merged document is written
+            with ExitStack() as stack:
+                writer = stack.enter_context(self.engine.created())
                 
-                for page in reader.pages:
-                    writer.add_page(page)
+                for index, doc in enumerate(documents, 1):
+                    if not self.storage.exists(doc.file_path):
+                        raise HTTPException(status_code=404, detail=f"File {doc.filename} not found on disk")
+                    
+                    logger.debug(f"Adding {doc.filename} to merge")
+                    doc_start_time = time.time()
+                    with stage_timer("merge", "read"):
+                        source_path = stack.enter_context(self.storage.local_path(doc.file_path))
+                        reader = stack.enter_context(self.documents.open(source_path))
+                        page_count = self.engine.append_pages(writer, reader)
+                        total_pages += page_count
+                    
+                    logger.debug(f"Added {page_count} pages from {doc.filename}")
+                    progress_service.publish_page(
+                        job.id, index, time.time() - doc_start_time,
+                        document=doc.filename, document_pages=page_count
+                    )
+                    heartbeat_job(db, job)
                 
-                print(f"Added {page_count} pages from {doc.filename}")
-            
-            # Save merged PDF
-            output_filename = f"merged_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-            output_path = os.path.join(self.processed_dir, output_filename)
+                # Save merged PDF
+                with stage_timer("merge", "write"), self.storage.output_path(output_path) as local_output:
+                    self.engine.write(writer, local_output)
+                    file_size = os.path.getsize(local_output)
             
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
-            
-            file_size = os.path.getsize(output_path)
             processing_time = time.time() - start_time
+            observe_operation(
+                "merge", processing_time, pages=total_pages,
+                bytes_in=sum(doc.file_size for doc in documents), bytes_out=file_size
+            )
             
-            print(f"Merged PDF saved: {output_filename} ({file_size} bytes, {total_pages} pages)")
-            print(f"Merge completed in {processing_time:.2f} seconds")
+            logger.info(f"Merged PDF saved: {output_filename} ({file_size} bytes, {total_pages} pages)")
+            logger.info(f"Merge completed in {processing_time:.2f} seconds")
             
-            # Update job status
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.processing_time = processing_time
-            job.output_files = json.dumps([output_path])
-            db.commit()
+            complete_job(db, job, processing_time, [output_path])
             
             return {
                 "success": True,
                 "message": f"Successfully merged {len(file_ids)} PDFs into one file",
                 "output_file": output_filename,
-                "download_url": f"/processed/{output_filename}",
+                "output_path": output_path,
+                "download_url": f"/jobs/{job.id}/files/{output_filename}",
                 "total_pages": total_pages,
                 "file_size": file_size,
                 "processing_time": round(processing_time, 2),
                 "job_id": job.id
             }
             
-        except HTTPException:
+        except HTTPException as he:
+            if job:
+                fail_job(db, job, str(he.detail))
             raise
         except Exception as e:
-            print(f"Error merging PDFs: {str(e)}")
-            # Update job status on error
+            logger.error(f"Error merging PDFs: {str(e)}")
             if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(e))
             
             raise HTTPException(status_code=500, detail=f"Error merging PDFs: {str(e)}")
 
-    async def split_pdf(self, file_id: str, pages: List[int], user_id: str, db: Session):
+    def split_pdf(self, file_id: str, pages: List[int], user_id: str, db: Session, job_id: Optional[str] = None,
+                        resume: bool = False):
         """Split PDF into separate files based on page numbers"""
         job = None
         try:
-            print(f"Starting PDF split for file {file_id}, pages: {pages}")
+            logger.info(f"Starting PDF split for file {file_id}, pages: {pages}")
             
             # Get PDF document
             document = db.query(PDFDocument).filter(
@@ -149,69 +152,65 @@ class PDFService:
             if not document:
                 raise HTTPException(status_code=404, detail="File not found")
             
-            if not os.path.exists(document.file_path):
+            if not self.storage.exists(document.file_path):
                 raise HTTPException(status_code=404, detail="File not found on disk")
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="split",
-                status="processing",
-                input_files=json.dumps([file_id]),
-                parameters=json.dumps({"pages": pages}),
-                started_at=datetime.utcnow()
+            job = start_job(
+                db, job_id, user_id, "split", [file_id],
+                {"pages": pages}, resume=resume, total_pages=len(pages)
             )
-            db.add(job)
-            db.commit()
-            print(f"Created split job: {job.id}")
             
             start_time = time.time()
             
-            reader = PdfReader(document.file_path)
-            total_pages = len(reader.pages)
-            print(f"PDF has {total_pages} pages")
-            
-            # Validate page numbers
-            invalid_pages = [p for p in pages if p < 1 or p > total_pages]
-            if invalid_pages:
-                error_msg = f"Invalid page numbers: {invalid_pages}. PDF has {total_pages} pages."
-                print(error_msg)
-                raise HTTPException(status_code=400, detail=error_msg)
-            
             output_files = []
             output_paths = []
-            
-            for page_num in pages:
-                writer = PdfWriter()
-                writer.add_page(reader.pages[page_num - 1])  # Convert to 0-based index
-                
-                output_filename = f"split_{document.filename.replace('.pdf', '')}_page_{page_num}.pdf"
-                output_path = os.path.join(self.processed_dir, output_filename)
+            bytes_out = 0
+            
+            with ExitStack() as stack:
+                with stage_timer("split", "read"):
+                    source_path = stack.enter_context(self.storage.local_path(document.file_path))
+                    reader = stack.enter_context(self.documents.open(source_path))
+                    total_pages = self.engine.page_count(reader)
+                logger.debug(f"PDF has {total_pages} pages")
                 
-                with open(output_path, 'wb') as output_file:
-                    writer.write(output_file)
+                # Validate page numbers
+                invalid_pages = [p for p in pages if p < 1 or p > total_pages]
+                if invalid_pages:
+                    error_msg = f"Invalid page numbers: {invalid_pages}. PDF has {total_pages} pages."
+                    logger.warning(error_msg)
+                    raise HTTPException(status_code=400, detail=error_msg)
                 
-                output_files.append(output_filename)
-                output_paths.append(output_path)
-                print(f"Extracted page {page_num} to {output_filename}")
+                for page_num in pages:
+                    page_start_time = time.time()
+                    output_filename = f"split_{document.filename.replace('.pdf', '')}_page_{page_num}.pdf"
+                    output_path = job_output_key(job.id, output_filename)
+                    
+                    with stage_timer("split", "write"), self.storage.output_path(output_path) as local_output:
+                        with self.engine.created() as writer:
+                            self.engine.append_pages(writer, reader, [page_num - 1])  # Convert to 0-based index
+                            self.engine.write(writer, local_output)
+                        bytes_out += os.path.getsize(local_output)
+                    
+                    output_files.append(output_filename)
+                    output_paths.append(output_path)
+                    logger.debug(f"Extracted page {page_num} to {output_filename}")
+                    progress_service.publish_page(job.id, page_num, time.time() - page_start_time, output_file=output_filename)
+                    heartbeat_job(db, job)
             
             processing_time = time.time() - start_time
-            print(f"Split completed in {processing_time:.2f} seconds")
+            logger.info(f"Split completed in {processing_time:.2f} seconds")
+            observe_operation(
+                "split", processing_time, pages=len(pages), bytes_in=document.file_size, bytes_out=bytes_out
+            )
             
-            # Update job status
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.processing_time = processing_time
-            job.output_files = json.dumps(output_paths)
-            db.commit()
+            complete_job(db, job, processing_time, output_paths)
             
             return {
                 "success": True,
                 "message": f"Successfully split PDF into {len(output_files)} files",
                 "output_files": output_files,
                 "output_paths": output_paths,  # Add full paths for the endpoint to use
-                "download_urls": [f"/processed/{f}" for f in output_files],
+                "download_urls": [f"/jobs/{job.id}/files/{f}" for f in output_files],
                 "total_pages": len(pages),
                 "processing_time": round(processing_time, 2),
                 "job_id": job.id
@@ -219,26 +218,21 @@ class PDFService:
             
         except HTTPException as he:
             if job:
-                job.status = "failed"
-                job.error_message = str(he.detail)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(he.detail))
             raise
         except Exception as e:
-            print(f"Error splitting PDF: {str(e)}")
+            logger.error(f"Error splitting PDF: {str(e)}")
             if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(e))
             
             raise HTTPException(status_code=500, detail=f"Error splitting PDF: {str(e)}")
 
-    async def compress_pdf(self, file_id: str, quality: int, user_id: str, db: Session):
+    def compress_pdf(self, file_id: str, quality: int, user_id: str, db: Session, job_id: Optional[str] = None,
+                           resume: bool = False):
         """Compress PDF file"""
         job = None
         try:
-            print(f"Starting PDF compression for file {file_id} with quality {quality}")
+            logger.info(f"Starting PDF compression for file {file_id} with quality {quality}")
             
             document = db.query(PDFDocument).filter(
                 PDFDocument.id == file_id,
@@ -248,78 +242,66 @@ class PDFService:
             if not document:
                 raise HTTPException(status_code=404, detail="File not found")
             
-            if not os.path.exists(document.file_path):
+            if not self.storage.exists(document.file_path):
                 raise HTTPException(status_code=404, detail="File not found on disk")
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="compress",
-                status="processing",
-                input_files=json.dumps([file_id]),
-                parameters=json.dumps({"quality": quality}),
-                started_at=datetime.utcnow()
-            )
-            db.add(job)
-            db.commit()
-            print(f"Created compression job: {job.id}")
+            job = start_job(db, job_id, user_id, "compress", [file_id], {"quality": quality}, resume=resume)
             
             start_time = time.time()
-            original_size = os.path.getsize(document.file_path)
-            print(f"Original file size: {original_size} bytes")
-            
-            reader = PdfReader(document.file_path)
-            writer = PdfWriter()
-            
-            # Add all pages to writer
-            page_count = len(reader.pages)
-            print(f"Processing {page_count} pages")
-            
-            for i, page in enumerate(reader.pages, 1):
-                writer.add_page(page)
-                if i % 10 == 0:
-                    print(f"Processed {i}/{page_count} pages")
-            
             # Set compression level based on quality (0-100)
-            # Convert quality (0-100) to compression level (0-9, where 0 is no compression)
-            compression_level = min(9, max(0, 9 - int(quality / 12)))  # Map 0-100 to 9-1
-            print(f"Applying compression level: {compression_level}")
-            
-            # Add compression to all pages
-            for page in writer.pages:
-                # This is a simple way to ensure the page content is compressed
-                # The actual compression happens during writer.write()
-                pass
+            compression_level = self.compression_level(quality)
+            logger.debug(f"Applying compression level: {compression_level}")
             
             output_filename = f"compressed_{document.filename}"
-            output_path = os.path.join(self.processed_dir, output_filename)
-            
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
+            output_path = job_output_key(job.id, output_filename)
+            
+            with ExitStack() as stack:
+                with stage_timer("compress", "read"):
+                    source_path = stack.enter_context(self.storage.local_path(document.file_path))
+                    reader = stack.enter_context(self.documents.open(source_path))
+                original_size = os.path.getsize(source_path)
+                logger.debug(f"Original file size: {original_size} bytes")
+                writer = stack.enter_context(self.engine.created())
+                
+                # Add all pages to writer
+                page_count = self.engine.page_count(reader)
+                logger.debug(f"Processing {page_count} pages")
+                progress_service.set_total(job.id, page_count)
+                
+                for i in range(page_count):
+                    page_start_time = time.time()
+                    self.engine.append_pages(writer, reader, [i])
+                    if (i + 1) % 10 == 0:
+                        logger.debug(f"Processed {i + 1}/{page_count} pages")
+                    progress_service.publish_page(job.id, i + 1, time.time() - page_start_time)
+                    heartbeat_job(db, job)
+                
+                # Content streams are recompressed as the document is written
+                with stage_timer("compress", "write"), self.storage.output_path(output_path) as local_output:
+                    self.engine.write(writer, local_output, compression_level=compression_level)
+                    compressed_size = os.path.getsize(local_output)
             
             # Calculate compression ratio
-            compressed_size = os.path.getsize(output_path)
             compression_ratio = ((original_size - compressed_size) / original_size) * 100 if original_size > 0 else 0
             
             processing_time = time.time() - start_time
             
-            print(f"Compressed file size: {compressed_size} bytes")
-            print(f"Compression ratio: {compression_ratio:.2f}%")
-            print(f"Compression completed in {processing_time:.2f} seconds")
+            logger.debug(f"Compressed file size: {compressed_size} bytes")
+            logger.debug(f"Compression ratio: {compression_ratio:.2f}%")
+            logger.info(f"Compression completed in {processing_time:.2f} seconds")
+            observe_operation(
+                "compress", processing_time, pages=page_count,
+                bytes_in=original_size, bytes_out=compressed_size
+            )
             
-            # Update job status
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.processing_time = processing_time
-            job.output_files = json.dumps([output_path])
-            db.commit()
+            complete_job(db, job, processing_time, [output_path])
             
             return {
                 "success": True,
                 "message": "PDF compressed successfully",
                 "output_file": output_filename,
-                "download_url": f"/processed/{output_filename}",
+                "output_path": output_path,
+                "download_url": f"/jobs/{job.id}/files/{output_filename}",
                 "original_size": original_size,
                 "compressed_size": compressed_size,
                 "compression_ratio": round(compression_ratio, 2),
@@ -328,28 +310,28 @@ class PDFService:
                 "job_id": job.id
             }
             
-        except HTTPException:
+        except HTTPException as he:
+            if job:
+                fail_job(db, job, str(he.detail))
             raise
         except Exception as e:
-            print(f"Error compressing PDF: {str(e)}")
+            logger.error(f"Error compressing PDF: {str(e)}")
             if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(e))
             
             raise HTTPException(status_code=500, detail=f"Error compressing PDF: {str(e)}")
 
-    async def convert_to_images(self, file_id: str, format: str, user_id: str, db: Session):
+    def convert_to_images(self, file_id: str, format: str, user_id: str, db: Session, job_id: Optional[str] = None,
+                                dpi: int = 200, resume: bool = False):
         """Convert PDF pages to images"""
         job = None
         try:
-            print(f"Starting PDF to image conversion for file {file_id}, format: {format}")
+            logger.info(f"Starting PDF to image conversion for file {file_id}, format: {format}")
             
-            # Check if poppler is available
-            if not shutil.which('pdftoppm'):
-                error_msg = "Poppler is not installed or not in PATH. Please install Poppler from: https://github.com/oschwartz10612/poppler-windows/releases/"
-                print(error_msg)
+            # Check if the rasterizer is available
+            if not self.rasterizer.available():
+                error_msg = f"The {self.rasterizer.name} rasterizer is not available. {self.rasterizer.setup_hint}".rstrip()
+                logger.error(error_msg)
                 raise HTTPException(status_code=500, detail=error_msg)
             
             document = db.query(PDFDocument).filter(
@@ -360,7 +342,7 @@ class PDFService:
             if not document:
                 raise HTTPException(status_code=404, detail="File not found")
             
-            if not os.path.exists(document.file_path):
+            if not self.storage.exists(document.file_path):
                 raise HTTPException(status_code=404, detail="File not found on disk")
             
             # Validate format
@@ -371,74 +353,93 @@ class PDFService:
                     detail=f"Invalid format '{format}'. Supported formats: {', '.join(valid_formats)}"
                 )
             
-            # Create processing job
-            job = ProcessingJob(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                job_type="convert",
-                status="processing",
-                input_files=json.dumps([file_id]),
-                parameters=json.dumps({"format": format}),
-                started_at=datetime.utcnow()
-            )
-            db.add(job)
-            db.commit()
-            print(f"Created conversion job: {job.id}")
+            job = start_job(db, job_id, user_id, "convert", [file_id], {"format": format, "dpi": dpi}, resume=resume)
             
             start_time = time.time()
             
             # Convert PDF to images
-            print(f"Converting PDF to images with 200 DPI...")
-            try:
-                images = convert_from_path(document.file_path, dpi=200)
-                print(f"Successfully converted PDF to {len(images)} images")
-            except Exception as e:
-                error_msg = f"Error converting PDF to images: {str(e)}. Make sure Poppler is installed and in PATH."
-                print(error_msg)
-                raise HTTPException(status_code=500, detail=error_msg)
-            
-            output_files = []
-            output_paths = []
-            total_size = 0
+            logger.debug(f"Converting PDF to images with {dpi} DPI using {self.rasterizer.name}...")
+            # Rasterizers need a real file; remote storage hands out a spilled copy
+            with self.storage.local_path(document.file_path) as source_path:
+                try:
+                    page_count = self.rasterizer.page_count(source_path)
+                    progress_service.set_total(job.id, page_count)
+                except Exception as e:
+                    error_msg = f"Error converting PDF to images with {self.rasterizer.name}: {str(e)}. {self.rasterizer.setup_hint}".rstrip()
+                    logger.error(error_msg)
+                    raise HTTPException(status_code=500, detail=error_msg)
+            
+                output_files = []
+                output_paths = []
+                total_size = 0
             
-            for i, image in enumerate(images, 1):
-                output_filename = f"page_{i}_{document.filename.replace('.pdf', '')}.{format}"
-                output_path = os.path.join(self.processed_dir, output_filename)
-                
                 # Save image with appropriate format
                 save_format = 'JPEG' if format.lower() in ['jpg', 'jpeg'] else format.upper()
+            
+                # Pages rendered before in another document (or an earlier version of this one) are copied
+                with stage_timer("convert", "fingerprint"):
+                    page_keys = self.page_reuse.page_keys(
+                        source_path, format=save_format, dpi=dpi, rasterizer=self.rasterizer.name
+                    )
+                    earlier = self.page_reuse.renders(db, user_id, page_keys)
+                reused = {n for n, key in page_keys.items() if key in earlier}
+                if reused:
+                    logger.info(f"Job {job.id}: reusing {len(reused)}/{page_count} pages rendered in earlier jobs")
+            
+                # Pages are rendered lazily so only one is held in memory at a time
+                images = timed_iter(
+                    self.rasterizer.render_pages(source_path, dpi, [n for n in range(1, page_count + 1) if n not in reused]),
+                    "convert", "rasterize"
+                )
+                page_start_time = time.time()
+                for i in range(1, page_count + 1):
+                    output_filename = f"page_{i}_{document.filename.replace('.pdf', '')}.{format}"
+                    output_path = job_output_key(job.id, output_filename)
+                    record_cache("page_render", i in reused)
                 
-                # For JPEG, convert RGBA to RGB if necessary
-                if save_format == 'JPEG' and image.mode == 'RGBA':
-                    rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                    rgb_image.paste(image, mask=image.split()[3])
-                    rgb_image.save(output_path, save_format, quality=95)
-                else:
-                    image.save(output_path, save_format)
+                    with self.storage.output_path(output_path) as local_output:
+                        if i in reused:
+                            with self.storage.local_path(earlier[page_keys[i]]) as earlier_path:
+                                shutil.copyfile(earlier_path, local_output)
+                        else:
+                            _, image = next(images)
+                            # For JPEG, convert RGBA to RGB if necessary
+                            with stage_timer("convert", "encode"):
+                                if save_format == 'JPEG' and image.mode == 'RGBA':
+                                    rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+                                    rgb_image.paste(image, mask=image.split()[3])
+                                    rgb_image.save(local_output, save_format, quality=95)
+                                else:
+                                    image.save(local_output, save_format)
+                        file_size = os.path.getsize(local_output)
+                    if i in page_keys:
+                        self.page_reuse.record_render(db, user_id, job.id, page_keys[i], output_path)
                 
-                file_size = os.path.getsize(output_path)
-                total_size += file_size
+                    total_size += file_size
                 
-                output_files.append(output_filename)
-                output_paths.append(output_path)
-                print(f"Saved page {i}/{len(images)}: {output_filename} ({file_size} bytes)")
+                    output_files.append(output_filename)
+                    output_paths.append(output_path)
+                    logger.debug(f"Saved page {i}/{page_count}: {output_filename} ({file_size} bytes)")
+                    progress_service.publish_page(job.id, i, time.time() - page_start_time, output_file=output_filename)
+                    heartbeat_job(db, job)
+                    page_start_time = time.time()
             
             processing_time = time.time() - start_time
-            print(f"Conversion completed in {processing_time:.2f} seconds")
-            print(f"Total output size: {total_size} bytes")
+            logger.info(f"Conversion completed in {processing_time:.2f} seconds")
+            logger.info(f"Total output size: {total_size} bytes")
+            observe_operation(
+                "convert", processing_time, pages=len(output_files),
+                bytes_in=document.file_size, bytes_out=total_size
+            )
             
-            # Update job status
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.processing_time = processing_time
-            job.output_files = json.dumps(output_paths)
-            db.commit()
+            complete_job(db, job, processing_time, output_paths)
             
             return {
                 "success": True,
                 "message": f"PDF converted to {len(output_files)} {format.upper()} images",
                 "output_files": output_files,
-                "download_urls": [f"/processed/{f}" for f in output_files],
+                "output_paths": output_paths,
+                "download_urls": [f"/jobs/{job.id}/files/{f}" for f in output_files],
                 "total_pages": len(output_files),
                 "format": format.upper(),
                 "total_size": total_size,
@@ -446,14 +447,13 @@ class PDFService:
                 "job_id": job.id
             }
             
-        except HTTPException:
+        except HTTPException as he:
+            if job:
+                fail_job(db, job, str(he.detail))
             raise
         except Exception as e:
-            print(f"Error converting PDF to images: {str(e)}")
+            logger.error(f"Error converting PDF to images: {str(e)}")
             if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
+                fail_job(db, job, str(e))
             
             raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,249 @@
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from decouple import config
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from services.storage_service import storage
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_FORMATS = {"folded": "profile.folded", "json": "profile.json"}
+# Inside the job's directory but out of reach of GET /jobs/{job_id}/files/{filename}
+PROFILE_DIR = ".profile"
+DEFAULT_ROUTES = "/pdf/merge,/pdf/split,/pdf/compress,/pdf/convert,/ocr/extract-text,/ocr/searchable-pdf"
+MAX_SPANS = 2000  # spans kept in profile.json; stage totals always cover all of them
+
+_active: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+def current_profile() -> Optional["ProfileSession"]:
+    """The profile of the request or job running in this context, if it is being profiled"""
+    return _active.get()
+
+
+def attach_job(job_id: str):
+    """Store the running profile next to ``job_id`` (called when a job row is created)"""
+    session = _active.get()
+    if session is not None and session.job_id is None:
+        session.job_id = job_id
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """Stack samples and stage spans of one request or job.
+
+    A background thread samples the stacks of the threads registered with
+    the session every ``interval`` seconds: the event loop thread the
+    request started on, plus any thread while it is inside a
+    ``stage_timer``. Samples of an idle event loop are dropped. The loop
+    thread also runs other requests, so their frames can show up under
+    concurrent load.
+    """
+
+    def __init__(self, label: str, interval: float, max_seconds: float, job_id: Optional[str] = None):
+        self.label = label
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.job_id = job_id
+        self.started_at = datetime.utcnow()
+        self.seconds = 0.0
+        self.samples: Counter = Counter()
+        self.stages: Dict[str, List[float]] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.token = None  # ContextVar token while the session is active
+
+    def enter_thread(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def leave_thread(self):
+        with self._lock:
+            ident = threading.get_ident()
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def span(self, operation: str, stage: str, started: float, seconds: float):
+        with self._lock:
+            totals = self.stages.setdefault(f"{operation}/{stage}", [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append({
+                    "operation": operation,
+                    "stage": stage,
+                    "thread": threading.current_thread().name,
+                    "start_ms": round((started - self._started) * 1000, 2),
+                    "ms": round(seconds * 1000, 2),
+                })
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._started
+        self._stopped.set()
+        if self._sampler:
+            self._sampler.join()
+
+    def _sample(self):
+        deadline = self._started + self.max_seconds
+        while not self._stopped.wait(self.interval) and time.perf_counter() < deadline:
+            with self._lock:
+                idents = list(self._threads)
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None or frame.f_code.co_filename.endswith("selectors.py"):
+                    continue  # gone, or an event loop waiting for I/O
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Samples in the folded-stack format read by flamegraph.pl, speedscope and inferno"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "job_id": self.job_id,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(self.seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "stages": [
+                {"stage": name, "calls": calls, "seconds": round(seconds, 4)}
+                for name, (calls, seconds) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+            ],
+            "spans": self.spans,
+        }
+
+
+class ProfilingService:
+    """Opt-in profiling of individual requests and queue jobs.
+
+    A request to one of ``PROFILE_ROUTES`` is profiled when it carries an
+    ``X-Profile: 1`` header from a user listed in ``PROFILE_ADMINS``, or at
+    random with probability ``PROFILE_SAMPLE_RATE`` (queue jobs as well).
+    Profiles are stored in the job's output directory, so they expire with
+    its artifacts, and only ``PROFILE_ADMINS`` can download them.
+    """
+
+    def __init__(self):
+        self.admins = {name.strip() for name in config("PROFILE_ADMINS", default="").split(",") if name.strip()}
+        self.sample_rate = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+        self.interval = config("PROFILE_INTERVAL_MS", default=5, cast=float) / 1000
+        self.max_seconds = config("PROFILE_MAX_SECONDS", default=600, cast=float)
+        self.routes = tuple(route.strip() for route in config("PROFILE_ROUTES", default=DEFAULT_ROUTES).split(",") if route.strip())
+
+    def is_admin(self, username: Optional[str]) -> bool:
+        return username is not None and username in self.admins
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, label: str, job_id: Optional[str] = None) -> ProfileSession:
+        """Start profiling the current thread and everything run in this context"""
+        session = ProfileSession(label, self.interval, self.max_seconds, job_id)
+        session.token = _active.set(session)
+        session.enter_thread()
+        session.start()
+        return session
+
+    def end(self, session: ProfileSession):
+        session.stop()
+        session.leave_thread()
+        _active.reset(session.token)
+
+    def save(self, session: ProfileSession) -> bool:
+        """Store a finished profile next to its job; profiles of requests that created no job are only logged"""
+        stages = ", ".join(f"{stage['stage']} {stage['seconds']:.3f}s" for stage in session.summary()["stages"])
+        logger.info(f"Profiled {session.label} in {session.seconds:.3f}s: {stages or 'no stages'}")
+        if session.job_id is None:
+            return False
+        for content, profile_format in ((session.folded(), "folded"), (json.dumps(session.summary(), indent=2), "json")):
+            with storage.output_path(self.profile_path(session.job_id, profile_format)) as path:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+        return True
+
+    @staticmethod
+    def profile_path(job_id: str, profile_format: str) -> str:
+        # Imported here: metrics imports this module, and artifact_service imports metrics
+        from services.artifact_service import PROCESSED_DIR
+
+        return os.path.join(PROCESSED_DIR, job_id, PROFILE_DIR, PROFILE_FORMATS[profile_format])
+
+
+class ProfilingMiddleware:
+    """Profile sampled or admin-requested calls to the expensive routes.
+
+    Profiled responses carry ``X-Profile-Id``: the job the profile was
+    stored with, for ``GET /admin/profiles/{job_id}``.
+    """
+
+    def __init__(self, app: ASGIApp, service: Callable[[], ProfilingService],
+                 username: Callable[[str], Optional[str]]):
+        self.app = app
+        self.service = service
+        self.username = username  # bearer token -> username, without a database lookup
+
+    def _requested(self, service: ProfilingService, headers: Headers) -> bool:
+        if headers.get(PROFILE_HEADER, "") not in ("1", "true"):
+            return False
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and service.is_admin(self.username(token))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        service = self.service()
+        if not scope["path"].endswith(service.routes) or not (
+            self._requested(service, Headers(scope=scope)) or service.sampled()
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        session = service.begin(f"{scope['method']} {scope['path']}")
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start" and session.job_id:
+                MutableHeaders(scope=message).append("X-Profile-Id", session.job_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            service.end(session)
+            try:
+                await asyncio.to_thread(service.save, session)
+            except Exception as e:
+                logger.warning(f"Could not store the profile of {session.label}: {e}")
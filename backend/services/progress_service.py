@@ -0,0 +1,272 @@
+from fastapi import HTTPException, status
+from decouple import config
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import threading
+import time
+
+
+class JobCancelled(BaseException):
+    """Raised in a job's thread at its next page after ``ProgressService.cancel``.
+
+    Like ``asyncio.CancelledError`` it is not an ``Exception``, so the
+    services' error handlers do not record the job as failed.
+    """
+
+
+class _JobChannel:
+    """Progress state and event history for a single processing job"""
+
+    def __init__(self, job_id: str, user_id: Optional[str]):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.operation: Optional[str] = None
+        self.total_pages = 0
+        self.pages_done = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.reserved_at = time.time()
+        self.cancelled: Optional[str] = None
+        self.history: List[Dict[str, Any]] = []
+        self.subscribers: List[tuple] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+
+class ProgressService:
+    """In-process broker for job progress events.
+
+    Services publish structured events from their page loops; HTTP clients
+    subscribe through SSE or a WebSocket. Events are kept for a while after a
+    job finishes so that late subscribers still receive the full history.
+
+    A client may subscribe to a job id before submitting the request that
+    uses it. Such a reservation lasts ``PROGRESS_RESERVATION_SECONDS``, after
+    which the stream ends with an ``error`` event, and a user can hold at
+    most ``PROGRESS_MAX_RESERVATIONS`` at once.
+    """
+
+    def __init__(self, retention_seconds: int = 300, history_limit: int = 2000,
+                 reservation_seconds: float = None, max_reservations: int = None):
+        self.retention_seconds = retention_seconds
+        self.history_limit = history_limit
+        if reservation_seconds is None:
+            reservation_seconds = config("PROGRESS_RESERVATION_SECONDS", default=30, cast=float)
+        if max_reservations is None:
+            max_reservations = config("PROGRESS_MAX_RESERVATIONS", default=10, cast=int)
+        self.reservation_seconds = reservation_seconds
+        self.max_reservations = max_reservations
+        self._channels: Dict[str, _JobChannel] = {}
+        self._lock = threading.Lock()
+
+    def _purge_expired(self):
+        now = time.time()
+        for job_id, channel in list(self._channels.items()):
+            if channel.finished:
+                expired = now - channel.finished_at > self.retention_seconds
+            else:
+                # Reserved by a subscriber but the job never started
+                expired = channel.started_at is None and now - channel.reserved_at > self.reservation_seconds
+            if expired and not channel.subscribers:
+                del self._channels[job_id]
+
+    def _reservation_expired(self, channel: _JobChannel) -> bool:
+        return channel.started_at is None and time.time() - channel.reserved_at > self.reservation_seconds
+
+    def _publish(self, channel: _JobChannel, event: Dict[str, Any]):
+        event = {"job_id": channel.job_id, "operation": channel.operation, "timestamp": time.time(), **event}
+        channel.history.append(event)
+        if len(channel.history) > self.history_limit:
+            # Keep the start event so replays always know the page total
+            channel.history = channel.history[:1] + channel.history[-(self.history_limit - 1):]
+        for loop, queue in list(channel.subscribers):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def start(self, job_id: str, user_id: str, operation: str, total_pages: int = 0):
+        """Register a job and emit its ``started`` event"""
+        with self._lock:
+            self._purge_expired()
+            channel = self._channels.get(job_id)
+            if channel and (channel.started_at is not None or channel.user_id not in (None, user_id)):
+                raise HTTPException(status_code=409, detail=f"Job id {job_id} is already in use")
+            if not channel:
+                channel = _JobChannel(job_id, user_id)
+                self._channels[job_id] = channel
+            channel.user_id = user_id
+            channel.operation = operation
+            channel.total_pages = total_pages
+            channel.started_at = time.time()
+            self._publish(channel, {"event": "started", "total_pages": total_pages})
+
+    def set_total(self, job_id: str, total_pages: int):
+        """Update the page total once it is known (e.g. after rasterizing)"""
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel:
+                channel.total_pages = total_pages
+
+    def publish_page(self, job_id: str, page: int, page_time: float, **extra):
+        """Record a completed page; ``extra`` carries partial results such as OCR text.
+
+        Raises ``JobCancelled`` instead once the job was cancelled.
+        """
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if not channel or channel.finished:
+                return
+            reason = channel.cancelled
+            if reason is None:
+                self._publish_page(channel, page, page_time, extra)
+        if reason is not None:
+            self.fail(job_id, reason)
+            raise JobCancelled(reason)
+
+    def _publish_page(self, channel: _JobChannel, page: int, page_time: float, extra: Dict[str, Any]):
+        channel.pages_done += 1
+        elapsed = time.time() - channel.started_at
+        remaining = max(channel.total_pages - channel.pages_done, 0)
+        eta = (elapsed / channel.pages_done) * remaining if channel.total_pages else None
+        self._publish(channel, {
+            "event": "page",
+            "page": page,
+            "pages_done": channel.pages_done,
+            "total_pages": channel.total_pages,
+            "page_time": round(page_time, 4),
+            "elapsed": round(elapsed, 4),
+            "eta": round(eta, 2) if eta is not None else None,
+            **extra
+        })
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """Ask a running job to stop at its next page; ``reason`` becomes its ``failed`` event.
+
+        Jobs run in threads that cannot be interrupted, so this is
+        cooperative. Returns whether the job was still running here.
+        """
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if not channel or channel.started_at is None or channel.finished:
+                return False
+            channel.cancelled = reason
+            return True
+
+    def running(self) -> List[str]:
+        """Ids of the jobs started in this process that have not finished"""
+        with self._lock:
+            return [job_id for job_id, channel in self._channels.items()
+                    if channel.started_at is not None and not channel.finished]
+
+    def complete(self, job_id: str, **extra):
+        self._finish(job_id, {"event": "completed", **extra})
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, {"event": "failed", "error": error})
+
+    def _finish(self, job_id: str, event: Dict[str, Any]):
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if not channel or channel.finished:
+                return
+            channel.finished_at = time.time()
+            event.setdefault("pages_done", channel.pages_done)
+            event.setdefault("total_pages", channel.total_pages)
+            event["elapsed"] = round(channel.finished_at - (channel.started_at or channel.finished_at), 4)
+            self._publish(channel, event)
+
+    def reserve(self, job_id: str, user_id: str):
+        """Check that ``user_id`` may subscribe to ``job_id``, reserving the id when no job uses it yet.
+
+        Raises 404 for another user's job and 429 when the user already
+        holds ``max_reservations`` unused reservations.
+        """
+        with self._lock:
+            self._purge_expired()
+            channel = self._channels.get(job_id)
+            if channel:
+                if channel.user_id not in (None, user_id):
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+                return
+            reserved = sum(1 for c in self._channels.values() if c.user_id == user_id and c.started_at is None)
+            if reserved >= self.max_reservations:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"Too many subscriptions to jobs that have not started (limit {self.max_reservations})"
+                )
+            self._channels[job_id] = _JobChannel(job_id, user_id)
+
+    def has_channel(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._channels
+
+    async def subscribe(self, job_id: str, user_id: str,
+                        keepalive: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the event history of a job followed by live events until it finishes.
+
+        Subscribing to an unknown job id reserves it for ``user_id`` so that a
+        client can connect before submitting the request that uses that id;
+        call ``reserve`` first to apply the reservation limit. If no job starts
+        within ``reservation_seconds`` an ``error`` event ends the stream.
+        When ``keepalive`` is set, ``None`` is yielded after that many idle seconds.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (loop, queue)
+
+        with self._lock:
+            self._purge_expired()
+            channel = self._channels.get(job_id)
+            if channel and channel.user_id not in (None, user_id):
+                raise HTTPException(status_code=404, detail="Job not found")
+            if not channel:
+                channel = _JobChannel(job_id, user_id)
+                self._channels[job_id] = channel
+            backlog = list(channel.history)
+            finished = channel.finished
+            if not finished:
+                channel.subscribers.append(subscriber)
+
+        try:
+            for event in backlog:
+                yield event
+            if finished:
+                return
+            while True:
+                timeout = keepalive
+                if channel.started_at is None:
+                    remaining = channel.reserved_at + self.reservation_seconds - time.time()
+                    if remaining <= 0:
+                        yield {
+                            "job_id": job_id, "operation": None, "timestamp": time.time(),
+                            "event": "error", "error": "No job with this id was started"
+                        }
+                        return
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    if not self._reservation_expired(channel):
+                        yield None
+                    continue
+                yield event
+                if event["event"] in ("completed", "failed"):
+                    return
+        finally:
+            with self._lock:
+                if subscriber in channel.subscribers:
+                    channel.subscribers.remove(subscriber)
+                if self._reservation_expired(channel) and not channel.subscribers:
+                    self._channels.pop(job_id, None)
+
+    async def sse_stream(self, job_id: str, user_id: str, keepalive: float = 15.0) -> AsyncIterator[str]:
+        """Format the event stream of a job as Server-Sent Events"""
+        async for event in self.subscribe(job_id, user_id, keepalive=keepalive):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+progress_service = ProgressService()
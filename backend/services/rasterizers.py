@@ -0,0 +1,142 @@
+from decouple import config
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+from typing import Iterable, Iterator, Optional, Tuple
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Rasterizer:
+    """Renders PDF pages to PIL images, one page at a time.
+
+    ``render`` is a generator so callers only ever hold the page they are
+    working on instead of every page of the document.
+    """
+
+    name = "base"
+    # Appended to errors, which may come from a missing or broken installation
+    setup_hint = ""
+
+    def available(self) -> bool:
+        return True
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError
+
+    def render(self, file_path: str, dpi: int, grayscale: bool = False,
+               first_page: Optional[int] = None, last_page: Optional[int] = None) -> Iterator[Image.Image]:
+        """Yield pages ``first_page``..``last_page`` (1-based, inclusive) at ``dpi``"""
+        raise NotImplementedError
+
+    def render_pages(self, file_path: str, dpi: int, pages: Iterable[int],
+                     grayscale: bool = False) -> Iterator[Tuple[int, Image.Image]]:
+        """Yield ``(page_number, image)`` for a subset of pages, one ``render`` per run of consecutive pages"""
+        pages = sorted(pages)
+        start = 0
+        while start < len(pages):
+            end = start
+            while end + 1 < len(pages) and pages[end + 1] == pages[end] + 1:
+                end += 1
+            yield from enumerate(self.render(file_path, dpi, grayscale, pages[start], pages[end]), pages[start])
+            start = end + 1
+
+
+class PopplerRasterizer(Rasterizer):
+    """``pdftoppm`` through pdf2image.
+
+    One ``pdftoppm`` process renders the whole range into a temp directory and
+    the files are loaded and deleted one by one as the caller consumes them.
+    """
+
+    name = "poppler"
+    setup_hint = (
+        "Make sure Poppler is installed and in PATH "
+        "(Windows builds: https://github.com/oschwartz10612/poppler-windows/releases/)."
+    )
+
+    def available(self) -> bool:
+        return shutil.which("pdftoppm") is not None
+
+    def page_count(self, file_path: str) -> int:
+        return int(pdfinfo_from_path(file_path)["Pages"])
+
+    def render(self, file_path: str, dpi: int, grayscale: bool = False,
+               first_page: Optional[int] = None, last_page: Optional[int] = None) -> Iterator[Image.Image]:
+        with tempfile.TemporaryDirectory(prefix="raster_") as output_folder:
+            paths = convert_from_path(
+                file_path, dpi=dpi, grayscale=grayscale, first_page=first_page, last_page=last_page,
+                output_folder=output_folder, paths_only=True, fmt="ppm"
+            )
+            for path in paths:
+                with Image.open(path) as image:
+                    image.load()
+                    page = image.copy()
+                os.remove(path)
+                yield page
+
+
+class PdfiumRasterizer(Rasterizer):
+    """In-process rendering with PDFium (pypdfium2).
+
+    Pages are rendered straight into a memory bitmap in the requested
+    colorspace, with no subprocess or temp files.
+    """
+
+    name = "pdfium"
+
+    # PDFium is not thread safe; serialise calls into it across the process
+    _lock = threading.Lock()
+
+    def __init__(self):
+        import pypdfium2
+
+        self._pdfium = pypdfium2
+
+    def page_count(self, file_path: str) -> int:
+        with self._lock:
+            pdf = self._pdfium.PdfDocument(file_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def render(self, file_path: str, dpi: int, grayscale: bool = False,
+               first_page: Optional[int] = None, last_page: Optional[int] = None) -> Iterator[Image.Image]:
+        with self._lock:
+            pdf = self._pdfium.PdfDocument(file_path)
+        try:
+            first = (first_page or 1) - 1
+            last = min(last_page or len(pdf), len(pdf))
+            for index in range(first, last):
+                with self._lock:
+                    page = pdf[index]
+                    try:
+                        bitmap = page.render(scale=dpi / 72, grayscale=grayscale)
+                        image = bitmap.to_pil()
+                    finally:
+                        page.close()
+                yield image
+        finally:
+            with self._lock:
+                pdf.close()
+
+
+def get_rasterizer(name: str = None) -> Rasterizer:
+    """Return the configured rasterizer (``RASTER_BACKEND``: auto, pdfium or poppler).
+
+    ``auto`` uses PDFium when pypdfium2 is installed and falls back to poppler.
+    """
+    name = name or config("RASTER_BACKEND", default="auto")
+    if name in ("auto", "pdfium"):
+        try:
+            return PdfiumRasterizer()
+        except ImportError:
+            if name == "pdfium":
+                raise
+            logger.info("pypdfium2 not installed, rasterizing with poppler")
+    return PopplerRasterizer()
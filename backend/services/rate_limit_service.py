@@ -0,0 +1,164 @@
+from fastapi import HTTPException, status
+from decouple import config
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-user bucket defaults: (capacity, refill per second) in cost units.
+# One cost unit is one page at 100 DPI, so a 10 page OCR at 300 DPI costs 30.
+DEFAULT_LIMITS = {
+    "upload": (30, 0.5),
+    "merge": (500, 5),
+    "split": (500, 5),
+    "compress": (500, 5),
+    "convert": (400, 2),
+    "ocr": (600, 2),
+    "searchable_pdf": (300, 1),
+}
+
+# Nominal DPI used to weight operations that do not rasterize
+BASE_DPI = 100
+
+Bucket = Tuple[str, float, float]  # key, capacity, refill per second
+
+
+class MemoryBucketStore:
+    """Token buckets held in process memory (single worker deployments)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    async def take(self, buckets: List[Bucket], cost: float) -> float:
+        """Take ``cost`` from every bucket, or from none; return seconds to wait (0 if allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+
+            retry_after = max(
+                ((cost - tokens) / rate for tokens, (_, _, rate) in zip(levels, buckets) if tokens < cost),
+                default=0.0
+            )
+            for tokens, (key, capacity, rate) in zip(levels, buckets):
+                self._buckets[key] = (tokens - cost if not retry_after else tokens, now)
+            return retry_after
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers through Redis"""
+
+    # Checks every bucket and only debits them if all have enough tokens,
+    # using the Redis clock so that workers with skewed clocks agree
+    SCRIPT = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local levels = {}
+    local retry_after = 0
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local rate = tonumber(ARGV[i * 2 + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - ts) * rate)
+        levels[i] = tokens
+        if tokens < cost then
+            retry_after = math.max(retry_after, (cost - tokens) / rate)
+        end
+    end
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local rate = tonumber(ARGV[i * 2 + 1])
+        local tokens = levels[i]
+        if retry_after == 0 then
+            tokens = tokens - cost
+        end
+        redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+    end
+    return tostring(retry_after)
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "pdfgenie:ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self.client = redis.from_url(redis_url)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    async def take(self, buckets: List[Bucket], cost: float) -> float:
+        keys = [self.prefix + key for key, _, _ in buckets]
+        args = [cost]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        return float(await self._script(keys=keys, args=args))
+
+
+class RateLimitService:
+    """Per-user and global token bucket limits per operation type.
+
+    Requests are weighted by their estimated cost so that a 300 DPI OCR of a
+    long document uses up far more of the budget than a one page split.
+    """
+
+    def __init__(self, store=None):
+        self.enabled = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+        self.global_factor = config("RATE_LIMIT_GLOBAL_FACTOR", default=10, cast=float)
+        self.limits = {
+            operation: self._parse_limit(config(f"RATE_LIMIT_{operation.upper()}", default=""), default)
+            for operation, default in DEFAULT_LIMITS.items()
+        }
+
+        if store is not None:
+            self.store = store
+        elif config("RATE_LIMIT_BACKEND", default="memory") == "redis":
+            self.store = RedisBucketStore(config("REDIS_URL", default="redis://localhost:6379"))
+        else:
+            self.store = MemoryBucketStore()
+
+    @staticmethod
+    def _parse_limit(value: str, default: Tuple[float, float]) -> Tuple[float, float]:
+        """Parse ``"capacity,refill_per_second"``"""
+        if not value:
+            return default
+        try:
+            capacity, rate = (float(part) for part in value.split(","))
+            return capacity, rate
+        except ValueError:
+            logger.warning(f"Ignoring malformed rate limit '{value}', using {default}")
+            return default
+
+    @staticmethod
+    def estimate_cost(pages: Optional[int], dpi: Optional[int] = None) -> float:
+        """Cost in page-at-100-DPI units (pages x DPI)"""
+        return max(pages or 1, 1) * (dpi or BASE_DPI) / BASE_DPI
+
+    async def check(self, user_id: str, operation: str, cost: float = 1.0):
+        """Debit the user's and the global bucket, or raise 429 with ``Retry-After``"""
+        if not self.enabled or operation not in self.limits:
+            return
+
+        capacity, rate = self.limits[operation]
+        # A request larger than the bucket would never fit; let it through once the bucket is full
+        cost = min(cost, capacity)
+        buckets = [
+            (f"user:{user_id}:{operation}", capacity, rate),
+            (f"global:{operation}", capacity * self.global_factor, rate * self.global_factor),
+        ]
+
+        retry_after = await self.store.take(buckets, cost)
+        if retry_after > 0:
+            retry_seconds = max(1, math.ceil(retry_after))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for {operation}. Retry in {retry_seconds} seconds.",
+                headers={"Retry-After": str(retry_seconds)}
+            )
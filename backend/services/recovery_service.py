@@ -0,0 +1,227 @@
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+from decouple import config
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+
+from models import PDFDocument, ProcessingJob
+from services.progress_service import JobCancelled, progress_service
+from services.rate_limit_service import RateLimitService
+from services.scheduler_service import FairShareScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class JobRecovery:
+    """Finds jobs left in ``processing`` by a worker that died and resumes or fails them.
+
+    A job is stale once its heartbeat (or start, for jobs that never got to
+    one) is older than ``JOB_STALE_SECONDS``; running jobs refresh it from
+    their page loops, whichever process runs them. OCR text extraction is
+    checkpointed per page and resumes from the last completed page; other
+    jobs are short and are marked failed so clients can retry them. Jobs
+    are claimed with a conditional update, so several workers starting at
+    once resume each job only once.
+
+    Reconciliation runs on startup and every ``JOB_RECOVERY_INTERVAL_SECONDS``
+    (half the stale age by default), so jobs interrupted by a redeploy are
+    picked up by the processes that are still running. On shutdown,
+    ``hand_back`` stops the jobs of this process and leaves them to another.
+    """
+
+    def __init__(self, ocr_service, scheduler: FairShareScheduler):
+        self.ocr_service = ocr_service
+        self.scheduler = scheduler
+        # Must exceed the longest page (or document, for merges) between two heartbeats
+        self.stale_after = timedelta(seconds=config("JOB_STALE_SECONDS", default=600, cast=int))
+        self.max_attempts = config("JOB_MAX_ATTEMPTS", default=3, cast=int)
+        # 0: on startup only
+        self.interval = config("JOB_RECOVERY_INTERVAL_SECONDS", default=self.stale_after.total_seconds() / 2, cast=float)
+        self.shutdown_grace = config("JOB_SHUTDOWN_GRACE", default=10.0, cast=float)
+        self._task: Optional[asyncio.Task] = None
+        self._resumes: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _resumable(job: ProcessingJob) -> bool:
+        parameters = json.loads(job.parameters or "{}")
+        return job.job_type == "ocr" and parameters.get("operation") == "extract_text"
+
+    def _claim(self, db: Session, job: ProcessingJob, cutoff: datetime) -> bool:
+        """Take over ``job`` unless another worker got to it first"""
+        claimed = db.execute(
+            update(ProcessingJob)
+            .where(
+                ProcessingJob.id == job.id,
+                ProcessingJob.status == "processing",
+                func.coalesce(ProcessingJob.heartbeat_at, ProcessingJob.started_at) < cutoff
+            )
+            .values(heartbeat_at=datetime.utcnow(), attempts=func.coalesce(ProcessingJob.attempts, 0) + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.commit()
+        return claimed
+
+    @staticmethod
+    def _fail(db: Session, job: ProcessingJob, reason: str):
+        job.status = "failed"
+        job.error_message = reason
+        job.completed_at = datetime.utcnow()
+        db.commit()
+
+    def reconcile(self, db: Session) -> Dict[str, List[str]]:
+        """Claim stale jobs; fail those that cannot be resumed and return the rest"""
+        cutoff = datetime.utcnow() - self.stale_after
+        stale = db.query(ProcessingJob).filter(
+            ProcessingJob.status == "processing",
+            # Queued jobs are reclaimed by the queue workers once their lease expires
+            ProcessingJob.lease_expires_at.is_(None),
+            or_(
+                ProcessingJob.heartbeat_at < cutoff,
+                ProcessingJob.heartbeat_at.is_(None) & (ProcessingJob.started_at < cutoff)
+            )
+        ).all()
+
+        outcome: Dict[str, List[str]] = {"resume": [], "failed": []}
+        for job in stale:
+            # Still running in this worker (e.g. a single very slow page)
+            if progress_service.has_channel(job.id) or not self._claim(db, job, cutoff):
+                continue
+            db.refresh(job)
+            if not self._resumable(job):
+                self._fail(db, job, "Interrupted by a worker restart; please retry")
+                outcome["failed"].append(job.id)
+            elif job.attempts > self.max_attempts:
+                self._fail(db, job, f"Gave up after {self.max_attempts} resumed attempts")
+                outcome["failed"].append(job.id)
+            else:
+                outcome["resume"].append(job.id)
+
+        if stale:
+            logger.info(
+                f"Recovered {len(outcome['resume'])} stale jobs to resume, "
+                f"failed {len(outcome['failed'])} that cannot be resumed"
+            )
+        return outcome
+
+    @staticmethod
+    def _with_session(fn, *args):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _resume_cost(db: Session, job_id: str):
+        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+        parameters = json.loads(job.parameters or "{}")
+        document = db.query(PDFDocument).filter(PDFDocument.id == json.loads(job.input_files)[0]).first()
+        return job.user_id, RateLimitService.estimate_cost(
+            document.pages_count if document else None, parameters.get("dpi", 300)
+        )
+
+    def _run_resumed(self, db: Session, job_id: str):
+        """Resume a claimed job from its last checkpoint; blocks, so run it in a worker thread"""
+        try:
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            parameters = json.loads(job.parameters or "{}")
+            self.ocr_service.extract_text_from_pdf(
+                json.loads(job.input_files)[0], parameters.get("language", "eng"), job.user_id, db,
+                job_id=job.id, dpi=parameters.get("dpi", 300), resume=True
+            )
+            logger.info(f"Resumed job {job_id} completed")
+        except Exception:
+            logger.exception(f"Resuming job {job_id} failed")
+            db.rollback()
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            if job and job.status == "processing":
+                self._fail(db, job, "Failed while resuming after a worker restart")
+
+    async def _resume(self, job_id: str):
+        try:
+            user_id, cost = await asyncio.to_thread(self._with_session, self._resume_cost, job_id)
+        except Exception:
+            logger.exception(f"Could not plan the resumption of job {job_id}")
+            return
+        try:
+            await self.scheduler.run(user_id, cost, self._with_session, self._run_resumed, job_id)
+        except JobCancelled:
+            logger.info(f"Resumed job {job_id} was interrupted by a shutdown")
+
+    async def recover(self) -> Dict[str, List[str]]:
+        """Run one reconciliation pass and resume the claimed jobs in the background"""
+        outcome = await asyncio.to_thread(self._with_session, self.reconcile)
+        loop = asyncio.get_running_loop()
+        for job_id in outcome["resume"]:
+            task = loop.create_task(self._resume(job_id))
+            self._resumes.add(task)
+            task.add_done_callback(self._resumes.discard)
+        return outcome
+
+    async def _run(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Job recovery failed")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Reconcile stale jobs on the running event loop (and periodically if configured)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        for task in [self._task, *self._resumes]:
+            if task:
+                task.cancel()
+        for task in [self._task, *self._resumes]:
+            if task:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+
+    def _release_interrupted(self, db: Session, job_ids: List[str]) -> List[str]:
+        jobs = db.query(ProcessingJob).filter(
+            ProcessingJob.id.in_(job_ids),
+            ProcessingJob.status == "processing",
+            ProcessingJob.lease_expires_at.is_(None)
+        ).all()
+        interrupted = [job.id for job in jobs]
+        for job in jobs:
+            if self._resumable(job):
+                # Stale at once, so the next reconciliation in any process resumes it
+                job.heartbeat_at = datetime.utcnow() - self.stale_after
+                db.commit()
+            else:
+                self._fail(db, job, "Interrupted by a shutdown; please retry")
+        return interrupted
+
+    async def hand_back(self) -> List[str]:
+        """Stop the jobs still running in this process; called on shutdown.
+
+        Jobs run in threads and stop at their next page. Once they have (or
+        after ``JOB_SHUTDOWN_GRACE`` seconds), resumable OCR extraction is
+        marked stale for another process to resume and other jobs are marked
+        failed so clients can retry them. Returns the interrupted job ids.
+        """
+        job_ids = [
+            job_id for job_id in progress_service.running()
+            if progress_service.cancel(job_id, "Interrupted by a shutdown; please retry")
+        ]
+        if not job_ids:
+            return []
+        if not await self.scheduler.drain(self.shutdown_grace):
+            logger.warning(f"Jobs still running {self.shutdown_grace}s after shutdown began")
+        interrupted = await asyncio.to_thread(self._with_session, self._release_interrupted, job_ids)
+        logger.info(f"Handed back {len(interrupted)} jobs interrupted by the shutdown")
+        return interrupted
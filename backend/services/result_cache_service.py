@@ -0,0 +1,197 @@
+from sqlalchemy.orm import Session
+from decouple import config
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from models import PDFDocument, ProcessingJob, ResultCacheEntry
+from services.progress_service import progress_service
+from services.storage_service import storage
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(file_path: str, mtime_ns: int, size: int) -> str:
+    """sha256 of a file's content (memoised per file version)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digest(file_path: str) -> str:
+    stat = os.stat(file_path)
+    return _file_digest(os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _file_signature(key: str) -> List:
+    return [key, storage.digest(key)]
+
+
+def _unchanged(signature: List) -> bool:
+    """Whether an output still exists in storage with the content it had when the result was stored.
+
+    Compares the digests storage records when it writes an object, so an
+    output rewritten in place with the same length is caught as well, and
+    every instance sharing a bucket can serve results another instance
+    produced. Entries from before digests were recorded (ending in a size)
+    count as changed and are computed again.
+    """
+    key, digest = signature[0], signature[-1]
+    return isinstance(digest, str) and storage.digest(key) == digest
+
+
+class ResultCacheService:
+    """Reuses results of identical operations and coalesces concurrent ones.
+
+    Results are keyed by operation, the content hashes of the inputs and the
+    normalized parameters, scoped per user. A cached result is only served
+    while its job is completed and every output is still in storage,
+    with the content it had when the result was stored.
+    Identical requests that arrive while the first one is running wait for
+    it instead of starting their own computation (single-flight).
+
+    Hashing inputs and the cache queries run in a thread with a session of
+    their own, so a first request for a large upload does not stall the loop.
+    """
+
+    def __init__(self):
+        self.enabled = config("RESULT_CACHE_ENABLED", default=True, cast=bool)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def make_key(self, db: Session, user_id: str, operation: str, file_ids: List[str],
+                 parameters: Dict[str, Any]) -> Optional[str]:
+        """Cache key for the request, or None if an input is missing (the operation reports it)"""
+        documents = {
+            doc.id: doc for doc in db.query(PDFDocument).filter(
+                PDFDocument.id.in_(file_ids),
+                PDFDocument.user_id == user_id
+            ).all()
+        }
+        try:
+            digests = []
+            for file_id in file_ids:
+                with storage.local_path(documents[file_id].file_path) as local_path:
+                    digests.append(file_digest(local_path))
+        except (KeyError, OSError):
+            return None
+
+        payload = json.dumps({
+            "user": user_id,
+            "operation": operation,
+            "inputs": digests,
+            "parameters": parameters,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, db: Session, key: str) -> Optional[Dict[str, Any]]:
+        entry = db.query(ResultCacheEntry).filter(ResultCacheEntry.key == key).first()
+        if not entry:
+            return None
+
+        job = db.query(ProcessingJob).filter(ProcessingJob.id == entry.job_id).first()
+        if not job or job.status != "completed" or not all(_unchanged(s) for s in json.loads(entry.output_paths)):
+            # Outputs were cleaned up or replaced; compute again
+            db.delete(entry)
+            db.commit()
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        db.commit()
+        return json.loads(entry.result)
+
+    def store(self, db: Session, key: str, user_id: str, operation: str, result: Dict[str, Any],
+              output_paths: List[str]):
+        entry = db.query(ResultCacheEntry).filter(ResultCacheEntry.key == key).first() or ResultCacheEntry(key=key)
+        entry.user_id = user_id
+        entry.operation = operation
+        entry.job_id = result["job_id"]
+        entry.result = json.dumps(result)
+        entry.output_paths = json.dumps([_file_signature(path) for path in output_paths])
+        entry.created_at = datetime.utcnow()
+        db.merge(entry)
+        db.commit()
+
+    @staticmethod
+    def _with_session(fn, *args):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _announce(job_id: Optional[str], user_id: str, operation: str, output_paths: List[str]):
+        """Complete the caller's progress channel for a result it did not compute itself"""
+        if job_id:
+            progress_service.start(job_id, user_id, operation)
+            progress_service.complete(job_id, output_files=[os.path.basename(p) for p in output_paths], cached=True)
+
+    async def run(self, user_id: str, operation: str, file_ids: List[str],
+                  parameters: Dict[str, Any], compute: Callable[[], Awaitable[Dict[str, Any]]],
+                  outputs: Callable[[Dict[str, Any]], List[str]],
+                  job_id: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Return ``(result, cached)``, running ``compute`` only if no identical result exists.
+
+        ``outputs`` maps a result to the files it refers to, which must still
+        exist for the result to be reused.
+        """
+        key = await asyncio.to_thread(
+            self._with_session, self.make_key, user_id, operation, file_ids, parameters
+        ) if self.enabled else None
+        if key is None:
+            return await compute(), False
+
+        result = await asyncio.to_thread(self._with_session, self.lookup, key)
+        if result is not None:
+            record_cache("result", True)
+            logger.info(f"Serving cached {operation} result from job {result.get('job_id')}")
+            self._announce(job_id, user_id, operation, outputs(result))
+            return result, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            record_cache("result", True)
+            logger.info(f"Waiting for identical in-flight {operation}")
+            try:
+                result = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request doing the work was cancelled, not this one; take over
+                return await self.run(user_id, operation, file_ids, parameters, compute, outputs, job_id)
+            self._announce(job_id, user_id, operation, outputs(result))
+            return result, True
+
+        record_cache("result", False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+            try:
+                await asyncio.to_thread(self._with_session, self.store, key, user_id, operation, result, outputs(result))
+            except Exception as e:
+                logger.warning(f"Could not cache {operation} result: {e}")
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved so it is not reported when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
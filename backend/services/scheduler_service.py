@@ -0,0 +1,133 @@
+from decouple import config
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Set
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+
+from metrics import EXECUTOR_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    __slots__ = ("seq", "cost", "future")
+
+    def __init__(self, seq: int, cost: float, future: asyncio.Future):
+        self.seq = seq
+        self.cost = cost
+        self.future = future
+
+
+class FairShareScheduler:
+    """Admission gate for CPU-heavy jobs with start-time fair queuing across users.
+
+    At most ``max_concurrent`` heavy jobs run at once. When a slot frees up it
+    goes to the waiting user with the least accumulated cost, so a user who
+    submits many large jobs cannot starve users with one small job queued.
+    Admitted jobs run in a thread pool with one thread per slot, off the
+    event loop.
+    """
+
+    def __init__(self, max_concurrent: int = None, name: str = "heavy"):
+        self.max_concurrent = max_concurrent or config("HEAVY_JOB_CONCURRENCY", default=2, cast=int)
+        self.name = name
+        self._running = 0
+        self._waiting: Dict[str, Deque[_Waiter]] = {}
+        # Virtual finish tag per user and the start tag of the last granted job
+        self._usage: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix=f"{name}-job")
+        self._calls: Set[asyncio.Future] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def _update_gauge(self):
+        EXECUTOR_QUEUE_DEPTH.labels(self.name).set(self.queue_depth)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent and self._waiting:
+            user_id = min(
+                self._waiting,
+                key=lambda user: (max(self._usage.get(user, 0.0), self._virtual_time), self._waiting[user][0].seq)
+            )
+            queue = self._waiting[user_id]
+            waiter = queue.popleft()
+            if not queue:
+                del self._waiting[user_id]
+            start_tag = max(self._usage.get(user_id, 0.0), self._virtual_time)
+            self._usage[user_id] = start_tag + waiter.cost
+            self._virtual_time = start_tag
+            self._running += 1
+            waiter.future.set_result(None)
+
+        # Users whose tags fell behind the virtual clock have no credit to keep
+        for user_id in [u for u, usage in self._usage.items() if usage <= self._virtual_time and u not in self._waiting]:
+            del self._usage[user_id]
+        self._update_gauge()
+
+    async def acquire(self, user_id: str, cost: float = 1.0):
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(next(self._seq), cost, future)
+        self._waiting.setdefault(user_id, deque()).append(waiter)
+        self._dispatch()
+        if not future.done():
+            logger.debug(f"Job for user {user_id} queued (cost {cost:.1f}, queue depth {self.queue_depth})")
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as the request was cancelled
+                self.release()
+            else:
+                queue = self._waiting.get(user_id)
+                if queue and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._waiting[user_id]
+                self._update_gauge()
+            raise
+
+    def release(self):
+        self._running -= 1
+        self._dispatch()
+
+    def _finished(self, future: asyncio.Future):
+        self._calls.discard(future)
+        self.release()
+        if not future.cancelled():
+            future.exception()  # Retrieved here in case the caller stopped waiting
+
+    async def run(self, user_id: str, cost: float, fn: Callable, *args, **kwargs):
+        """Wait for a heavy-job slot, then call ``fn(*args, **kwargs)`` in the pool.
+
+        The slot is held until ``fn`` returns, even if the caller is cancelled
+        first, because the thread cannot be interrupted. The call runs in a
+        copy of the caller's context so profiling follows it into the thread.
+        """
+        await self.acquire(user_id, cost)
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except BaseException:
+            self.release()
+            raise
+        self._calls.add(future)
+        future.add_done_callback(self._finished)
+        return await asyncio.shield(future)
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the running calls; return whether they all finished"""
+        if self._calls:
+            await asyncio.wait(set(self._calls), timeout=timeout)
+        return not self._calls
+
+    def shutdown(self):
+        """Drop jobs that were admitted but have not started; running ones finish"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,468 @@
+from decouple import config
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+import atexit
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_stream(stream: BinaryIO, path: str) -> Tuple[int, str]:
+    """Copy ``stream`` to ``path`` in chunks and return the bytes written and their sha256"""
+    size = 0
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            f.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Storage:
+    """Where uploads and job outputs live.
+
+    Objects are addressed by keys that look like the relative paths used so
+    far (``uploads/<id>_<name>``, ``processed/<job_id>/<file>``), so keys
+    stored in ``PDFDocument.file_path`` and ``ProcessingJob.output_files``
+    work unchanged with the local backend.
+    """
+
+    name = "storage"
+
+    def put(self, key: str, stream: BinaryIO) -> int:
+        """Store the contents of ``stream`` under ``key`` and return its size"""
+        raise NotImplementedError
+
+    @contextmanager
+    def output_path(self, key: str):
+        """Yield a local path to write a new object (a job output) to; it is stored under ``key`` when the block exits"""
+        raise NotImplementedError
+        yield
+
+    def get(self, key: str) -> Iterator[bytes]:
+        """Stream the object in chunks"""
+        raise NotImplementedError
+
+    @contextmanager
+    def local_path(self, key: str):
+        """Yield a local file path with the object's contents for the duration of the block"""
+        raise NotImplementedError
+        yield
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> Optional[int]:
+        """Size of the object in bytes, or None when it does not exist"""
+        raise NotImplementedError
+
+    def digest(self, key: str) -> Optional[str]:
+        """Content digest recorded when the object was stored, or None when it does not exist"""
+        raise NotImplementedError
+
+    def url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        """Presigned download URL, or None when the API serves the file itself"""
+        return None
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    """Files on the local disk, relative to ``STORAGE_ROOT``.
+
+    The sha256 of each file is recorded next to it (``.<name>.sha256``) when
+    it is written, with the size and mtime it was taken at, so every
+    process sharing the directory reports the same digest without reading
+    the file again.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = None):
+        self.root = os.path.abspath(root or config("STORAGE_ROOT", default="."))
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Storage key escapes the storage root: {key}")
+        return path
+
+    def _digest_path(self, path: str) -> str:
+        directory, name = os.path.split(path)
+        return os.path.join(directory, f".{name}.sha256")
+
+    def _record_digest(self, path: str, digest: str):
+        stat = os.stat(path)
+        with open(self._digest_path(path), "w") as f:
+            f.write(f"{digest} {stat.st_size} {stat.st_mtime_ns}")
+
+    def put(self, key: str, stream: BinaryIO) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial file
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            size, digest = _copy_stream(stream, partial)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        self._record_digest(path, digest)
+        return size
+
+    @contextmanager
+    def output_path(self, key: str):
+        # Written in place: outputs get new keys, so nobody reads them before the job reports them
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            yield path
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self._record_digest(path, _file_digest(path))
+
+    def get(self, key: str) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    @contextmanager
+    def local_path(self, key: str):
+        yield self._path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._path(key))
+        except OSError:
+            return None
+
+    def digest(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(self._digest_path(path)) as f:
+                digest, size, mtime_ns = f.read().split()
+            if int(size) == stat.st_size and int(mtime_ns) == stat.st_mtime_ns:
+                return digest
+        except (OSError, ValueError):
+            pass
+        # Stored before digests were recorded, or replaced outside the storage layer
+        digest = _file_digest(path)
+        self._record_digest(path, digest)
+        return digest
+
+    def delete(self, key: str):
+        path = self._path(key)
+        for name in (path, self._digest_path(path)):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def delete_prefix(self, prefix: str):
+        path = self._path(prefix)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class _Spilled:
+    __slots__ = ("path", "size", "leases", "evicted")
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.leases = 0
+        self.evicted = False
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill would terminate the process there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SpillCache:
+    """Bounded LRU of remote objects copied to local disk.
+
+    Services that need a real file (PDF engines, pdftoppm) lease a copy;
+    least recently used copies are deleted once the total size goes over
+    the budget. A copy that is still leased is deleted when released.
+
+    Each process keeps its copies in its own ``<pid>-<id>`` subdirectory of
+    ``directory``, removed at exit; on startup the subdirectories of
+    processes that are no longer running are removed.
+    """
+
+    def __init__(self, directory: str, budget_bytes: int):
+        self.root = directory
+        self.directory = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, _Spilled]" = OrderedDict()
+        self._used_bytes = 0
+        self._lock = threading.Lock()
+        self._remove_abandoned()
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(shutil.rmtree, self.directory, True)
+
+    def _remove_abandoned(self):
+        """Delete the copies of processes that died without cleaning up"""
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            pid = entry.name.split("-", 1)[0]
+            if entry.is_dir() and pid.isdigit() and not _process_alive(int(pid)):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def reserve_path(self) -> str:
+        return os.path.join(self.directory, uuid.uuid4().hex)
+
+    def _drop(self, key: str):
+        """Remove ``key`` from the index (lock held); delete it now if unused"""
+        entry = self._entries.pop(key)
+        self._used_bytes -= entry.size
+        entry.evicted = True
+        if entry.leases == 0:
+            os.remove(entry.path)
+
+    def _evict(self):
+        while self._entries and self._used_bytes > self.budget_bytes:
+            key = next(iter(self._entries))
+            logger.debug(f"Evicting spilled copy of {key}")
+            self._drop(key)
+
+    def add(self, key: str, path: str) -> _Spilled:
+        """Index a file already written under ``directory`` and lease it"""
+        entry = _Spilled(path, os.path.getsize(path))
+        entry.leases = 1
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if entry.size <= self.budget_bytes:
+                self._entries[key] = entry
+                self._used_bytes += entry.size
+                self._evict()
+            else:
+                entry.evicted = True
+        return entry
+
+    def acquire(self, key: str, fetch: Callable[[str], None]) -> _Spilled:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.leases += 1
+                return entry
+        # Download outside the lock; a concurrent miss on the same key just fetches twice
+        path = self.reserve_path()
+        try:
+            fetch(path)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return self.add(key, path)
+
+    def release(self, entry: _Spilled):
+        with self._lock:
+            entry.leases -= 1
+            if entry.evicted and entry.leases == 0:
+                os.remove(entry.path)
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "used_bytes": self._used_bytes, "budget_bytes": self.budget_bytes}
+
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO).
+
+    Uploads and job outputs are written to a spilled local copy and sent
+    with multipart transfers, so nothing is held in memory, the first
+    operation on a fresh upload does not download it again, and local
+    copies count against the spill budget. Downloads are redirected to
+    presigned URLs.
+    """
+
+    name = "s3"
+
+    def __init__(self):
+        self.bucket = config("S3_BUCKET")
+        self.url_expires = config("S3_PRESIGN_EXPIRES", default=900, cast=int)
+        self._client = None
+        self._spill: Optional[SpillCache] = None
+        self._lock = threading.Lock()
+
+    # Client and spill cache are built on first use, so importing the app
+    # opens no connections and does not touch the spill directory
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            from botocore.config import Config
+
+            with self._lock:
+                if self._client is None:
+                    self._client = boto3.client(
+                        "s3",
+                        endpoint_url=config("S3_ENDPOINT_URL", default=None),  # e.g. http://minio:9000
+                        region_name=config("S3_REGION", default=None),
+                        aws_access_key_id=config("S3_ACCESS_KEY", default=None),
+                        aws_secret_access_key=config("S3_SECRET_KEY", default=None),
+                        config=Config(signature_version="s3v4", s3={"addressing_style": config("S3_ADDRESSING_STYLE", default="auto")}),
+                    )
+        return self._client
+
+    @property
+    def spill(self) -> SpillCache:
+        if self._spill is None:
+            with self._lock:
+                if self._spill is None:
+                    self._spill = SpillCache(
+                        config("STORAGE_SPILL_DIR", default=os.path.join(tempfile.gettempdir(), "pdfgenie-spill")),
+                        config("STORAGE_SPILL_MB", default=1024, cast=int) * 1048576,
+                    )
+        return self._spill
+
+    def _upload(self, path: str, key: str, digest: str):
+        # Kept as object metadata, so every instance reads the same digest with a HEAD request
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={"Metadata": {"sha256": digest}})
+
+    def put(self, key: str, stream: BinaryIO) -> int:
+        path = self.spill.reserve_path()
+        try:
+            size, digest = _copy_stream(stream, path)
+            self._upload(path, key, digest)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self.spill.release(self.spill.add(key, path))
+        return size
+
+    @contextmanager
+    def output_path(self, key: str):
+        # Written into the spill cache, so the local copy counts against its budget like uploads do
+        path = self.spill.reserve_path()
+        try:
+            yield path
+            self._upload(path, key, _file_digest(path))
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self.spill.release(self.spill.add(key, path))
+
+    def get(self, key: str) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+
+    @contextmanager
+    def local_path(self, key: str):
+        entry = self.spill.acquire(key, lambda path: self.client.download_file(self.bucket, key, path))
+        try:
+            yield entry.path
+        finally:
+            self.spill.release(entry)
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def size(self, key: str) -> Optional[int]:
+        head = self._head(key)
+        return head["ContentLength"] if head else None
+
+    def digest(self, key: str) -> Optional[str]:
+        head = self._head(key)
+        if not head:
+            return None
+        # Objects stored before digests were recorded fall back to the store's own ETag
+        return head.get("Metadata", {}).get("sha256") or head["ETag"].strip('"')
+
+    def url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.url_expires)
+
+    def delete(self, key: str):
+        self.spill.discard(key)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_prefix(self, prefix: str):
+        prefix = prefix.rstrip("/") + "/"
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+
+
+def get_storage(name: str = None) -> Storage:
+    """Return the storage backend selected by ``STORAGE_BACKEND`` (local or s3)"""
+    name = name or config("STORAGE_BACKEND", default="local")
+    if name == "s3":
+        return S3Storage()
+    if name == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+# Shared so every service leases from the same spill cache
+storage = get_storage()
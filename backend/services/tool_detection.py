@@ -0,0 +1,51 @@
+from functools import lru_cache
+from typing import Any, Dict
+import logging
+import re
+import shutil
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def poppler() -> Dict[str, Any]:
+    """Location and version of poppler's ``pdftoppm``, probed once per process"""
+    path = shutil.which("pdftoppm")
+    if not path:
+        logger.warning("Poppler not found in PATH. PDF to image conversion will fail without PDFium.")
+        logger.warning("Install from: https://github.com/oschwartz10612/poppler-windows/releases/")
+        return {"available": False, "path": None, "version": None}
+
+    version = None
+    try:
+        # pdftoppm prints its version to stderr
+        result = subprocess.run([path, "-v"], capture_output=True, text=True, timeout=10)
+        match = re.search(r"version ([\d.]+)", result.stderr + result.stdout)
+        version = match.group(1) if match else None
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not read the poppler version: {e}")
+    logger.info(f"Poppler {version or '(unknown version)'} found at: {path}")
+    return {"available": True, "path": path, "version": version}
+
+
+@lru_cache(maxsize=None)
+def tesseract(backend) -> Dict[str, Any]:
+    """Version and installed languages of Tesseract behind ``backend``, probed once per backend"""
+    try:
+        info = {"available": True, "backend": backend.name, "version": backend.version(),
+                "languages": sorted(backend.languages())}
+    except Exception as e:
+        logger.warning(f"Tesseract {backend.name} backend unavailable: {e}")
+        return {"available": False, "backend": backend.name, "error": str(e)}
+    logger.info(f"Tesseract {info['version']} ({backend.name}) with languages: {', '.join(info['languages'])}")
+    return info
+
+
+def detect_tools(ocr_backend, rasterizer) -> Dict[str, Any]:
+    """Probe the external tools in use, so the first requests do not pay for it"""
+    return {
+        "rasterizer": rasterizer.name,
+        "poppler": poppler() if rasterizer.name == "poppler" else None,
+        "tesseract": tesseract(ocr_backend),
+    }
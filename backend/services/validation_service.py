@@ -0,0 +1,161 @@
+from decouple import config
+from fastapi import HTTPException, status
+from typing import Any, BinaryIO, Dict, NoReturn, Optional
+import logging
+import os
+import re
+import tempfile
+
+from metrics import stage_timer
+from services.document_cache import DocumentCache
+from services.pdf_engines import PDFEncryptedError
+from services.storage_service import storage
+
+logger = logging.getLogger(__name__)
+
+# Readers accept the header this far into the file and %%EOF this close to its end
+HEADER_WINDOW = 1024
+TRAILER_WINDOW = 1024
+STARTXREF = re.compile(rb"startxref\s+(\d+)")
+XREF_SECTION = re.compile(rb"\s*(xref|\d+\s+\d+\s+obj)")  # a table, or the object holding an xref stream
+ENCRYPTED = "Encrypted PDFs are not supported; remove the password or encryption and upload again"
+
+
+def _reject(detail: str, status_code: int = status.HTTP_400_BAD_REQUEST) -> NoReturn:
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+class ValidationService:
+    """Structural checks of an upload before any job spends CPU on it.
+
+    ``check_stream`` reads only the first and last kilobyte of the upload:
+    size, ``%PDF-`` header, ``%%EOF`` marker and whether ``startxref`` points
+    at a cross-reference section. ``inspect`` then parses the stored file once
+    (warming the document cache) to check encryption, page count, page size
+    and the pixel size of embedded images, which is where decompression bombs
+    hide. A damaged cross-reference table is rebuilt when ``PDF_REPAIR`` is on.
+    Rejections are 400 for unreadable files and 413 for files over a limit.
+    """
+
+    def __init__(self, documents: DocumentCache):
+        self.documents = documents
+        self.engine = documents.engine
+        self.max_upload_bytes = config("PDF_MAX_UPLOAD_MB", default=200, cast=int) * 1048576
+        self.max_pages = config("PDF_MAX_PAGES", default=2000, cast=int)
+        self.max_page_inches = config("PDF_MAX_PAGE_INCHES", default=200, cast=float)
+        self.max_image_megapixels = config("PDF_MAX_IMAGE_MEGAPIXELS", default=150, cast=float)
+        self.repair = config("PDF_REPAIR", default=True, cast=bool)
+
+    @staticmethod
+    def _xref_problem(stream: BinaryIO, size: int, header_offset: int, tail: bytes) -> Optional[str]:
+        if b"%%EOF" not in tail:
+            return "no %%EOF marker, the file is probably truncated"
+        offsets = STARTXREF.findall(tail)
+        if not offsets:
+            return "no startxref"
+        offset = int(offsets[-1])
+        # Offsets count from the start of the file, or from the header for files with a junk prefix
+        for position in {offset, offset + header_offset}:
+            if position < size:
+                stream.seek(position)
+                if XREF_SECTION.match(stream.read(64)):
+                    return None
+        return f"startxref {offset} does not point at a cross-reference section"
+
+    def check_stream(self, stream: BinaryIO) -> bool:
+        """Check an upload before it is stored; return whether its cross-reference table needs rebuilding"""
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        if size == 0:
+            _reject("The file is empty")
+        if size > self.max_upload_bytes:
+            _reject(
+                f"The file is {size / 1048576:.0f} MB; the limit is {self.max_upload_bytes // 1048576} MB",
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        stream.seek(0)
+        header_offset = stream.read(HEADER_WINDOW).find(b"%PDF-")
+        if header_offset < 0:
+            _reject("Not a PDF file (no %PDF- header)")
+        stream.seek(max(0, size - TRAILER_WINDOW))
+        tail = stream.read()
+        if b"/Encrypt" in tail:  # trailer entry; xref stream dictionaries may sit further up, see inspect()
+            _reject(ENCRYPTED)
+        problem = self._xref_problem(stream, size, header_offset, tail)
+        stream.seek(0)
+
+        if problem and not self.repair:
+            _reject(f"The PDF is damaged: {problem}")
+        if problem:
+            logger.info(f"Upload needs its cross-reference table rebuilt: {problem}")
+        return problem is not None
+
+    def inspect(self, key: str, repair: bool = False) -> Dict[str, Any]:
+        """Check a stored upload against the limits, rebuilding its cross-reference table first when ``repair``.
+
+        Returns the page count and, when repaired, the new file size. A
+        rejected upload is deleted from storage.
+        """
+        try:
+            with stage_timer("upload", "validate"):
+                report = self._repair(key) if repair else {}
+                with storage.local_path(key) as local_path:
+                    try:
+                        with self.documents.open(local_path) as document:
+                            report["pages"] = self._check_document(document)
+                    except HTTPException:
+                        raise
+                    except PDFEncryptedError:
+                        _reject(ENCRYPTED)
+                    except Exception as e:
+                        logger.info(f"Rejected upload {key}: {e}")
+                        _reject("Could not read the PDF")
+                return report
+        except BaseException:
+            storage.delete(key)
+            raise
+
+    def _repair(self, key: str) -> Dict[str, Any]:
+        handle, repaired_path = tempfile.mkstemp(prefix="repair_", suffix=".pdf")
+        os.close(handle)
+        try:
+            with storage.local_path(key) as local_path:
+                try:
+                    self.engine.repair(local_path, repaired_path)
+                except Exception as e:
+                    logger.info(f"Could not repair upload {key}: {e}")
+                    _reject("The PDF is damaged beyond repair")
+            with open(repaired_path, "rb") as repaired:
+                file_size = storage.put(key, repaired)
+            logger.info(f"Rebuilt the cross-reference table of {key}")
+            return {"repaired": True, "file_size": file_size}
+        finally:
+            os.remove(repaired_path)
+
+    def _check_document(self, document: Any) -> int:
+        if self.engine.is_encrypted(document):
+            _reject(ENCRYPTED)
+
+        pages = self.engine.page_count(document)
+        if pages == 0:
+            _reject("The PDF has no pages")
+        if pages > self.max_pages:
+            _reject(f"The PDF has {pages} pages; the limit is {self.max_pages}", status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        for number, (width, height) in enumerate(self.engine.page_sizes(document), 1):
+            if max(width, height) > self.max_page_inches * 72:
+                _reject(
+                    f"Page {number} is {width / 72:.0f} x {height / 72:.0f} inches; "
+                    f"the limit is {self.max_page_inches:g} inches a side",
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+
+        for width, height in self.engine.image_sizes(document):
+            if width * height > self.max_image_megapixels * 1e6:
+                _reject(
+                    f"The PDF contains a {width} x {height} pixel image; "
+                    f"the limit is {self.max_image_megapixels:g} megapixels",
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+        return pages
@@ -0,0 +1,51 @@
+"""Shared fixtures. Run ``pytest`` from the ``backend`` directory."""
+import io
+import os
+import sys
+
+# The services import each other flat from backend/, as main.py does; point
+# the app's own engines at an in-memory database before anything imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite://"
+
+import pytest
+from reportlab.pdfgen import canvas
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import init_db
+from models import User
+
+
+def make_pdf(pages: int = 3) -> bytes:
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for number in range(pages):
+        pdf.drawString(72, 720, f"Page {number + 1}")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pdf_bytes() -> bytes:
+    return make_pdf()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A session on a fresh SQLite database with the app's schema"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    init_db(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def user(db) -> User:
+    user = User(id="user-1", username="alice", email="alice@example.com", password_hash="-")
+    db.add(user)
+    db.commit()
+    return user
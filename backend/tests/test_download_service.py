@@ -0,0 +1,126 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services.download_service import DownloadService, parse_range
+from services.storage_service import LocalStorage
+
+CONTENT = bytes(range(256)) * 4
+KEY = "processed/job-1/result.pdf"
+URL = f"/files/{KEY}"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    storage.put(KEY, io.BytesIO(CONTENT))
+    return storage
+
+
+def app_for(storage):
+    service = DownloadService(storage)
+    service.offload = "none"
+    app = FastAPI()
+
+    @app.api_route("/files/{name:path}", methods=["GET", "HEAD"])
+    def download(name: str, request: Request):
+        return service.response(request, name, "result.pdf", "application/pdf")
+
+    return app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, storage):
+    # Keys resolve under the storage root, not the working directory
+    monkeypatch.chdir(tmp_path)
+    return TestClient(app_for(storage))
+
+
+def test_full_download(client):
+    response = client.get(URL)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+
+def test_etag_is_the_same_on_every_instance(client, tmp_path, storage):
+    other = TestClient(app_for(LocalStorage(str(tmp_path / "storage"))))
+
+    assert other.get(URL).headers["etag"] == client.get(URL).headers["etag"]
+
+
+def test_etag_follows_the_content(client, storage):
+    etag = client.get(URL).headers["etag"]
+    storage.put(KEY, io.BytesIO(CONTENT[::-1]))
+
+    assert client.get(URL, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get(URL).headers["etag"]
+
+    assert client.get(URL, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(URL, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(URL, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_range_is_partial_content(client):
+    response = client.get(URL, headers={"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert response.content == CONTENT[10:20]
+
+
+def test_suffix_range(client):
+    response = client.get(URL, headers={"Range": "bytes=-5"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[-5:]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get(URL, headers={"Range": f"bytes={len(CONTENT)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_stale_if_range_sends_the_whole_file(client):
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_current_if_range_honours_the_range(client):
+    etag = client.get(URL).headers["etag"]
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+
+    assert response.status_code == 206
+
+
+def test_head_sends_headers_only(client):
+    response = client.head(URL)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.content == b""
+
+
+def test_missing_object(client):
+    assert client.get("/files/processed/job-1/other.pdf").status_code == 404
+
+
+@pytest.mark.parametrize("header", ["items=0-9", "bytes=0-1,5-6", "bytes=a-b"])
+def test_ignored_ranges(header):
+    assert parse_range(header, 100) is None
+
+
+def test_range_end_is_clamped_to_the_file():
+    assert parse_range("bytes=90-500", 100) == (90, 99)
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from models import ProcessingJob
+from services.job_queue import JobQueue, start_job
+from services.progress_service import progress_service
+
+
+@pytest.fixture
+def queue():
+    return JobQueue()
+
+
+def enqueue(db, queue, user, job_type="merge", priority=0, age=0):
+    job = queue.enqueue(db, user.id, job_type, ["file-1"], {}, priority=priority)
+    # Distinct creation times so the order within a priority is deterministic
+    job.created_at = datetime.utcnow() - timedelta(seconds=age)
+    db.commit()
+    return job.id
+
+
+def test_empty_queue(db, queue):
+    assert queue.claim(db, "worker-1") is None
+
+
+def test_enqueue_with_a_taken_id_is_a_conflict(db, queue, user):
+    job_id = enqueue(db, queue, user)
+
+    with pytest.raises(HTTPException) as error:
+        queue.enqueue(db, user.id, "merge", ["file-1"], {}, job_id=job_id)
+    assert error.value.status_code == 409
+    assert queue.depth(db) == 1
+
+
+def test_claims_highest_priority_then_oldest(db, queue, user):
+    newer = enqueue(db, queue, user, age=10)
+    older = enqueue(db, queue, user, age=20)
+    urgent = enqueue(db, queue, user, priority=5, age=0)
+
+    assert [queue.claim(db, "worker-1").id for _ in range(3)] == [urgent, older, newer]
+    assert queue.claim(db, "worker-1") is None
+    assert queue.depth(db) == 0
+
+
+def test_claim_filters_by_job_type(db, queue, user):
+    enqueue(db, queue, user, job_type="merge")
+    ocr = enqueue(db, queue, user, job_type="ocr")
+
+    assert queue.claim(db, "worker-1", job_types=["ocr"]).id == ocr
+    assert queue.claim(db, "worker-1", job_types=["ocr"]) is None
+
+
+def test_claim_leases_the_job(db, queue, user):
+    job_id = enqueue(db, queue, user)
+    job = queue.claim(db, "worker-1")
+
+    assert job.id == job_id
+    assert job.status == "processing"
+    assert job.worker_id == "worker-1"
+    assert job.attempts == 1
+    assert job.lease_expires_at > datetime.utcnow()
+
+
+def test_heartbeat_only_renews_the_owners_lease(db, queue, user):
+    job_id = enqueue(db, queue, user)
+    queue.claim(db, "worker-1")
+
+    assert queue.heartbeat(db, job_id, "worker-1") is True
+    assert queue.heartbeat(db, job_id, "worker-2") is False
+
+
+def expire(db, job_id):
+    db.query(ProcessingJob).filter(ProcessingJob.id == job_id).update(
+        {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+
+
+def test_live_lease_is_not_reclaimed(db, queue, user):
+    enqueue(db, queue, user)
+    queue.claim(db, "worker-1")
+
+    assert queue.claim(db, "worker-2") is None
+
+
+def test_expired_lease_is_reclaimed(db, queue, user):
+    job_id = enqueue(db, queue, user)
+    queue.claim(db, "worker-1")
+    expire(db, job_id)
+
+    job = queue.claim(db, "worker-2")
+    assert job.id == job_id
+    assert job.worker_id == "worker-2"
+    assert job.attempts == 2
+    # The first worker learns it lost the job on its next heartbeat
+    assert queue.heartbeat(db, job_id, "worker-1") is False
+    assert queue.heartbeat(db, job_id, "worker-2") is True
+
+
+def test_job_fails_after_max_attempts(db, queue, user):
+    queue.max_attempts = 2
+    job_id = enqueue(db, queue, user)
+    for worker in ("worker-1", "worker-2"):
+        assert queue.claim(db, worker).id == job_id
+        expire(db, job_id)
+
+    assert queue.claim(db, "worker-3") is None
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    db.refresh(job)
+    assert job.status == "failed"
+    assert "Gave up after 2 attempts" in job.error_message
+
+
+def test_release_requeues_without_counting_the_attempt(db, queue, user):
+    job_id = enqueue(db, queue, user)
+    queue.claim(db, "worker-1")
+    queue.release(db, job_id, "worker-1")
+
+    job = queue.claim(db, "worker-2")
+    assert job.id == job_id
+    assert job.attempts == 1
+
+
+def test_finish_releases_the_lease(db, queue, user):
+    job_id = enqueue(db, queue, user)
+    queue.claim(db, "worker-1")
+    queue.finish(db, job_id, "worker-1", "failed", "boom")
+
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    db.refresh(job)
+    assert (job.status, job.error_message, job.lease_expires_at) == ("failed", "boom", None)
+    assert queue.heartbeat(db, job_id, "worker-1") is False
+
+
+def test_start_job_with_a_taken_id_is_a_conflict(db, queue, user):
+    job_id = enqueue(db, queue, user)
+
+    with pytest.raises(HTTPException) as error:
+        start_job(db, job_id, user.id, "merge", ["file-1"], {})
+    assert error.value.status_code == 409
+    # The channel registered for the job is finished rather than left running
+    assert job_id not in progress_service.running()
+    assert progress_service._channels[job_id].history[-1]["event"] == "failed"
@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ProcessingJob
+from services.job_queue import heartbeat_job
+from services.progress_service import progress_service
+from services.recovery_service import JobRecovery
+from services.scheduler_service import FairShareScheduler
+
+
+@pytest.fixture
+def recovery():
+    recovery = JobRecovery(None, FairShareScheduler(1))
+    recovery.stale_after = timedelta(minutes=10)
+    recovery.max_attempts = 3
+    return recovery
+
+
+def processing_job(db, user, job_id, job_type="ocr", operation="extract_text", heartbeat_age=None,
+                   started_age=60, lease=False, attempts=1):
+    now = datetime.utcnow()
+    db.add(ProcessingJob(
+        id=job_id,
+        user_id=user.id,
+        job_type=job_type,
+        status="processing",
+        input_files=json.dumps(["file-1"]),
+        parameters=json.dumps({"operation": operation} if operation else {}),
+        started_at=now - timedelta(minutes=started_age),
+        heartbeat_at=now - timedelta(minutes=heartbeat_age) if heartbeat_age is not None else None,
+        lease_expires_at=now - timedelta(minutes=1) if lease else None,
+        attempts=attempts
+    ))
+    db.commit()
+
+
+def status_of(db, job_id):
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    db.refresh(job)
+    return job
+
+
+def test_stale_ocr_extraction_is_resumed(db, user, recovery):
+    processing_job(db, user, "ocr-job", heartbeat_age=30)
+
+    assert recovery.reconcile(db) == {"resume": ["ocr-job"], "failed": []}
+    job = status_of(db, "ocr-job")
+    assert job.status == "processing"
+    assert job.attempts == 2
+    # Claimed: a second pass (another worker) leaves it alone
+    assert recovery.reconcile(db) == {"resume": [], "failed": []}
+
+
+def test_stale_job_without_heartbeat_is_judged_by_its_start(db, user, recovery):
+    processing_job(db, user, "old", job_type="merge", operation=None, started_age=30)
+    processing_job(db, user, "young", job_type="merge", operation=None, started_age=1)
+
+    assert recovery.reconcile(db) == {"resume": [], "failed": ["old"]}
+    assert status_of(db, "young").status == "processing"
+
+
+def test_stale_job_that_cannot_resume_fails(db, user, recovery):
+    processing_job(db, user, "searchable", operation="searchable_pdf", heartbeat_age=30)
+
+    assert recovery.reconcile(db) == {"resume": [], "failed": ["searchable"]}
+    job = status_of(db, "searchable")
+    assert job.status == "failed"
+    assert "worker restart" in job.error_message
+
+
+def test_fresh_heartbeat_is_left_alone(db, user, recovery):
+    processing_job(db, user, "busy", heartbeat_age=1, started_age=60)
+
+    assert recovery.reconcile(db) == {"resume": [], "failed": []}
+
+
+def test_queued_jobs_are_left_to_the_queue(db, user, recovery):
+    processing_job(db, user, "queued", heartbeat_age=30, lease=True)
+
+    assert recovery.reconcile(db) == {"resume": [], "failed": []}
+    assert status_of(db, "queued").status == "processing"
+
+
+def test_jobs_running_in_this_process_are_skipped(db, user, recovery):
+    processing_job(db, user, "local", heartbeat_age=30)
+    progress_service.start("local", user.id, "extract_text")
+    try:
+        assert recovery.reconcile(db) == {"resume": [], "failed": []}
+    finally:
+        progress_service.complete("local")
+
+
+def test_gives_up_after_max_attempts(db, user, recovery):
+    processing_job(db, user, "flaky", heartbeat_age=30, attempts=3)
+
+    assert recovery.reconcile(db) == {"resume": [], "failed": ["flaky"]}
+    assert "Gave up after 3 resumed attempts" in status_of(db, "flaky").error_message
+
+
+def test_page_loops_keep_long_jobs_fresh(db, user, recovery):
+    processing_job(db, user, "convert", job_type="convert", operation=None, heartbeat_age=30)
+    job = status_of(db, "convert")
+
+    heartbeat_job(db, job)
+    assert recovery.reconcile(db) == {"resume": [], "failed": []}
+
+    # Written at most every JOB_HEARTBEAT_SECONDS
+    beat = job.heartbeat_at
+    heartbeat_job(db, job)
+    assert status_of(db, "convert").heartbeat_at == beat
@@ -0,0 +1,39 @@
+import io
+
+import pytest
+
+from services import result_cache_service
+from services.result_cache_service import _file_signature, _unchanged
+from services.storage_service import LocalStorage
+
+KEY = "processed/job-1/out.pdf"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(result_cache_service, "storage", storage)
+    storage.put(KEY, io.BytesIO(b"first output"))
+    return storage
+
+
+def test_unchanged_output(storage):
+    assert _unchanged(_file_signature(KEY))
+
+
+def test_output_rewritten_with_the_same_length(storage):
+    signature = _file_signature(KEY)
+    storage.put(KEY, io.BytesIO(b"other output"))
+
+    assert not _unchanged(signature)
+
+
+def test_deleted_output(storage):
+    signature = _file_signature(KEY)
+    storage.delete(KEY)
+
+    assert not _unchanged(signature)
+
+
+def test_entries_from_before_digests_are_recomputed(storage):
+    assert not _unchanged([KEY, storage.size(KEY)])
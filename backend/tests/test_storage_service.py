@@ -0,0 +1,162 @@
+import hashlib
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from services import storage_service
+from services.storage_service import LocalStorage, SpillCache
+
+
+@pytest.fixture
+def spill(tmp_path):
+    return SpillCache(str(tmp_path), budget_bytes=100)
+
+
+def writer(size):
+    def fetch(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+    return fetch
+
+
+def test_hit_does_not_fetch_again(spill):
+    first = spill.acquire("a", writer(10))
+    spill.release(first)
+
+    second = spill.acquire("a", lambda path: pytest.fail("fetched a cached object"))
+    assert second.path == first.path
+    spill.release(second)
+
+
+def test_unleased_copies_are_evicted_in_lru_order(spill):
+    a = spill.acquire("a", writer(40))
+    b = spill.acquire("b", writer(40))
+    spill.release(a)
+    spill.release(b)
+    spill.release(spill.acquire("a", writer(40)))  # "a" is now the most recently used
+
+    c = spill.acquire("c", writer(40))
+
+    assert os.path.exists(a.path)
+    assert not os.path.exists(b.path)
+    assert spill.stats()["used_bytes"] == 80
+    spill.release(c)
+
+
+def test_leased_copy_survives_eviction_until_released(spill):
+    a = spill.acquire("a", writer(60))
+    b = spill.acquire("b", writer(60))  # pushes "a" out of the index while it is in use
+
+    assert spill.stats() == {"entries": 1, "used_bytes": 60, "budget_bytes": 100}
+    assert os.path.exists(a.path)
+    spill.release(a)
+    assert not os.path.exists(a.path)
+    assert os.path.exists(b.path)
+    spill.release(b)
+
+
+def test_copy_larger_than_the_budget_is_deleted_on_release(spill):
+    big = spill.acquire("big", writer(150))
+
+    assert os.path.exists(big.path)
+    assert spill.stats()["entries"] == 0
+    spill.release(big)
+    assert not os.path.exists(big.path)
+
+
+def test_failed_fetch_leaves_no_file(spill):
+    def fetch(path):
+        writer(10)(path)
+        raise IOError("connection reset")
+
+    with pytest.raises(IOError):
+        spill.acquire("a", fetch)
+    assert os.listdir(spill.directory) == []
+
+
+def test_discard(spill):
+    entry = spill.acquire("a", writer(10))
+    spill.release(entry)
+    spill.discard("a")
+
+    assert not os.path.exists(entry.path)
+    assert spill.stats()["entries"] == 0
+
+
+def test_each_process_gets_its_own_directory(tmp_path):
+    first, second = SpillCache(str(tmp_path), 100), SpillCache(str(tmp_path), 100)
+
+    assert first.directory != second.directory
+    assert os.path.basename(first.directory).startswith(f"{os.getpid()}-")
+
+
+def test_directories_of_dead_processes_are_removed(tmp_path):
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    abandoned = tmp_path / f"{child.pid}-deadbeef"
+    abandoned.mkdir()
+    (abandoned / "copy").write_bytes(b"x")
+    live = tmp_path / f"{os.getpid()}-cafef00d"
+    live.mkdir()
+
+    SpillCache(str(tmp_path), 100)
+
+    assert not abandoned.exists()
+    assert live.exists()
+
+
+def test_outputs_are_written_under_the_storage_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage(str(tmp_path / "root"))
+
+    with storage.output_path("processed/job-1/out.pdf") as path:
+        with open(path, "wb") as f:
+            f.write(b"%PDF-")
+
+    assert (tmp_path / "root" / "processed" / "job-1" / "out.pdf").read_bytes() == b"%PDF-"
+    assert not (tmp_path / "processed").exists()
+    assert storage.size("processed/job-1/out.pdf") == 5
+
+
+def test_failed_output_is_not_stored(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        with storage.output_path("processed/job-1/out.pdf") as path:
+            with open(path, "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError("engine failed")
+    assert not storage.exists("processed/job-1/out.pdf")
+
+
+def test_digest_is_recorded_when_written(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    storage.put("uploads/a.pdf", io.BytesIO(b"upload"))
+    with storage.output_path("processed/job-1/b.pdf") as path:
+        with open(path, "wb") as f:
+            f.write(b"output")
+
+    # Served from the record, without reading the files again
+    monkeypatch.setattr(storage_service, "_file_digest", lambda path: pytest.fail("hashed on read"))
+    assert storage.digest("uploads/a.pdf") == hashlib.sha256(b"upload").hexdigest()
+    assert storage.digest("processed/job-1/b.pdf") == hashlib.sha256(b"output").hexdigest()
+    assert storage.digest("processed/job-1/missing.pdf") is None
+
+
+def test_digest_of_a_file_replaced_outside_storage_is_taken_again(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put("uploads/a.pdf", io.BytesIO(b"first"))
+    (tmp_path / "uploads" / "a.pdf").write_bytes(b"second version")
+
+    assert storage.digest("uploads/a.pdf") == hashlib.sha256(b"second version").hexdigest()
+
+
+def test_delete_removes_the_digest(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put("uploads/a.pdf", io.BytesIO(b"upload"))
+    storage.delete("uploads/a.pdf")
+
+    assert os.listdir(tmp_path / "uploads") == []
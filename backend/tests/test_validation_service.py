@@ -0,0 +1,90 @@
+import io
+
+import pytest
+from fastapi import HTTPException
+from PyPDF2 import PdfReader, PdfWriter
+
+from services.document_cache import DocumentCache
+from services.pdf_engines import get_pdf_engine
+from services.storage_service import storage
+from services.validation_service import ValidationService
+
+
+@pytest.fixture
+def validation():
+    service = ValidationService(DocumentCache(get_pdf_engine()))
+    service.repair = True
+    return service
+
+
+def encrypt(pdf: bytes) -> bytes:
+    writer = PdfWriter()
+    for page in PdfReader(io.BytesIO(pdf)).pages:
+        writer.add_page(page)
+    writer.encrypt("secret")
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_valid_pdf_passes(validation, pdf_bytes):
+    assert validation.check_stream(io.BytesIO(pdf_bytes)) is False
+
+
+def test_empty_and_non_pdf_files_are_rejected(validation):
+    for content in (b"", b"just some text, no header"):
+        with pytest.raises(HTTPException) as error:
+            validation.check_stream(io.BytesIO(content))
+        assert error.value.status_code == 400
+
+
+def test_oversized_file_is_rejected(validation, pdf_bytes):
+    validation.max_upload_bytes = len(pdf_bytes) - 1
+    with pytest.raises(HTTPException) as error:
+        validation.check_stream(io.BytesIO(pdf_bytes))
+    assert error.value.status_code == 413
+
+
+def test_truncated_file_needs_repair(validation, pdf_bytes):
+    truncated = io.BytesIO(pdf_bytes[:len(pdf_bytes) * 2 // 3])
+
+    assert validation.check_stream(truncated) is True
+    assert truncated.tell() == 0  # rewound for storing
+
+
+def test_truncated_file_is_rejected_without_repair(validation, pdf_bytes):
+    validation.repair = False
+    with pytest.raises(HTTPException) as error:
+        validation.check_stream(io.BytesIO(pdf_bytes[:len(pdf_bytes) // 2]))
+    assert error.value.status_code == 400
+    assert "damaged" in error.value.detail
+
+
+def test_junk_prefix_is_accepted(validation, pdf_bytes):
+    # startxref offsets then count from the %PDF- header rather than the start of the file
+    assert validation.check_stream(io.BytesIO(b"\x00" * 100 + pdf_bytes)) is False
+
+
+def test_encrypted_file_is_rejected(validation, pdf_bytes):
+    with pytest.raises(HTTPException) as error:
+        validation.check_stream(io.BytesIO(encrypt(pdf_bytes)))
+    assert error.value.status_code == 400
+    assert "Encrypted" in error.value.detail
+
+
+def test_inspect_counts_pages(validation, pdf_bytes, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    (tmp_path / "doc.pdf").write_bytes(pdf_bytes)
+
+    assert validation.inspect("doc.pdf") == {"pages": 3}
+
+
+def test_inspect_deletes_rejected_uploads(validation, pdf_bytes, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    (tmp_path / "doc.pdf").write_bytes(pdf_bytes)
+    validation.max_pages = 2
+
+    with pytest.raises(HTTPException) as error:
+        validation.inspect("doc.pdf")
+    assert error.value.status_code == 413
+    assert not (tmp_path / "doc.pdf").exists()
@@ -0,0 +1,73 @@
+import pytest
+
+from services.ocr_backends import OCRWord
+from services.word_boxes import UINT16_MAX, WordBoxes, find_hits, pack_words
+
+TEXT = "hello brave new world"
+
+
+def words_of(text: str):
+    words, offset = [], 0
+    for index, token in enumerate(text.split(" ")):
+        words.append(OCRWord(token, 10 + 60 * index, 20, 50, 12, 90.5, offset))
+        offset += len(token) + 1
+    return words
+
+
+def test_pack_round_trip():
+    words = words_of(TEXT)
+    boxes = WordBoxes(pack_words(words, 300))
+
+    assert boxes.dpi == 300
+    assert len(boxes) == 4
+    assert list(boxes.offset) == [0, 6, 12, 16]
+    assert list(boxes.length) == [5, 5, 3, 5]
+    assert boxes.box(1) == {"left": 70, "top": 20, "width": 50, "height": 12, "conf": 90.5}
+
+
+def test_pack_clamps_out_of_range_values():
+    boxes = WordBoxes(pack_words([OCRWord("x", -5, UINT16_MAX + 10, 1, 1, 250.0)], 72))
+
+    assert boxes.box(0)["left"] == 0
+    assert boxes.box(0)["top"] == UINT16_MAX
+    assert boxes.box(0)["conf"] == 100.0
+
+
+def test_empty_page():
+    boxes = WordBoxes(pack_words([], 200))
+
+    assert len(boxes) == 0
+    assert boxes.boxes() == []
+    assert list(boxes.overlapping(0, 10)) == []
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(pack_words(words_of(TEXT), 300))
+    blob[0] = 99
+    with pytest.raises(ValueError):
+        WordBoxes(bytes(blob))
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (0, 5, [0]),  # exactly the first word
+    (6, 15, [1, 2]),  # two whole words
+    (8, 9, [1]),  # inside a word
+    (5, 6, []),  # the space between two words
+    (14, 18, [2, 3]),  # the end of one word and the start of the next
+    (0, len(TEXT), [0, 1, 2, 3]),
+    (len(TEXT), len(TEXT) + 5, []),  # past the last word
+])
+def test_overlapping(start, end, expected):
+    boxes = WordBoxes(pack_words(words_of(TEXT), 300))
+
+    assert list(boxes.overlapping(start, end)) == expected
+
+
+def test_find_hits_returns_the_boxes_of_the_matched_words():
+    blob = pack_words(words_of(TEXT), 300)
+    hits = list(find_hits(TEXT, blob, "BRAVE NEW"))
+
+    assert len(hits) == 1
+    assert (hits[0]["start"], hits[0]["end"]) == (6, 15)
+    assert [box["left"] for box in hits[0]["boxes"]] == [70, 130]
+    assert hits[0]["dpi"] == 300
@@ -0,0 +1,187 @@
+"""Queue worker: runs jobs enqueued with ``POST /jobs``.
+
+Any number of workers, on one machine or several, can drain the queue at
+once; see ``services.job_queue``. Run from the ``backend`` directory::
+
+    python worker.py --concurrency 2
+    python worker.py --types ocr            # only OCR jobs
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import signal
+import sys
+
+from logging_config import configure_logging
+
+configure_logging()
+
+from decouple import config
+
+from database import SessionLocal, init_db
+from models import ProcessingJob
+from services.job_queue import JobQueue, default_worker_id
+from services.pdf_service import PDFService
+from services.ocr_service import OCRService
+from services.profiling_service import ProfilingService
+from services.progress_service import JobCancelled, progress_service
+
+logger = logging.getLogger("worker")
+
+
+class Worker:
+    """Claims queued jobs and runs them through the services, renewing their leases.
+
+    Jobs run in a pool with one thread per ``concurrency``, so the event loop
+    stays free to renew leases however long a page takes.
+    """
+
+    def __init__(self, queue: JobQueue, pdf_service: PDFService, ocr_service: OCRService,
+                 worker_id: str, concurrency: int = 1, job_types: Optional[List[str]] = None,
+                 poll_interval: float = 1.0, profiling: Optional[ProfilingService] = None):
+        self.queue = queue
+        self.profiling = profiling
+        self.pdf_service = pdf_service
+        self.ocr_service = ocr_service
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.job_types = job_types
+        self.poll_interval = poll_interval
+        self.stopping = asyncio.Event()
+        self.jobs_run = 0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+
+    def _with_session(self, fn, *args):
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    def execute(self, db, job: ProcessingJob) -> dict:
+        """Run a claimed job through the service for its operation; blocks, so call it in a worker thread"""
+        file_ids = json.loads(job.input_files or "[]")
+        parameters = json.loads(job.parameters or "{}")
+        run = {"job_id": job.id, "resume": True}
+        if job.job_type == "merge":
+            return self.pdf_service.merge_pdfs(file_ids, job.user_id, db, **run)
+        if job.job_type == "split":
+            return self.pdf_service.split_pdf(file_ids[0], parameters["pages"], job.user_id, db, **run)
+        if job.job_type == "compress":
+            return self.pdf_service.compress_pdf(file_ids[0], parameters.get("quality", 80), job.user_id, db, **run)
+        if job.job_type == "convert":
+            return self.pdf_service.convert_to_images(
+                file_ids[0], parameters.get("format", "png"), job.user_id, db, dpi=parameters.get("dpi", 200), **run
+            )
+        if job.job_type == "ocr":
+            ocr = (self.ocr_service.create_searchable_pdf if parameters.get("operation") == "searchable_pdf"
+                   else self.ocr_service.extract_text_from_pdf)
+            return ocr(
+                file_ids[0], parameters.get("language", "eng"), job.user_id, db, dpi=parameters.get("dpi", 300), **run
+            )
+        raise ValueError(f"Unknown job type '{job.job_type}'")
+
+    async def _heartbeat(self, job_id: str):
+        interval = self.queue.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self._with_session, self.queue.heartbeat, job_id, self.worker_id):
+                logger.warning(f"Lost the lease on job {job_id}; another worker took it over")
+                progress_service.cancel(job_id, "Taken over by another worker")
+                return
+
+    async def run_job(self, job: ProcessingJob):
+        logger.info(f"Running {job.job_type} job {job.id} (attempt {job.attempts}, priority {job.priority})")
+        # Started before the context is copied so the job's thread carries the profile
+        profile = self.profiling.begin(f"{job.job_type} job", job.id) if self.profiling and self.profiling.sampled() else None
+        call = functools.partial(contextvars.copy_context().run, self._with_session, self.execute, job)
+        execution = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        status, error = "completed", None
+        try:
+            try:
+                await asyncio.shield(execution)
+            except asyncio.CancelledError:
+                # Shutting down: stop the job at its next page and hand it back so
+                # another worker picks it up without waiting for the lease
+                progress_service.cancel(job.id, "Interrupted by a worker shutdown; the job was requeued")
+                await asyncio.gather(execution, return_exceptions=True)
+                await asyncio.to_thread(self._with_session, self.queue.release, job.id, self.worker_id)
+                raise
+        except JobCancelled:
+            return  # Lease lost; the worker that took the job over records its outcome
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            status, error = "failed", str(getattr(e, "detail", None) or e)
+        finally:
+            heartbeat.cancel()
+            if profile:
+                self.profiling.end(profile)
+                try:
+                    await asyncio.to_thread(self.profiling.save, profile)
+                except Exception as e:
+                    logger.warning(f"Could not store the profile of job {job.id}: {e}")
+        await asyncio.to_thread(self._with_session, self.queue.finish, job.id, self.worker_id, status, error)
+        self.jobs_run += 1
+
+    async def _loop(self):
+        while not self.stopping.is_set():
+            job = await asyncio.to_thread(self._with_session, self.queue.claim, self.worker_id, self.job_types)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job)
+
+    async def run(self, shutdown_grace: float = 20.0):
+        loops = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        await self.stopping.wait()
+        # Running jobs get a grace period to finish before they are handed back to the queue
+        _, unfinished = await asyncio.wait(loops, timeout=shutdown_grace)
+        for loop in unfinished:
+            loop.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        logger.info(f"Worker {self.worker_id} stopped after {self.jobs_run} jobs")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=config("WORKER_CONCURRENCY", default=1, cast=int),
+                        help="jobs run at once by this process")
+    parser.add_argument("--types", help="comma-separated job types to run (default: all)")
+    parser.add_argument("--worker-id", default=default_worker_id())
+    parser.add_argument("--poll-interval", type=float, default=config("WORKER_POLL_SECONDS", default=1.0, cast=float),
+                        help="seconds to wait when the queue is empty")
+    parser.add_argument("--shutdown-grace", type=float, default=config("WORKER_SHUTDOWN_GRACE", default=20.0, cast=float),
+                        help="seconds running jobs may take to finish on SIGTERM before they are requeued")
+    args = parser.parse_args(argv)
+
+    if config("MIGRATE_ON_STARTUP", default=True, cast=bool):
+        init_db()
+
+    worker = Worker(
+        JobQueue(), PDFService(), OCRService(), args.worker_id, args.concurrency,
+        args.types.split(",") if args.types else None, args.poll_interval, ProfilingService()
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stopping.set)
+        logger.info(f"Worker {args.worker_id} started with concurrency {args.concurrency}")
+        await worker.run(args.shutdown_grace)
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -115,11 +115,14 @@ export default function OCRPage() {
 
       setProgress(90);
 
-      const { extracted_text, confidence, processing_time } = response.data;
+      const { confidence, processing_time, page_count, text_url } = response.data;
+      // Large documents do not carry the text inline; fetch it from the streamed endpoint
+      const extracted_text: string = response.data.extracted_text
+        ?? (await api.get(text_url, { responseType: 'text' })).data;
       
       setExtractedText(extracted_text);
       setOcrResults({
-        pages: 1,
+        pages: page_count || 1,
         confidence: confidence || 95.0,
         processingTime: processing_time || 2.5,
         language: selectedLanguage,